@@ -39,8 +39,24 @@ def create_app(config_name=None):
     login_manager.init_app(app)
     migrate.init_app(app, db)
     cache.init_app(app)
+    # Count this worker's cache hits and misses, whichever backend is configured
+    from app.utils.cache_backends import MeteredCache
+    app.extensions['cache'][cache] = MeteredCache(app.extensions['cache'][cache],
+                                                  log_interval=app.config['CACHE_METRICS_LOG_INTERVAL'])
     mail.init_app(app)
 
+    # Keep the health data rollups in step with rows written through the ORM
+    from app.services.rollup_service import register_rollup_events
+    register_rollup_events()
+    from app.services.achievement_stats import register_stats_listeners
+    register_stats_listeners()
+    from app.services.streak_service import register_streak_listeners
+    register_streak_listeners()
+    from app.services.heart_rate_store import register_store_events
+    register_store_events()
+    from app.utils.cache_utils import register_cache_events
+    register_cache_events()
+
     # Configure login
     login_manager.login_view = 'auth.login'
     login_manager.login_message = 'Please log in to access this page.'
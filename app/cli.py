@@ -11,17 +11,18 @@ def init_achievements_command():
     click.echo('Initialized achievements.')
 
 @click.command('update-goals')
+@click.option('--workers', type=int, default=1, help='Number of processes, each updating a shard of the users.')
+@click.option('--chunk-size', type=int, default=None, help='Goals computed and written per batch (default: 500).')
 @with_appcontext
-def update_goals_command():
+def update_goals_command(workers, chunk_size):
     """Update progress for all active goals."""
-    from app.models.goal import Goal
-    from app.services.goal_service import GoalService
+    from app.services.goal_engine import CHUNK_SIZE, update_all_goals
     
-    goals = Goal.query.filter_by(completed=False).all()
-    for goal in goals:
-        GoalService.update_goal_progress(goal)
+    stats = update_all_goals(workers=workers, chunk_size=chunk_size or CHUNK_SIZE)
     
-    click.echo(f'Updated progress for {len(goals)} goals.')
+    click.echo(f"Updated progress for {stats['goals']} goals "
+               f"({stats['updated']} changed, {stats['completed']} completed, {stats['failed']} skipped) "
+               f"in {stats['seconds']}s: {stats['goals_per_second']} goals/sec.")
 
 @click.command('check-achievements')
 @click.argument('user_id', type=int)
@@ -38,8 +39,42 @@ def check_achievements_command(user_id):
     else:
         click.echo('No new achievements earned.')
 
+@click.command('import-worker')
+@click.option('--workers', type=int, default=None, help='Number of worker processes (default: IMPORT_WORKERS).')
+@click.option('--poll-interval', type=float, default=None, help='Seconds to wait when the queue is empty.')
+@click.option('--once', is_flag=True, help='Process queued jobs and exit instead of polling.')
+@with_appcontext
+def import_worker_command(workers, poll_interval, once):
+    """Run background workers that process queued file imports."""
+    from flask import current_app
+    from app.services.import_queue import requeue_stale_jobs, start_worker_pool
+    
+    workers = workers or current_app.config['IMPORT_WORKERS']
+    poll_interval = poll_interval or current_app.config['IMPORT_POLL_INTERVAL']
+    
+    requeued = requeue_stale_jobs(current_app.config['IMPORT_STALE_AFTER'])
+    if requeued:
+        click.echo(f'Requeued {requeued} stale import jobs.')
+    
+    click.echo(f'Starting {workers} import worker(s).')
+    processed = start_worker_pool(workers, poll_interval=poll_interval, once=once)
+    if processed is not None:
+        click.echo(f'Processed {processed} import jobs.')
+
+@click.command('rebuild-rollups')
+@click.argument('user_id', type=int, required=False)
+@with_appcontext
+def rebuild_rollups_command(user_id):
+    """Recompute the daily/hourly rollup tables, for one user or everyone."""
+    from app.services.rollup_service import rebuild_rollups
+    
+    written = rebuild_rollups(user_id)
+    click.echo(f'Wrote {written} rollup rows.')
+
 def register_commands(app):
     """Register custom CLI commands."""
     app.cli.add_command(init_achievements_command)
     app.cli.add_command(update_goals_command)
-    app.cli.add_command(check_achievements_command) 
\ No newline at end of file
+    app.cli.add_command(check_achievements_command)
+    app.cli.add_command(import_worker_command)
+    app.cli.add_command(rebuild_rollups_command)
@@ -1,19 +1,55 @@
 import os
 from datetime import timedelta
 
+# Short CACHE_TYPE names for the supported backends. Any other value is passed to
+# Flask-Caching unchanged (e.g. a dotted path to a backend class).
+CACHE_BACKENDS = {
+    # In-process, one copy per worker: fine for a single process (development, tests)
+    'simple': 'flask_caching.backends.simplecache.SimpleCache',
+    'null': 'flask_caching.backends.nullcache.NullCache',
+    # Shared by the workers of one host
+    'filesystem': 'flask_caching.backends.filesystemcache.FileSystemCache',
+    'sqlite': 'app.utils.cache_backends.SQLiteCache',
+    # Shared across hosts; needs the redis package
+    'redis': 'app.utils.cache_backends.IntRedisCache',
+}
+
 def init_cache_session_config(app):
     """
     Initialize cache and session configuration for the application
-    
+
     This sets up caching and session handling settings.
     """
     # Caching configuration
-    app.config['CACHE_TYPE'] = os.environ.get('CACHE_TYPE', 'simple')
+    cache_type = os.environ.get('CACHE_TYPE', 'simple')
+    app.config['CACHE_TYPE'] = CACHE_BACKENDS.get(cache_type.lower(), cache_type)
     app.config['CACHE_DEFAULT_TIMEOUT'] = int(os.environ.get('CACHE_DEFAULT_TIMEOUT', 300))  # Default 5 minutes
-    
+    # Chart data from TimeSeriesQuery
+    app.config['TIMESERIES_CACHE_TIMEOUT'] = int(os.environ.get('TIMESERIES_CACHE_TIMEOUT', 60))
+
+    # Shared backends: entry limit (LRU beyond it), plus a size limit in bytes for sqlite
+    cache_dir = os.environ.get('CACHE_DIR') or os.path.join(app.config['INSTANCE_PATH'], 'cache')
+    app.config['CACHE_DIR'] = cache_dir
+    app.config['CACHE_SQLITE_PATH'] = os.environ.get('CACHE_SQLITE_PATH') or os.path.join(cache_dir, 'cache.sqlite')
+    app.config['CACHE_THRESHOLD'] = int(os.environ.get('CACHE_THRESHOLD', 5000))
+    app.config['CACHE_MAX_SIZE'] = int(os.environ.get('CACHE_MAX_SIZE', 256 * 1024 * 1024))
+    app.config['CACHE_REDIS_URL'] = os.environ.get('CACHE_REDIS_URL') or os.environ.get('REDIS_URL')
+    app.config['CACHE_KEY_PREFIX'] = os.environ.get('CACHE_KEY_PREFIX', 'healthtrack_')
+    # cache_utils.get_or_compute: how long expired values may be served while one request
+    # recomputes them, how eagerly values are refreshed before expiry, and the lock lifetime
+    app.config['CACHE_STALE_TIMEOUT'] = int(os.environ.get('CACHE_STALE_TIMEOUT', 300))
+    app.config['CACHE_EARLY_EXPIRY_BETA'] = float(os.environ.get('CACHE_EARLY_EXPIRY_BETA', 1.0))
+    app.config['CACHE_LOCK_TIMEOUT'] = int(os.environ.get('CACHE_LOCK_TIMEOUT', 30))
+    # Precompute dashboard, chart and share caches after each import (app.services.cache_warming)
+    app.config['CACHE_WARM_AFTER_IMPORT'] = os.environ.get(
+        'CACHE_WARM_AFTER_IMPORT', 'false' if app.config.get('TESTING') else 'true'
+    ).lower() in ['true', 'on', '1']
+    # Log each worker's hit/miss counts every this many lookups (0 disables)
+    app.config['CACHE_METRICS_LOG_INTERVAL'] = int(os.environ.get('CACHE_METRICS_LOG_INTERVAL', 1000))
+
     # Session configuration
     app.config['SESSION_TYPE'] = os.environ.get('SESSION_TYPE', 'filesystem')
     app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=int(os.environ.get('SESSION_LIFETIME_DAYS', 7)))
     app.config['SESSION_USE_SIGNER'] = os.environ.get('SESSION_USE_SIGNER', 'True').lower() == 'true'
-    
-    return app 
\ No newline at end of file
+
+    return app
@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 def init_db_config(app):
     """
@@ -20,8 +21,14 @@ def init_db_config(app):
         f"sqlite:///{os.path.join(instance_path, 'healthtrack.db')}"
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     
+    # Memory-mapped copies of large tables (see app.services.heart_rate_store)
+    app.config['TIMESERIES_FOLDER'] = os.environ.get('TIMESERIES_FOLDER') or \
+        os.path.join(instance_path, 'timeseries')
+    
     # Testing override
     if app.config.get('TESTING', False):
         app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        # The in-memory database starts empty, so must its timeseries files
+        app.config['TIMESERIES_FOLDER'] = tempfile.mkdtemp(prefix='healthtrack-timeseries-')
     
     return app 
\ No newline at end of file
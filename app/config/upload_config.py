@@ -17,6 +17,22 @@ def init_upload_config(app):
     app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))  
     app.config['ALLOWED_EXTENSIONS'] = {'zip', 'xml', 'csv'}
     
+    # Import pipeline: 'stream' inserts parsed rows directly into the database,
+    # 'csv' writes intermediate CSV files first (useful for debugging parser output)
+    app.config['IMPORT_MODE'] = os.environ.get('IMPORT_MODE', 'stream').lower()
+    # Processes used to parse a single Apple Health export in byte-range shards (1 = no sharding)
+    app.config['IMPORT_PARSER_WORKERS'] = int(os.environ.get('IMPORT_PARSER_WORKERS', 1))
+    # Skip records older than the latest data already imported from the same source
+    app.config['IMPORT_INCREMENTAL'] = os.environ.get('IMPORT_INCREMENTAL', 'true').lower() in ['true', 'on', '1']
+    
+    # Background import queue: uploads are queued and processed by `flask import-worker`
+    app.config['IMPORT_QUEUE_ENABLED'] = os.environ.get('IMPORT_QUEUE_ENABLED', 'false').lower() in ['true', 'on', '1']
+    app.config['IMPORT_WORKERS'] = int(os.environ.get('IMPORT_WORKERS', 2))
+    app.config['IMPORT_POLL_INTERVAL'] = float(os.environ.get('IMPORT_POLL_INTERVAL', 2))
+    # Running jobs whose worker has not reported progress for this long (and is not
+    # known to be alive) are assumed orphaned and requeued when workers start
+    app.config['IMPORT_STALE_AFTER'] = int(os.environ.get('IMPORT_STALE_AFTER', 30 * 60))
+    
     # Ensure upload directory exists
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     
@@ -5,8 +5,12 @@ from .activity import Activity
 from .sleep import Sleep
 from .goal import Goal
 from .progress import Progress
-from .achievement import Achievement, UserAchievement
+from .achievement import Achievement, UserAchievement, AchievementStats
 from .import_log import ImportLog
+from .streak import Streak
+from .rollup import (
+    HeartRateDailyRollup, HeartRateHourlyRollup, ActivityDailyRollup, SleepDailyRollup, WeightDailyRollup
+)
 from .shared_link import SharedLink
 # Import the models that depend on other models last
 from .share_access_log import ShareAccessLog
@@ -22,7 +26,14 @@ __all__ = [
     'Progress',
     'Achievement',
     'UserAchievement',
+    'AchievementStats',
     'ImportLog',
+    'Streak',
+    'HeartRateDailyRollup',
+    'HeartRateHourlyRollup',
+    'ActivityDailyRollup',
+    'SleepDailyRollup',
+    'WeightDailyRollup',
     'SharedLink',
     'ShareAccessLog'
 ]
@@ -52,4 +52,37 @@ class UserAchievement(db.Model):
             'achievement_id': self.achievement_id,
             'achievement': self.achievement.to_dict(),
             'earned_at': self.earned_at.strftime('%Y-%m-%d %H:%M:%S')
-        }
\ No newline at end of file
+        }
+
+class AchievementStats(db.Model):
+    """
+    Running aggregates the achievement rules are checked against, one row per user
+
+    Kept current by app.services.achievement_stats from the rollup rows each
+    import batch or ORM write recomputes, so checking an achievement never
+    scans the raw tables.
+    """
+    __tablename__ = 'achievement_stats'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, unique=True)
+    # Record counts per raw table
+    activity_count = db.Column(db.Integer, default=0)
+    weight_count = db.Column(db.Integer, default=0)
+    sleep_count = db.Column(db.Integer, default=0)
+    heart_rate_count = db.Column(db.Integer, default=0)
+    # Best day's total of 'steps' activities
+    max_daily_steps = db.Column(db.Float, default=0)
+    # Earliest and latest weight, for the change since the first record
+    first_weight = db.Column(db.Float)
+    first_weight_at = db.Column(db.DateTime)
+    latest_weight = db.Column(db.Float)
+    latest_weight_at = db.Column(db.DateTime)
+    # Sum of all readings and the latest one, for the latest reading against the earlier average
+    heart_rate_total = db.Column(db.Float, default=0)
+    latest_heart_rate = db.Column(db.Float)
+    latest_heart_rate_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<AchievementStats {self.user_id}>'
@@ -2,6 +2,12 @@ from app import db
 
 class Activity(db.Model):
     __tablename__ = 'activities'
+    __table_args__ = (
+        # One row per reading; imports skip rows that already exist
+        db.Index('uq_activities_natural_key', 'user_id', 'timestamp', 'activity_type', 'data_source', unique=True),
+        # Per-type range scans (steps, distance, calories) for charts and goals
+        db.Index('ix_activities_user_type_timestamp', 'user_id', 'activity_type', 'timestamp', 'value'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -13,7 +19,7 @@ class Activity(db.Model):
     total_steps = db.Column(db.Integer)
     total_distance = db.Column(db.Float)
     calories = db.Column(db.Integer)
-    data_source = db.Column(db.String(50))
+    data_source = db.Column(db.String(50), default='')  # '' rather than NULL so the natural key matches
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
     updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
     
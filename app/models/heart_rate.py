@@ -2,6 +2,12 @@ from app import db
 
 class HeartRate(db.Model):
     __tablename__ = 'heart_rates'
+    __table_args__ = (
+        # One row per reading; imports skip rows that already exist
+        db.Index('uq_heart_rates_natural_key', 'user_id', 'timestamp', 'data_source', unique=True),
+        # Chart and dashboard range scans only read timestamp and value, so keep it in the index
+        db.Index('ix_heart_rates_user_timestamp', 'user_id', 'timestamp', 'value'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -9,7 +15,7 @@ class HeartRate(db.Model):
     value = db.Column(db.Integer, nullable=False)  # beats per minute
     unit = db.Column(db.String(10), nullable=False, default='bpm')  # Add unit field
     timestamp = db.Column(db.DateTime, nullable=False)
-    data_source = db.Column(db.String(50))
+    data_source = db.Column(db.String(50), default='')  # '' rather than NULL so the natural key matches
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
     updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
     
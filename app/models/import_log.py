@@ -8,12 +8,25 @@ class ImportLog(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     data_source = db.Column(db.String(50), nullable=False)
     file_name = db.Column(db.String(255), nullable=False)
-    status = db.Column(db.String(20), nullable=False)  # success, failed, processing
+    status = db.Column(db.String(20), nullable=False, index=True)  # queued, running, processing, success, partial, failed
     error_message = db.Column(db.Text)
     records_processed = db.Column(db.Integer, default=0)
+    rows_per_second = db.Column(db.Float)  # Bulk insert throughput for the import
+    duplicates_skipped = db.Column(db.Integer, default=0)  # Rows already in the database, not inserted again
+    cache_warm_seconds = db.Column(db.Float)  # Time spent filling the user's caches after the import
+    file_path = db.Column(db.String(500))  # Uploaded file waiting to be processed by a worker
+    progress = db.Column(db.Integer, default=0)  # Percent of the file parsed so far
+    worker_id = db.Column(db.String(64))  # Worker that claimed the job
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)  # Last progress written by the worker running the job
     completed_at = db.Column(db.DateTime)
     
+    @property
+    def is_finished(self):
+        """True once the import can no longer change"""
+        return self.status in ('success', 'partial', 'failed')
+
     def __repr__(self):
         return f'<ImportLog {self.file_name} {self.status}>'
     
@@ -27,6 +40,13 @@ class ImportLog(db.Model):
             'status': self.status,
             'error_message': self.error_message,
             'records_processed': self.records_processed,
+            'rows_per_second': self.rows_per_second,
+            'duplicates_skipped': self.duplicates_skipped,
+            'cache_warm_seconds': self.cache_warm_seconds,
+            'progress': self.progress,
+            'finished': self.is_finished,
             'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'heartbeat_at': self.heartbeat_at.isoformat() if self.heartbeat_at else None,
             'completed_at': self.completed_at.isoformat() if self.completed_at else None
         } 
\ No newline at end of file
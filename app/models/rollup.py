@@ -0,0 +1,104 @@
+from datetime import datetime
+from app import db
+
+# Pre-aggregated copies of the raw health tables, one row per user and day (or
+# hour). They are rebuilt for the affected days by app.services.rollup_service
+# whenever raw rows are written, so read paths never have to scan raw samples.
+
+
+class HeartRateDailyRollup(db.Model):
+    __tablename__ = 'heart_rate_daily_rollups'
+    __table_args__ = (
+        db.Index('uq_heart_rate_daily_rollups_key', 'user_id', 'day', 'unit', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    unit = db.Column(db.String(10), default='')
+    min_value = db.Column(db.Float)
+    max_value = db.Column(db.Float)
+    total = db.Column(db.Float, default=0)
+    count = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<HeartRateDailyRollup {self.user_id} {self.day}>'
+
+
+class HeartRateHourlyRollup(db.Model):
+    __tablename__ = 'heart_rate_hourly_rollups'
+    __table_args__ = (
+        db.Index('uq_heart_rate_hourly_rollups_key', 'user_id', 'hour', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    hour = db.Column(db.DateTime, nullable=False)  # Start of the hour
+    min_value = db.Column(db.Float)
+    max_value = db.Column(db.Float)
+    total = db.Column(db.Float, default=0)
+    count = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<HeartRateHourlyRollup {self.user_id} {self.hour}>'
+
+
+class ActivityDailyRollup(db.Model):
+    __tablename__ = 'activity_daily_rollups'
+    __table_args__ = (
+        db.Index('uq_activity_daily_rollups_key', 'user_id', 'day', 'activity_type', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    activity_type = db.Column(db.String(50), default='')
+    total = db.Column(db.Float, default=0)  # Sum of value
+    steps = db.Column(db.Float, default=0)  # total_steps where recorded, otherwise value of 'steps' rows
+    count = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ActivityDailyRollup {self.user_id} {self.day} {self.activity_type}>'
+
+
+class SleepDailyRollup(db.Model):
+    __tablename__ = 'sleep_daily_rollups'
+    __table_args__ = (
+        db.Index('uq_sleep_daily_rollups_key', 'user_id', 'day', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)  # Date of the sleep record's timestamp
+    duration = db.Column(db.Float, default=0)  # All totals in minutes
+    deep_sleep = db.Column(db.Float, default=0)
+    light_sleep = db.Column(db.Float, default=0)
+    rem_sleep = db.Column(db.Float, default=0)
+    awake = db.Column(db.Float, default=0)
+    count = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SleepDailyRollup {self.user_id} {self.day}>'
+
+
+class WeightDailyRollup(db.Model):
+    __tablename__ = 'weight_daily_rollups'
+    __table_args__ = (
+        db.Index('uq_weight_daily_rollups_key', 'user_id', 'day', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    min_value = db.Column(db.Float)
+    max_value = db.Column(db.Float)
+    total = db.Column(db.Float, default=0)
+    count = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<WeightDailyRollup {self.user_id} {self.day}>'
@@ -3,6 +3,12 @@ from app import db
 
 class Sleep(db.Model):
     __tablename__ = 'sleeps'
+    __table_args__ = (
+        # One row per night; imports skip nights that already exist
+        db.Index('uq_sleeps_natural_key', 'user_id', 'start_time', unique=True),
+        # Sleep pages filter on timestamp rather than start_time
+        db.Index('ix_sleeps_user_timestamp', 'user_id', 'timestamp'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
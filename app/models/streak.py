@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta
+from app import db
+
+
+class Streak(db.Model):
+    """
+    A user's runs of consecutive qualifying days for one metric
+
+    Kept current by app.services.streak_service whenever the daily rollups are
+    refreshed. The latest run is stored with its last day, so whether it is
+    still going is decided when it is read.
+    """
+    __tablename__ = 'streaks'
+    __table_args__ = (
+        db.Index('uq_streaks_user_metric', 'user_id', 'metric', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    metric = db.Column(db.String(20), nullable=False)  # 'steps', 'weight', 'sleep', 'heart_rate'
+    # Most recent run
+    current_length = db.Column(db.Integer, default=0)
+    current_start = db.Column(db.Date)
+    current_end = db.Column(db.Date)
+    # Longest run, the most recent one on a tie
+    longest_length = db.Column(db.Integer, default=0)
+    longest_start = db.Column(db.Date)
+    longest_end = db.Column(db.Date)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def current(self, today=None):
+        """Length of the run still going: one that reached today or yesterday (UTC)"""
+        today = today or datetime.utcnow().date()
+        if self.current_end is None or self.current_end < today - timedelta(days=1):
+            return 0
+        return self.current_length or 0
+
+    def to_dict(self, today=None):
+        return {
+            'metric': self.metric,
+            'current': self.current(today),
+            'longest': self.longest_length or 0,
+            'current_end': self.current_end.isoformat() if self.current_end else None,
+            'longest_end': self.longest_end.isoformat() if self.longest_end else None
+        }
+
+    def __repr__(self):
+        return f'<Streak {self.user_id} {self.metric}>'
@@ -2,6 +2,12 @@ from app import db
 
 class Weight(db.Model):
     __tablename__ = 'weights'
+    __table_args__ = (
+        # One row per reading; imports skip rows that already exist
+        db.Index('uq_weights_natural_key', 'user_id', 'timestamp', 'data_source', unique=True),
+        # Chart and dashboard range scans only read timestamp and value, so keep it in the index
+        db.Index('ix_weights_user_timestamp', 'user_id', 'timestamp', 'value'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -9,7 +15,7 @@ class Weight(db.Model):
     value = db.Column(db.Float, nullable=False)
     timestamp = db.Column(db.DateTime, nullable=False)
     unit = db.Column(db.String(10))
-    data_source = db.Column(db.String(50))
+    data_source = db.Column(db.String(50), default='')  # '' rather than NULL so the natural key matches
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
     updated_at = db.Column(db.DateTime, default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
     
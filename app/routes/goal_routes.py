@@ -4,6 +4,7 @@ from app import db
 from app.models.goal import Goal
 from app.forms.goal_forms import GoalForm
 from app.services.goal_service import GoalService
+from app.services.streak_service import get_streaks
 from datetime import datetime, timedelta
 from app.models.weight import Weight
 from app.models.activity import Activity
@@ -83,7 +84,8 @@ def index():
                           sleep_change=sleep_change,
                           heart_rate_change=heart_rate_change,
                           this_week_total=this_week_total,
-                          today_steps=today_steps)
+                          today_steps=today_steps,
+                          streaks=get_streaks(current_user.id))
 
 @bp.route('/create', methods=['GET', 'POST'])
 @login_required
@@ -138,7 +140,8 @@ def create():
 def view(goal_id):
     """View a specific goal"""
     goal = Goal.query.filter_by(id=goal_id, user_id=current_user.id).first_or_404()
-    return render_template('goals/view.html', goal=goal)
+    streak = get_streaks(current_user.id).get(goal.category)
+    return render_template('goals/view.html', goal=goal, streak=streak)
 
 @bp.route('/<int:goal_id>/delete', methods=['POST'])
 @login_required
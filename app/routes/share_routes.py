@@ -2,7 +2,8 @@ from flask import Blueprint, jsonify, request, current_app, render_template, abo
 from flask_login import login_required, current_user
 from app import db, cache
 from app.models import User, SharedLink, Weight, HeartRate, Activity, Sleep, Goal, Achievement, UserAchievement
-from sqlalchemy import and_
+from app.models.rollup import ActivityDailyRollup, HeartRateDailyRollup, SleepDailyRollup
+from sqlalchemy import and_, func
 from app.models.share_access_log import ShareAccessLog
 import json
 import os
@@ -23,7 +24,7 @@ try:
     from weasyprint import HTML
 except ImportError:
     HTML = None
-from app.utils.cache_utils import invalidate_shared_dashboard_cache
+from app.utils.cache_utils import invalidate_shared_dashboard_cache, shared_dashboard_cache_key
 from app.services.pdf_service import PDFService
 
 bp = Blueprint('share', __name__, url_prefix='/share')
@@ -315,7 +316,7 @@ def validate_password(token):
 
 # Data access API endpoints
 @bp.route('/data/<share_token>/dashboard', methods=['GET'])
-@cache.cached(timeout=900, key_prefix=lambda: f'shared_dashboard_{request.view_args["share_token"]}')
+@cache.cached(timeout=900, key_prefix=lambda: shared_dashboard_cache_key(request.view_args['share_token']))
 def get_shared_dashboard(share_token):
     """Get shared dashboard data"""
     try:
@@ -338,54 +339,46 @@ def get_shared_dashboard(share_token):
         # Get user
         user = User.query.get(share_link.user_id)
         
+        # Overview only lists the latest 7 records; its statistics come from the rollups
+        limit = 7 if share_link.privacy_level == 'overview' else None
+        
         # Get data based on privacy level
         weights = Weight.query.filter(
             Weight.user_id == user.id,
             Weight.timestamp >= share_link.date_range_start,
             Weight.timestamp <= share_link.date_range_end
-        ).order_by(Weight.timestamp.desc()).all()
+        ).order_by(Weight.timestamp.desc()).limit(limit).all()
         
         heart_rates = HeartRate.query.filter(
             HeartRate.user_id == user.id,
             HeartRate.timestamp >= share_link.date_range_start,
             HeartRate.timestamp <= share_link.date_range_end
-        ).order_by(HeartRate.timestamp.desc()).all()
+        ).order_by(HeartRate.timestamp.desc()).limit(limit).all()
         
         activities = Activity.query.filter(
             Activity.user_id == user.id,
             Activity.timestamp >= share_link.date_range_start,
             Activity.timestamp <= share_link.date_range_end
-        ).order_by(Activity.timestamp.desc()).all()
+        ).order_by(Activity.timestamp.desc()).limit(limit).all()
         
         sleeps = Sleep.query.filter(
             Sleep.user_id == user.id,
             Sleep.timestamp >= share_link.date_range_start,
             Sleep.timestamp <= share_link.date_range_end
-        ).order_by(Sleep.timestamp.desc()).all()
+        ).order_by(Sleep.timestamp.desc()).limit(limit).all()
+        
+        summary = get_rollup_summary(user.id, share_link)
+        summary['weight'] = {'latest': weights[0].value if weights else 0}
         
         # Process data based on privacy level
         if share_link.privacy_level == 'overview':
             # Return only aggregated data
             data = {
-                'weights': [{'date': w.timestamp.strftime('%Y-%m-%d'), 'value': w.value, 'unit': w.unit} for w in weights[:7]],
-                'heart_rates': [{'date': hr.timestamp.strftime('%Y-%m-%d'), 'value': hr.value, 'unit': hr.unit} for hr in heart_rates[:7]],
-                'activities': [{'date': a.timestamp.strftime('%Y-%m-%d'), 'steps': a.value} for a in activities[:7]],
-                'sleeps': [{'date': s.timestamp.strftime('%Y-%m-%d'), 'duration': s.duration / 60} for s in sleeps[:7]],
-                'summary': {
-                    'weight': {'latest': weights[0].value if weights else 0},
-                    'heart_rate': {
-                        'min': min([hr.value for hr in heart_rates]) if heart_rates else 0,
-                        'max': max([hr.value for hr in heart_rates]) if heart_rates else 0,
-                        'avg': sum([hr.value for hr in heart_rates]) / len(heart_rates) if heart_rates else 0
-                    },
-                    'activity': {
-                        'avg_steps': sum([a.value for a in activities]) / len(activities) if activities else 0,
-                        'total_steps': sum([a.value for a in activities]) if activities else 0
-                    },
-                    'sleep': {
-                        'avg_duration_hours': sum([s.duration for s in sleeps]) / len(sleeps) / 60 if sleeps else 0
-                    }
-                }
+                'weights': [{'date': w.timestamp.strftime('%Y-%m-%d'), 'value': w.value, 'unit': w.unit} for w in weights],
+                'heart_rates': [{'date': hr.timestamp.strftime('%Y-%m-%d'), 'value': hr.value, 'unit': hr.unit} for hr in heart_rates],
+                'activities': [{'date': a.timestamp.strftime('%Y-%m-%d'), 'steps': a.value} for a in activities],
+                'sleeps': [{'date': s.timestamp.strftime('%Y-%m-%d'), 'duration': s.duration / 60} for s in sleeps],
+                'summary': summary
             }
         elif share_link.privacy_level == 'achievements':
             # Return only achievements data
@@ -399,21 +392,7 @@ def get_shared_dashboard(share_token):
                 'heart_rates': [hr.to_dict() for hr in heart_rates],
                 'activities': [a.to_dict() for a in activities],
                 'sleeps': [s.to_dict() for s in sleeps],
-                'summary': {
-                    'weight': {'latest': weights[0].value if weights else 0},
-                    'heart_rate': {
-                        'min': min([hr.value for hr in heart_rates]) if heart_rates else 0,
-                        'max': max([hr.value for hr in heart_rates]) if heart_rates else 0,
-                        'avg': sum([hr.value for hr in heart_rates]) / len(heart_rates) if heart_rates else 0
-                    },
-                    'activity': {
-                        'avg_steps': sum([a.value for a in activities]) / len(activities) if activities else 0,
-                        'total_steps': sum([a.value for a in activities]) if activities else 0
-                    },
-                    'sleep': {
-                        'avg_duration_hours': sum([s.duration for s in sleeps]) / len(sleeps) / 60 if sleeps else 0
-                    }
-                }
+                'summary': summary
             }
         
         return jsonify({
@@ -484,6 +463,55 @@ def get_shared_module_data(share_token, module):
         }), 500
 
 # Helper functions for module data
+def get_rollup_summary(user_id, share_link):
+    """Heart rate, activity and sleep statistics for the shared days, read from the daily rollups"""
+    first_day = share_link.date_range_start.date()
+    last_day = share_link.date_range_end.date()
+    
+    hr_min, hr_max, hr_total, hr_count = db.session.query(
+        func.min(HeartRateDailyRollup.min_value),
+        func.max(HeartRateDailyRollup.max_value),
+        func.sum(HeartRateDailyRollup.total),
+        func.sum(HeartRateDailyRollup.count)
+    ).filter(
+        HeartRateDailyRollup.user_id == user_id,
+        HeartRateDailyRollup.day >= first_day,
+        HeartRateDailyRollup.day <= last_day
+    ).one()
+    
+    activity_total, activity_count = db.session.query(
+        func.sum(ActivityDailyRollup.total),
+        func.sum(ActivityDailyRollup.count)
+    ).filter(
+        ActivityDailyRollup.user_id == user_id,
+        ActivityDailyRollup.day >= first_day,
+        ActivityDailyRollup.day <= last_day
+    ).one()
+    
+    sleep_total, sleep_count = db.session.query(
+        func.sum(SleepDailyRollup.duration),
+        func.sum(SleepDailyRollup.count)
+    ).filter(
+        SleepDailyRollup.user_id == user_id,
+        SleepDailyRollup.day >= first_day,
+        SleepDailyRollup.day <= last_day
+    ).one()
+    
+    return {
+        'heart_rate': {
+            'min': hr_min if hr_count else 0,
+            'max': hr_max if hr_count else 0,
+            'avg': hr_total / hr_count if hr_count else 0
+        },
+        'activity': {
+            'avg_steps': activity_total / activity_count if activity_count else 0,
+            'total_steps': activity_total or 0
+        },
+        'sleep': {
+            'avg_duration_hours': sleep_total / sleep_count / 60 if sleep_count else 0
+        }
+    }
+
 def get_heartrate_data(user_id, share_link):
     heart_rates = HeartRate.query.filter(
         HeartRate.user_id == user_id,
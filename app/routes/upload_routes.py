@@ -75,8 +75,26 @@ def upload_file():
             flash('Data source not specified', 'error')
             return redirect(url_for('upload.upload_file'))
         
-        # Process file
         import_service = UploadService(current_user.id)
+        
+        # Hand large imports to the background workers and return immediately
+        if current_app.config.get('IMPORT_QUEUE_ENABLED'):
+            import_log = import_service.enqueue_file(file, data_source)
+            logger.info(f"File {file.filename} queued as import {import_log.id} for user {current_user.id}")
+            
+            if is_ajax:
+                return jsonify({
+                    'success': True,
+                    'queued': True,
+                    'message': 'File uploaded and queued for import',
+                    'import_log_id': import_log.id,
+                    'status_url': url_for('upload.import_status', import_log_id=import_log.id)
+                }), 202
+            
+            flash('File uploaded. Your data is being imported in the background.', 'success')
+            return redirect(url_for('upload.upload_file'))
+        
+        # Process file
         import_log = import_service.process_file(file, data_source)
         
         logger.info(f"File {file.filename} processed successfully for user {current_user.id}")
@@ -110,6 +128,28 @@ def upload_file():
         flash(f'An unexpected error occurred: {str(e)}', 'error')
         return redirect(url_for('upload.upload_file'))
 
+@bp.route('/upload/status/<int:import_log_id>')
+@login_required
+def import_status(import_log_id):
+    """Return queue/progress state of one of the current user's imports"""
+    import_log = ImportLog.query.filter_by(id=import_log_id, user_id=current_user.id).first()
+    if not import_log:
+        return jsonify({'success': False, 'message': 'Import not found'}), 404
+    
+    queue_position = None
+    if import_log.status == 'queued':
+        queue_position = ImportLog.query.filter(
+            ImportLog.status == 'queued',
+            ImportLog.created_at <= import_log.created_at,
+            ImportLog.id <= import_log.id
+        ).count()
+    
+    return jsonify({
+        'success': True,
+        'import_log': import_log.to_dict(),
+        'queue_position': queue_position
+    })
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
@@ -0,0 +1,178 @@
+"""
+Achievement criteria as data, evaluated for one user in one statement
+
+Each achievement's (category, condition_type) names a Rule in RULES:
+
+    metric       what is measured (see METRICS, plus 'records' and 'goal_categories')
+    aggregation  'sum', 'max' or 'days' with data over the metric's daily values,
+                 the longest 'streak' or 'current_streak' of consecutive days, or
+                 the metric's own 'change' / 'improvement'
+    window       only the last N days, or None for all time
+    threshold    value to reach, or None for the achievement's condition_value
+
+AchievementRuleQuery compiles the rules into a single SELECT: every distinct
+aggregate becomes one column of a one-row subquery, read from the user's
+AchievementStats row or Streak rows where those keep that aggregate and from
+the daily rollups otherwise. The achievements the user has not earned yet are
+joined to it and filtered by their rule's threshold, so adding achievements (in
+app/init/achievements.py or elsewhere) adds no queries, and rules sharing an
+aggregate share its column.
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import and_, case, false, func, or_, select, true
+from app import db
+from app.models.achievement import Achievement, AchievementStats, UserAchievement
+from app.models.goal import Goal
+from app.models.rollup import ActivityDailyRollup, HeartRateDailyRollup, SleepDailyRollup, WeightDailyRollup
+from app.models.streak import Streak
+from app.services.streak_service import STREAK_SPECS
+
+Rule = namedtuple('Rule', ['metric', 'aggregation', 'window', 'threshold'], defaults=(None, None))
+
+# Daily values of each metric: (rollup, value column, extra conditions)
+METRICS = {
+    'steps': (ActivityDailyRollup, ActivityDailyRollup.total, (ActivityDailyRollup.activity_type == 'steps',)),
+    'activities': (ActivityDailyRollup, ActivityDailyRollup.count, ()),
+    'weights': (WeightDailyRollup, WeightDailyRollup.count, ()),
+    'sleeps': (SleepDailyRollup, SleepDailyRollup.count, ()),
+    'sleep_minutes': (SleepDailyRollup, SleepDailyRollup.duration, ()),
+    'heart_rates': (HeartRateDailyRollup, HeartRateDailyRollup.count, ()),
+}
+
+# Metrics with a Streak row, by its Streak.metric
+STREAK_METRICS = {'steps': 'steps', 'weights': 'weight', 'sleeps': 'sleep', 'heart_rates': 'heart_rate'}
+
+RECORD_COUNTS = (AchievementStats.activity_count, AchievementStats.weight_count,
+                 AchievementStats.sleep_count, AchievementStats.heart_rate_count)
+GOAL_CATEGORIES = ('steps', 'weight', 'sleep', 'heart_rate')
+
+
+def _improvement():
+    """Latest heart rate below the average of the earlier readings; NULL with fewer than two"""
+    stats = AchievementStats
+    return case((stats.heart_rate_count >= 2, (stats.heart_rate_total - stats.latest_heart_rate)
+                 / (stats.heart_rate_count - 1) - stats.latest_heart_rate))
+
+
+# All-time aggregates AchievementStats keeps current; a NULL means the rule cannot be met yet
+STATS_AGGREGATES = {
+    ('steps', 'max'): AchievementStats.max_daily_steps,
+    ('activities', 'sum'): AchievementStats.activity_count,
+    ('weights', 'sum'): AchievementStats.weight_count,
+    ('weights', 'change'): func.abs(AchievementStats.latest_weight - AchievementStats.first_weight),
+    ('sleeps', 'sum'): AchievementStats.sleep_count,
+    ('heart_rates', 'sum'): AchievementStats.heart_rate_count,
+    ('heart_rates', 'improvement'): _improvement(),
+    ('records', 'sum'): sum(func.coalesce(count, 0) for count in RECORD_COUNTS),
+}
+
+RULES = {
+    ('steps', 'milestone'): Rule('steps', 'max'),
+    # Days of at least streak_service.STEPS_STREAK_TARGET steps
+    ('steps', 'streak'): Rule('steps', 'streak'),
+    ('weight', 'milestone'): Rule('weights', 'sum'),
+    ('weight', 'improvement'): Rule('weights', 'change'),
+    ('weight', 'streak'): Rule('weights', 'streak'),
+    ('sleep', 'milestone'): Rule('sleeps', 'sum'),
+    ('sleep', 'streak'): Rule('sleeps', 'streak'),
+    ('heart_rate', 'milestone'): Rule('heart_rates', 'sum'),
+    ('heart_rate', 'streak'): Rule('heart_rates', 'streak'),
+    ('heart_rate', 'improvement'): Rule('heart_rates', 'improvement'),
+    ('general', 'milestone'): Rule('records', 'sum'),
+    # Goals set in every category, whatever the condition_value
+    ('general', 'goal'): Rule('goal_categories', 'sum', threshold=len(GOAL_CATEGORIES)),
+}
+
+
+class AchievementRuleQuery:
+    """
+    Achievements a user has newly met, under a set of rules
+
+    Args:
+        user_id (int): The user whose achievements to evaluate
+        rules (dict): {(category, condition_type): Rule}, RULES by default
+        today (date): Last day of windowed and current-streak rules, today (UTC) by default
+    """
+
+    def __init__(self, user_id, rules=None, today=None):
+        self.user_id = user_id
+        self.rules = RULES if rules is None else rules
+        self.today = today or datetime.utcnow().date()
+
+    def aggregate(self, rule):
+        """SQL expression of a rule's aggregate, over AchievementStats or a scalar subquery"""
+        user_id = self.user_id
+        if rule.window is None and (rule.metric, rule.aggregation) in STATS_AGGREGATES:
+            return STATS_AGGREGATES[rule.metric, rule.aggregation]
+
+        if rule.aggregation in ('streak', 'current_streak') and rule.metric in STREAK_METRICS and rule.window is None:
+            length = Streak.longest_length
+            if rule.aggregation == 'current_streak':
+                # Same test as Streak.current(): the run reached today or yesterday
+                length = case((Streak.current_end >= self.today - timedelta(days=1), Streak.current_length), else_=0)
+            return select(length).where(
+                Streak.user_id == user_id, Streak.metric == STREAK_METRICS[rule.metric]
+            ).scalar_subquery()
+
+        if rule.metric == 'goal_categories' and rule.window is None:
+            return select(func.count(func.distinct(Goal.category))).where(
+                Goal.user_id == user_id, Goal.category.in_(GOAL_CATEGORIES)
+            ).scalar_subquery()
+
+        if rule.metric in METRICS and rule.aggregation in ('sum', 'max', 'days'):
+            rollup, value, conditions = METRICS[rule.metric]
+            query = select({
+                'sum': func.coalesce(func.sum(value), 0),
+                'max': func.coalesce(func.max(value), 0),
+                'days': func.count(func.distinct(rollup.day)),
+            }[rule.aggregation]).where(rollup.user_id == user_id, *conditions)
+            if rule.aggregation == 'days':
+                query = query.where(value > 0)
+            if rule.window is not None:
+                query = query.where(rollup.day > self.today - timedelta(days=rule.window), rollup.day <= self.today)
+            return query.scalar_subquery()
+
+        raise ValueError(f"Unsupported achievement rule {rule}")
+
+    def statement(self):
+        """One SELECT of the unearned achievements whose rule is met, with the user's stats and streak row counts"""
+        columns, labels = [], {}
+        for rule in self.rules.values():
+            # Rules differing only in threshold share a column
+            aggregate_key = rule._replace(threshold=None)
+            if aggregate_key not in labels:
+                labels[aggregate_key] = f'aggregate_{len(labels)}'
+                columns.append(self.aggregate(rule).label(labels[aggregate_key]))
+        streak_rows = select(func.count()).where(Streak.user_id == self.user_id).scalar_subquery()
+        aggregates = select(AchievementStats.id.label('stats_id'), streak_rows.label('streak_rows'), *columns).where(
+            AchievementStats.user_id == self.user_id
+        ).subquery('aggregates')
+
+        met = [
+            and_(Achievement.category == category, Achievement.condition_type == condition_type,
+                 aggregates.c[labels[rule._replace(threshold=None)]]
+                 >= (Achievement.condition_value if rule.threshold is None else rule.threshold))
+            for (category, condition_type), rule in self.rules.items()
+        ]
+        earned = select(UserAchievement.achievement_id).where(UserAchievement.user_id == self.user_id)
+        # Outer join: without a stats row every unearned achievement comes back with a NULL
+        # stats_id, and without every Streak row with fewer streak_rows
+        missing = or_(aggregates.c.stats_id.is_(None), aggregates.c.streak_rows < len(STREAK_SPECS))
+        return select(Achievement, aggregates.c.stats_id, aggregates.c.streak_rows).outerjoin(aggregates, true()).where(
+            Achievement.id.not_in(earned),
+            or_(missing, *met) if met else false(),
+        ).order_by(Achievement.id)
+
+    def fetch(self):
+        """
+        Run the statement
+
+        Returns:
+            list: The newly met Achievements, or None when the user's AchievementStats
+            or Streak rows have not been built yet
+        """
+        rows = db.session.execute(self.statement()).all()
+        if any(stats_id is None or streak_rows < len(STREAK_SPECS) for _, stats_id, streak_rows in rows):
+            return None
+        return [achievement for achievement, _, _ in rows]
@@ -0,0 +1,160 @@
+"""
+Running per-user aggregates for the achievement rules
+
+check_achievements_for_user used to load a user's raw weights, sleeps, heart
+rates and daily steps for every rule. The values the rules need are kept in
+one AchievementStats row per user instead:
+
+    record counts              sums of the daily rollups' counts
+    max_daily_steps            best day of 'steps' activities
+    first/latest weight        for the change since the first weighing
+    heart rate total/latest    for the latest reading against the earlier average
+
+Streaks are kept in the same way by app.services.streak_service.
+
+The row is built from the rollups the first time a user's achievements are
+checked. After that, rollup_service hands apply_rollup_change() the old and new
+rollup rows of every day an import batch or ORM write refreshed, and only the
+difference is applied: counts and totals by their deltas, the best day by
+looking at the refreshed days. Only a best day that shrinks makes it be
+recomputed from the rollups. Deltas are added in the UPDATE itself rather
+than read and written back, so concurrent imports of one user keep both.
+"""
+from datetime import datetime
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models.achievement import AchievementStats
+from app.models.heart_rate import HeartRate
+from app.models.rollup import ActivityDailyRollup, HeartRateDailyRollup, SleepDailyRollup, WeightDailyRollup
+from app.models.weight import Weight
+from app.services.rollup_service import add_rollup_listener
+
+# rollup: daily rollup model -> stats column of its record count
+COUNT_COLUMNS = {
+    ActivityDailyRollup: 'activity_count',
+    WeightDailyRollup: 'weight_count',
+    SleepDailyRollup: 'sleep_count',
+    HeartRateDailyRollup: 'heart_rate_count',
+}
+
+
+def _daily_steps(rows):
+    return {row['day']: row['total'] or 0 for row in rows if row['activity_type'] == 'steps'}
+
+
+def _max_daily_steps(connection, user_id):
+    return connection.execute(
+        select(func.coalesce(func.max(ActivityDailyRollup.total), 0)).where(
+            ActivityDailyRollup.user_id == user_id, ActivityDailyRollup.activity_type == 'steps'
+        )
+    ).scalar()
+
+
+def _first_and_latest(connection, model, user_id):
+    """(value, timestamp) of a user's earliest and latest raw row, from the (user_id, timestamp) index"""
+    query = select(model.value, model.timestamp).where(model.user_id == user_id).limit(1)
+    first = connection.execute(query.order_by(model.timestamp.asc())).first()
+    latest = connection.execute(query.order_by(model.timestamp.desc())).first()
+    return first or (None, None), latest or (None, None)
+
+
+def build_stats(connection, user_id):
+    """Every aggregate of a user, computed from the rollups"""
+    def total(column):
+        table = column.class_
+        return select(func.coalesce(func.sum(column), 0)).where(table.user_id == user_id).scalar_subquery()
+
+    counts = connection.execute(select(
+        *[total(rollup.count).label(column) for rollup, column in COUNT_COLUMNS.items()],
+        total(HeartRateDailyRollup.total).label('heart_rate_total'),
+    )).mappings().one()
+    values = {'user_id': user_id, **counts, 'max_daily_steps': _max_daily_steps(connection, user_id),
+              'updated_at': datetime.utcnow()}
+
+    (values['first_weight'], values['first_weight_at']), (values['latest_weight'], values['latest_weight_at']) = (
+        _first_and_latest(connection, Weight, user_id)
+    )
+    _, (values['latest_heart_rate'], values['latest_heart_rate_at']) = _first_and_latest(connection, HeartRate, user_id)
+    return values
+
+
+def apply_rollup_change(connection, rollup, user_id, first_day, last_day, old_rows, new_rows):
+    """
+    Apply a refresh of a user's daily rollup to their AchievementStats row
+
+    Registered with rollup_service; users whose row has not been built yet are
+    skipped, their row is built from the up-to-date rollups when first read.
+    """
+    table = AchievementStats.__table__
+    stats = connection.execute(select(table).where(table.c.user_id == user_id)).mappings().first()
+    if stats is None:
+        return
+    count_column = COUNT_COLUMNS[rollup]
+
+    values = {}
+    count_change = sum(row['count'] for row in new_rows) - sum(row['count'] for row in old_rows)
+    if count_change:
+        values[count_column] = func.coalesce(table.c[count_column], 0) + count_change
+
+    if rollup is ActivityDailyRollup:
+        best = stats['max_daily_steps'] or 0
+        old_steps, new_steps = _daily_steps(old_rows), _daily_steps(new_rows)
+        if any(steps >= best and new_steps.get(day, 0) < steps for day, steps in old_steps.items()):
+            # The best day went down; another day may be the best now
+            best = _max_daily_steps(connection, user_id)
+        else:
+            best = max([best, *new_steps.values()])
+        if best != stats['max_daily_steps']:
+            values['max_daily_steps'] = best
+    elif rollup is WeightDailyRollup and (old_rows or new_rows):
+        (values['first_weight'], values['first_weight_at']), (values['latest_weight'], values['latest_weight_at']) = (
+            _first_and_latest(connection, Weight, user_id)
+        )
+    elif rollup is HeartRateDailyRollup and (old_rows or new_rows):
+        values['heart_rate_total'] = func.coalesce(table.c.heart_rate_total, 0) + (
+            sum(row['total'] or 0 for row in new_rows) - sum(row['total'] or 0 for row in old_rows)
+        )
+        _, (values['latest_heart_rate'], values['latest_heart_rate_at']) = (
+            _first_and_latest(connection, HeartRate, user_id)
+        )
+
+    if values:
+        values['updated_at'] = datetime.utcnow()
+        connection.execute(update(table).where(table.c.user_id == user_id).values(**values))
+
+
+def reset_stats(connection, user_id=None):
+    """Drop the aggregates of a user (or everyone) so they are rebuilt when next read"""
+    stale = delete(AchievementStats.__table__)
+    if user_id is not None:
+        stale = stale.where(AchievementStats.user_id == user_id)
+    connection.execute(stale)
+
+
+def get_stats(user_id):
+    """
+    A user's AchievementStats, building and committing the row if it does not exist yet
+
+    Returns:
+        AchievementStats: The user's aggregates, freshly read from the database
+    """
+    query = AchievementStats.query.filter_by(user_id=user_id).populate_existing()
+    stats = query.first()
+    if stats is not None:
+        return stats
+
+    values = build_stats(db.session.connection(), user_id)
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(AchievementStats), [values])
+    except IntegrityError:
+        pass  # Built by a concurrent check in the meantime
+    db.session.commit()
+    return query.first()
+
+
+def register_stats_listeners():
+    """Keep AchievementStats rows current whenever the daily rollups are refreshed"""
+    for rollup in COUNT_COLUMNS:
+        add_rollup_listener(rollup, apply_rollup_change, on_rebuild=reset_stats)
@@ -0,0 +1,197 @@
+"""
+Bulk writer for health data imports
+
+Inserts plain dicts with SQLAlchemy Core instead of going through the ORM unit
+of work. On PostgreSQL with psycopg2 rows are streamed with COPY FROM STDIN;
+everywhere else a Core insert() is executed with executemany.
+
+With skip_duplicates the insert becomes INSERT ... ON CONFLICT DO NOTHING, so rows
+that collide with a unique natural key are dropped and counted instead of failing
+the batch. COPY cannot skip conflicts itself, so rows are staged in a temporary
+table and moved across with INSERT ... SELECT ... ON CONFLICT DO NOTHING.
+"""
+import io
+import logging
+import time
+from datetime import datetime, date
+from sqlalchemy.dialects import postgresql, sqlite
+from app import db
+
+logger = logging.getLogger(__name__)
+
+# Rows per round trip. SQLite executemany is bound by Python-side work so
+# moderate batches keep memory low; COPY on PostgreSQL benefits from large batches.
+DEFAULT_BATCH_SIZES = {
+    'sqlite': 10000,
+    'postgresql': 50000,
+}
+FALLBACK_BATCH_SIZE = 10000
+
+# Dialect-specific insert() constructs that support on_conflict_do_nothing()
+CONFLICT_INSERTS = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+
+def batch_size_for(engine):
+    """Return the default batch size for the engine's dialect"""
+    return DEFAULT_BATCH_SIZES.get(engine.dialect.name, FALLBACK_BATCH_SIZE)
+
+
+def uses_copy(engine):
+    """True when the engine can stream rows with COPY FROM STDIN"""
+    return engine.dialect.name == 'postgresql' and engine.dialect.driver == 'psycopg2'
+
+
+def _copy_value(value):
+    """Format one value for COPY ... FROM STDIN (text format)"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, date):
+        return value.isoformat()
+    return (str(value)
+            .replace('\\', '\\\\')
+            .replace('\t', '\\t')
+            .replace('\n', '\\n')
+            .replace('\r', '\\r'))
+
+
+class BulkWriter:
+    """
+    Buffers rows for one table and writes them in batches
+
+    Rows are plain dicts keyed by column name. Column defaults (created_at,
+    updated_at, ...) are filled in by the writer so every row in a batch has
+    the same keys, which both executemany and COPY require.
+
+    on_flush, if given, is called after each committed batch with the number of
+    rows inserted and the batch's rows.
+    """
+    def __init__(self, model, batch_size=None, on_flush=None, engine=None, skip_duplicates=False):
+        self.table = model.__table__ if hasattr(model, '__table__') else model
+        self.engine = engine or db.engine
+        self.batch_size = batch_size or batch_size_for(self.engine)
+        self.use_copy = uses_copy(self.engine)
+        self.skip_duplicates = skip_duplicates
+        self.on_flush = on_flush
+        self.rows = []
+        self.count = 0
+        self.skipped = 0
+        self.write_seconds = 0.0
+        self._columns = [c for c in self.table.columns if not (c.primary_key and c.autoincrement)]
+
+    @property
+    def rows_per_second(self):
+        """Rows written per second spent inside the database"""
+        if not self.write_seconds:
+            return None
+        return round(self.count / self.write_seconds, 1)
+
+    def write(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def write_many(self, rows):
+        for row in rows:
+            self.write(row)
+
+    def flush(self):
+        """Write buffered rows and commit, returning how many were inserted"""
+        if not self.rows:
+            return 0
+        rows = self._complete_rows(self.rows)
+        self.rows = []
+
+        started = time.perf_counter()
+        if self.use_copy:
+            batch_count = self._copy(rows)
+        else:
+            batch_count = self._insert(rows)
+        db.session.commit()
+        self.write_seconds += time.perf_counter() - started
+
+        self.count += batch_count
+        self.skipped += len(rows) - batch_count
+        if self.on_flush:
+            self.on_flush(batch_count, rows)
+        return batch_count
+
+    def _complete_rows(self, rows):
+        """Fill column defaults and missing keys so every row has the same shape"""
+        now = datetime.utcnow()
+        completed = []
+        for row in rows:
+            row = dict(row)
+            for column in self._columns:
+                if column.key in row:
+                    continue
+                default = column.default
+                if default is not None:
+                    if default.is_scalar:
+                        row[column.key] = default.arg
+                    elif default.is_callable:
+                        row[column.key] = default.arg(None)
+                    else:
+                        # SQL expression defaults such as CURRENT_TIMESTAMP
+                        row[column.key] = now
+                else:
+                    row[column.key] = None
+            completed.append(row)
+        return completed
+
+    def _insert(self, rows):
+        """executemany insert; returns the number of rows actually inserted"""
+        insert = CONFLICT_INSERTS.get(self.engine.dialect.name) if self.skip_duplicates else None
+        if insert is None:
+            db.session.execute(self.table.insert(), rows)
+            return len(rows)
+
+        statement = insert(self.table).on_conflict_do_nothing()
+        if self.engine.dialect.name == 'sqlite':
+            # sqlite3 sums rowcount over executemany, skipped rows count as 0
+            return db.session.execute(statement, rows).rowcount
+        primary_key = list(self.table.primary_key.columns)[0]
+        return len(db.session.execute(statement.returning(primary_key), rows).all())
+
+    def _copy(self, rows):
+        """Stream rows with COPY FROM STDIN on the session's connection"""
+        column_names = [c.key for c in self._columns]
+        columns = ", ".join(column_names)
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write('\t'.join(_copy_value(row.get(name)) for name in column_names))
+            buffer.write('\n')
+        buffer.seek(0)
+
+        connection = db.session.connection()
+        cursor = connection.connection.dbapi_connection.cursor()
+        try:
+            if not self.skip_duplicates:
+                cursor.copy_expert(f'COPY {self.table.name} ({columns}) FROM STDIN', buffer)
+                return len(rows)
+
+            staging = f'{self.table.name}_staging'
+            cursor.execute(f'CREATE TEMP TABLE IF NOT EXISTS {staging} '
+                           f'(LIKE {self.table.name} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS')
+            cursor.copy_expert(f'COPY {staging} ({columns}) FROM STDIN', buffer)
+            cursor.execute(f'INSERT INTO {self.table.name} ({columns}) '
+                           f'SELECT {columns} FROM {staging} ON CONFLICT DO NOTHING')
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+
+def model_to_row(instance):
+    """Return the column values set on an unsaved ORM instance as a plain dict"""
+    state = instance.__dict__
+    return {
+        column.key: state[column.key]
+        for column in instance.__table__.columns
+        if column.key in state
+    }
@@ -0,0 +1,151 @@
+"""
+Fill a user's caches right after an import
+
+An import bumps the user's data version, so the next dashboard visit would
+compute every panel cold: the summary, the 7 and 30 day dashboard, goals and
+achievements, and each chart period. warm_user_caches computes them ahead of
+that visit, together with the dashboards of the user's active share links.
+
+Dashboard and share views are run inside a synthetic request for the user, so
+their entries land under exactly the keys real requests use. Chart data comes
+straight from TimeSeriesQuery.
+
+Imports processed by `flask import-worker` are warmed in the worker, which only
+helps when the cache is shared with the web processes (CACHE_TYPE sqlite,
+filesystem or redis). Direct uploads are warmed in a background thread of the
+web process that handled them.
+"""
+import json
+import logging
+import threading
+import time
+from flask import current_app, request, url_for
+from flask_login import login_user
+from app import db
+from app.models import ImportLog, SharedLink, User
+from app.services.time_series_query import METRICS, PERIODS, TimeSeriesQuery
+from app.utils.cache_utils import cache_is_shared
+
+logger = logging.getLogger(__name__)
+
+WARM_DAYS = (7, 30)
+DASHBOARD_ENDPOINTS = (
+    'dashboard.get_dashboard_data',
+    'dashboard.get_dashboard_summary',
+    'dashboard.get_dashboard_goals_achievements',
+)
+
+
+def _dispatch(endpoint, user=None, **values):
+    """Run a view in a request made up for it and return the response status"""
+    app = current_app._get_current_object()
+    with app.test_request_context():
+        path = url_for(endpoint, **values)
+    with app.test_request_context(path):
+        if user is not None:
+            login_user(user)
+        # The view alone: before_request hooks would take BASE_URL from this made-up request
+        view = app.view_functions[request.url_rule.endpoint]
+        response = app.make_response(view(**request.view_args))
+    if response.status_code >= 400:
+        raise RuntimeError(f'{path} returned {response.status_code}')
+    return response.status_code
+
+
+def _shared_dashboards(user_id):
+    """Tokens of the user's unexpired share links that include the dashboard"""
+    links = SharedLink.query.filter_by(user_id=user_id).all()
+    return [
+        link.share_token for link in links
+        if not link.is_expired and 'dashboard' in json.loads(link.modules or '[]')
+    ]
+
+
+def warm_user_caches(user_id):
+    """
+    Compute and cache a user's dashboard, chart and shared dashboard payloads
+
+    Args:
+        user_id (int): The user whose caches to fill
+
+    Returns:
+        dict: Number of entries 'warmed' and 'failed', and the 'seconds' it took
+    """
+    started = time.perf_counter()
+    user = db.session.get(User, user_id)
+    tasks = []
+    for days in WARM_DAYS:
+        for endpoint in DASHBOARD_ENDPOINTS:
+            tasks.append((f'{endpoint} days={days}',
+                          lambda endpoint=endpoint, days=days: _dispatch(endpoint, user, days=days)))
+    for metric in METRICS:
+        for period in PERIODS:
+            tasks.append((f'{metric} {period} chart',
+                          lambda metric=metric, period=period: TimeSeriesQuery(metric, user_id, period).chart_data()))
+    for token in _shared_dashboards(user_id):
+        tasks.append((f'shared dashboard {token}',
+                      lambda token=token: _dispatch('share.get_shared_dashboard', share_token=token)))
+
+    warmed = failed = 0
+    for label, task in tasks:
+        try:
+            task()
+            warmed += 1
+        except Exception as e:
+            failed += 1
+            db.session.rollback()
+            logger.warning(f"Cache warming of {label} for user {user_id} failed: {str(e)}")
+
+    seconds = round(time.perf_counter() - started, 3)
+    logger.info(f"Warmed {warmed} cache entries for user {user_id} in {seconds}s ({failed} failed)")
+    return {'warmed': warmed, 'failed': failed, 'seconds': seconds}
+
+
+def warm_after_import(import_log):
+    """
+    Warm the caches of a finished import's user and record the time on the import log
+
+    Returns:
+        dict: The warm_user_caches result, or None when the import did not succeed
+    """
+    if import_log.status not in ('success', 'partial'):
+        return None
+    result = warm_user_caches(import_log.user_id)
+    import_log.cache_warm_seconds = result['seconds']
+    db.session.commit()
+    return result
+
+
+def warm_in_background(import_log_id):
+    """Warm the caches for an import in a daemon thread of this process"""
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            try:
+                import_log = db.session.get(ImportLog, import_log_id)
+                if import_log is not None:
+                    warm_after_import(import_log)
+            except Exception as e:
+                logger.error(f"Cache warming for import {import_log_id} failed: {str(e)}")
+            finally:
+                db.session.remove()
+
+    thread = threading.Thread(target=run, name=f'cache-warm-{import_log_id}', daemon=True)
+    thread.start()
+    return thread
+
+
+def warm_in_worker(import_log):
+    """Warm the caches for an import processed by an import worker, if the web processes can see them"""
+    if not current_app.config.get('CACHE_WARM_AFTER_IMPORT'):
+        return None
+    if not cache_is_shared():
+        logger.info(f"Skipping cache warming for import {import_log.id}: the cache is local to this worker")
+        return None
+    try:
+        return warm_after_import(import_log)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Cache warming for import {import_log.id} failed: {str(e)}")
+        return None
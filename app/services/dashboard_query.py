@@ -0,0 +1,247 @@
+"""
+Every dashboard metric in one statement
+
+The dashboard used to run a query per panel: recent weights, daily heart
+rate, activity types, daily activity, recent sleeps, recent heart rates and
+recent steps, plus a count per table for the log. DashboardQuery builds a
+single statement instead, a UNION ALL of small selects over shared CTEs:
+
+    recent_weights, recent_heart_rates,   the 100 most recent rows in the range,
+    recent_activities, recent_sleeps      as the summary has always used
+    heart_rate_days, activity_days        the 100 most recent days of the rollups
+    step_days                             recent steps and walking summed per day
+
+ROW_NUMBER() windows pick the latest weight and the longest sleep of each day
+and the newest/oldest of the recent weights, so only the rows the dashboard
+shows come back. Every select returns the same columns:
+
+    section  which part of the dashboard the row belongs to (see SECTIONS)
+    day      the calendar day, for per-day rows
+    label    unit, or sleep quality
+    value, low, high, count
+
+Only portable SQL is used (CTEs, window functions, date()), so the statement
+runs unchanged on SQLite and PostgreSQL. Days come back as 'YYYY-MM-DD' text on
+SQLite and as dates on PostgreSQL and are formatted with str().
+"""
+import math
+from collections import defaultdict
+from sqlalchemy import Date, Float, Integer, String, case, cast, func, literal, null, select, union_all
+from app import db
+from app.models import Activity, HeartRate, Sleep, Weight
+from app.models.rollup import ActivityDailyRollup, HeartRateDailyRollup
+
+RECENT_ROWS = 100
+CHART_DAYS = 30
+STEP_TYPES = ('steps', 'walking')
+SLEEP_QUALITIES = ('poor', 'fair', 'good', 'excellent')
+SECTIONS = (
+    'weight_day', 'weight_summary',
+    'heart_rate_day', 'heart_rate_summary',
+    'activity_day', 'activity_summary',
+    'sleep_day', 'sleep_summary', 'sleep_quality',
+)
+
+
+def _day(column):
+    """Calendar day of a naive timestamp column"""
+    return func.date(column)
+
+
+def _row(section, day=None, label=None, value=None, low=None, high=None, count=None):
+    """The columns every section select returns, typed NULL where a section has no value"""
+    return [
+        literal(section, String).label('section'),
+        (cast(null(), Date) if day is None else day).label('day'),
+        (cast(null(), String) if label is None else label).label('label'),
+        (cast(null(), Float) if value is None else value).label('value'),
+        (cast(null(), Float) if low is None else low).label('low'),
+        (cast(null(), Float) if high is None else high).label('high'),
+        (cast(null(), Integer) if count is None else count).label('count'),
+    ]
+
+
+def _number(value):
+    """A float for the summary, 0 for NULL, NaN or Infinity"""
+    if value is None:
+        return 0.0
+    value = float(value)
+    return 0.0 if math.isnan(value) or math.isinf(value) else value
+
+
+class DashboardQuery:
+    """
+    Weight, heart rate, activity and sleep panels of one user's dashboard
+
+    Args:
+        user_id (int): The user whose dashboard to read
+        since (datetime): Start of the range, as the dashboard's `days` parameter gives it
+    """
+
+    def __init__(self, user_id, since):
+        self.user_id = user_id
+        self.since = since
+
+    def statement(self):
+        """The UNION ALL of every section, as one SQLAlchemy select"""
+        user_id, since = self.user_id, self.since
+
+        recent_weights = select(Weight.timestamp, Weight.value, Weight.unit).where(
+            Weight.user_id == user_id, Weight.timestamp >= since
+        ).order_by(Weight.timestamp.desc()).limit(RECENT_ROWS).cte('recent_weights')
+        ranked_weights = select(
+            recent_weights,
+            func.row_number().over(order_by=recent_weights.c.timestamp.desc()).label('newest'),
+            func.row_number().over(order_by=recent_weights.c.timestamp.asc()).label('oldest'),
+            func.row_number().over(
+                partition_by=_day(recent_weights.c.timestamp), order_by=recent_weights.c.timestamp.desc()
+            ).label('day_rank'),
+        ).cte('ranked_weights')
+
+        recent_heart_rates = select(HeartRate.value).where(
+            HeartRate.user_id == user_id, HeartRate.timestamp >= since
+        ).order_by(HeartRate.timestamp.desc()).limit(RECENT_ROWS).cte('recent_heart_rates')
+        heart_rate_days = select(
+            HeartRateDailyRollup.day, HeartRateDailyRollup.unit, HeartRateDailyRollup.min_value,
+            HeartRateDailyRollup.max_value, HeartRateDailyRollup.total, HeartRateDailyRollup.count
+        ).where(
+            HeartRateDailyRollup.user_id == user_id,
+            HeartRateDailyRollup.day >= since.date(),
+            HeartRateDailyRollup.count > 0
+        ).order_by(HeartRateDailyRollup.day.desc()).limit(RECENT_ROWS).cte('heart_rate_days')
+
+        activity_days = select(
+            ActivityDailyRollup.day, func.sum(ActivityDailyRollup.total).label('total')
+        ).where(
+            ActivityDailyRollup.user_id == user_id, ActivityDailyRollup.day >= since.date()
+        ).group_by(ActivityDailyRollup.day).order_by(ActivityDailyRollup.day.desc()).limit(RECENT_ROWS).cte('activity_days')
+        recent_activities = select(Activity.timestamp, Activity.value).where(
+            Activity.user_id == user_id, Activity.activity_type.in_(STEP_TYPES), Activity.timestamp >= since
+        ).order_by(Activity.timestamp.desc()).limit(RECENT_ROWS).cte('recent_activities')
+        step_days = select(
+            func.sum(recent_activities.c.value).label('total')
+        ).group_by(_day(recent_activities.c.timestamp)).cte('step_days')
+
+        recent_sleeps = select(Sleep.timestamp, Sleep.duration, Sleep.quality).where(
+            Sleep.user_id == user_id, Sleep.timestamp >= since
+        ).order_by(Sleep.timestamp.desc()).limit(RECENT_ROWS).cte('recent_sleeps')
+        ranked_sleeps = select(
+            recent_sleeps,
+            func.row_number().over(
+                partition_by=_day(recent_sleeps.c.timestamp),
+                order_by=(recent_sleeps.c.duration.desc(), recent_sleeps.c.timestamp.desc())
+            ).label('day_rank'),
+        ).cte('ranked_sleeps')
+
+        return union_all(
+            select(*_row('weight_day', day=_day(ranked_weights.c.timestamp), label=ranked_weights.c.unit,
+                         value=ranked_weights.c.value)).where(ranked_weights.c.day_rank == 1),
+            select(*_row('weight_summary',
+                         value=func.max(case((ranked_weights.c.newest == 1, ranked_weights.c.value))),
+                         low=func.max(case((ranked_weights.c.oldest == 1, ranked_weights.c.value))),
+                         count=func.count())),
+            select(*_row('heart_rate_day', day=heart_rate_days.c.day, label=heart_rate_days.c.unit,
+                         value=heart_rate_days.c.total, low=heart_rate_days.c.min_value,
+                         high=heart_rate_days.c.max_value, count=heart_rate_days.c.count)),
+            select(*_row('heart_rate_summary', value=func.avg(recent_heart_rates.c.value),
+                         low=func.min(recent_heart_rates.c.value), high=func.max(recent_heart_rates.c.value),
+                         count=func.count(recent_heart_rates.c.value))),
+            select(*_row('activity_day', day=activity_days.c.day, value=activity_days.c.total)),
+            select(*_row('activity_summary', value=func.sum(step_days.c.total),
+                         high=func.max(step_days.c.total), count=func.count())),
+            select(*_row('sleep_day', day=_day(ranked_sleeps.c.timestamp), label=ranked_sleeps.c.quality,
+                         value=ranked_sleeps.c.duration)).where(ranked_sleeps.c.day_rank == 1),
+            select(*_row('sleep_summary', value=func.avg(recent_sleeps.c.duration),
+                         high=func.max(recent_sleeps.c.duration), count=func.count())),
+            select(*_row('sleep_quality', label=recent_sleeps.c.quality, count=func.count())).where(
+                recent_sleeps.c.quality.in_(SLEEP_QUALITIES)
+            ).group_by(recent_sleeps.c.quality),
+        )
+
+    def fetch(self):
+        """
+        Run the statement and shape its rows for the dashboard
+
+        Returns:
+            dict: 'weights', 'heartRates', 'activities' and 'sleeps' per day, and the 'summary'
+        """
+        rows = defaultdict(list)
+        for row in db.session.execute(self.statement()):
+            rows[row.section].append(row)
+
+        weights = sorted(({
+            'date': str(row.day),
+            'value': float(row.value),
+            'unit': row.label or 'kg'
+        } for row in rows['weight_day']), key=lambda item: item['date'])[-CHART_DAYS:]
+        # Newest day first, as the charts have always received them
+        heart_rates = [{
+            'date': str(row.day),
+            'min': float(row.low) if row.low is not None else 0,
+            'max': float(row.high) if row.high is not None else 0,
+            'avg': round(row.value / row.count),
+            'unit': row.label or None
+        } for row in sorted(rows['heart_rate_day'], key=lambda row: str(row.day), reverse=True)]
+        activities = [{
+            'date': str(row.day),
+            'steps': float(row.value) if row.value is not None else 0
+        } for row in sorted(rows['activity_day'], key=lambda row: str(row.day), reverse=True)]
+        sleeps = sorted(({
+            'date': str(row.day),
+            'duration': float(row.value),
+            'durationHours': round(float(row.value) / 60, 1),
+            'quality': row.label or ''
+        } for row in rows['sleep_day']), key=lambda item: item['date'])[-CHART_DAYS:]
+
+        return {
+            'weights': weights,
+            'heartRates': heart_rates,
+            'activities': activities,
+            'sleeps': sleeps,
+            'summary': self._summary(rows),
+        }
+
+    @staticmethod
+    def _summary(rows):
+        """Summary panels, leaving out metrics with no recent rows"""
+        summary = {}
+        weight = rows['weight_summary'][0] if rows['weight_summary'] else None
+        if weight is not None and weight.count:
+            latest, first = _number(weight.value), _number(weight.low)
+            change = latest - first if weight.count >= 2 else 0.0
+            summary['weight'] = {
+                'latest': latest,
+                'change': change,
+                'change_percent': _number(change / first * 100) if weight.count >= 2 and first else 0.0
+            }
+
+        heart_rate = rows['heart_rate_summary'][0] if rows['heart_rate_summary'] else None
+        if heart_rate is not None and heart_rate.count:
+            summary['heart_rate'] = {
+                'min': _number(heart_rate.low),
+                'max': _number(heart_rate.high),
+                'avg': _number(heart_rate.value)
+            }
+
+        activity = rows['activity_summary'][0] if rows['activity_summary'] else None
+        if activity is not None and activity.count:
+            total_steps = _number(activity.value)
+            summary['activity'] = {
+                'total_steps': total_steps,
+                'avg_steps': total_steps / activity.count,
+                'best_day': _number(activity.high)
+            }
+
+        sleep = rows['sleep_summary'][0] if rows['sleep_summary'] else None
+        if sleep is not None and sleep.count:
+            avg_duration, best_duration = _number(sleep.value), _number(sleep.high)
+            quality = dict.fromkeys(SLEEP_QUALITIES, 0)
+            quality.update({row.label: row.count for row in rows['sleep_quality']})
+            summary['sleep'] = {
+                'avg_duration': avg_duration,
+                'avg_duration_hours': avg_duration / 60,
+                'best_duration': best_duration,
+                'best_duration_hours': best_duration / 60,
+                'quality': quality
+            }
+        return summary
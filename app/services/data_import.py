@@ -7,7 +7,12 @@ import logging
 from app import db
 from app.models import ImportLog, Weight, HeartRate, Activity, Sleep
 from app.utils.error_handlers import FileValidationError, DataImportError
+from app.services.bulk_writer import BulkWriter, model_to_row
+from app.services.rollup_service import refresh_rollups_for_rows
+from app.utils.timestamp_parser import parse_timestamp, parse_timestamp_column
 import pandas as pd
+import numpy as np
+from sqlalchemy import func
 from datetime import datetime
 import re
 
@@ -15,38 +20,135 @@ import re
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def parse_datetime(datetime_str):
+def sleep_stage_field(stage):
+    """Map a sleep stage label to the Sleep column its minutes are added to"""
+    stage = (stage or '').lower()
+    if 'deep' in stage:
+        return 'deep_sleep'
+    elif 'light' in stage or 'core' in stage:
+        return 'light_sleep'
+    elif 'rem' in stage:
+        return 'rem_sleep'
+    elif 'awake' in stage:
+        return 'awake'
+    # If no stage information, add to total duration only
+    return 'duration'
+
+
+SLEEP_STAGE_COLUMNS = ['duration', 'deep_sleep', 'light_sleep', 'rem_sleep', 'awake']
+
+
+def aggregate_sleep_nights(df):
     """
-    Parse datetime string with timezone support.
-    Handles formats like:
-    - '2020-07-26 17:23:00 +0800'
-    - '2020-07-26T17:23:00+08:00'
+    Combine sleep stage rows into one row per night (local start date)
+
+    Uses the same stage rules as sleep_stage_field: deep, light/core, REM and awake
+    minutes are summed into their own columns, anything else into duration. The
+    night spans the earliest start to the latest end of its rows.
+
+    Returns:
+        DataFrame with start_time, end_time, the stage columns, notes and rows
+        (number of source rows) per night
     """
-    # Try direct parsing first
-    try:
-        return datetime.fromisoformat(datetime_str)
-    except ValueError:
-        pass
-    
-    # Try parsing with timezone fix
-    try:
-        # Handle format: '2020-07-26 17:23:00 +0800'
-        if '+' in datetime_str:
-            # Split into datetime and timezone
-            dt_part, tz_part = datetime_str.split('+')
-            dt_part = dt_part.strip()
-            
-            # Format timezone from +0800 to +08:00
-            if len(tz_part) == 4:  # Format: 0800
-                tz_part = f"{tz_part[:2]}:{tz_part[2:]}"
-            
-            # Combine and parse
-            return datetime.fromisoformat(f"{dt_part}+{tz_part}")
-        
-        # Handle other formats or raise error
-        return datetime.strptime(datetime_str, "%Y-%m-%d %H:%M:%S")
-    except Exception as e:
-        raise ValueError(f"Unable to parse datetime: {datetime_str}. Error: {str(e)}")
+    start_utc, start_local = parse_timestamp_column(df['start_time'])
+    end_utc, end_local = parse_timestamp_column(df['end_time'])
+    if 'stage' in df:
+        # Stage labels repeat endlessly, so classify each distinct label once
+        codes, labels = pd.factorize(df['stage'], use_na_sentinel=False)
+        field = np.array([sleep_stage_field(label if isinstance(label, str) else None) for label in labels])[codes]
+    else:
+        field = 'duration'
+    frame = pd.DataFrame({
+        'start_utc': start_utc,
+        'end_utc': end_utc,
+        'start_time': start_local,
+        'end_time': end_local,
+        'field': field,
+    }).dropna(subset=['start_utc', 'end_utc'])
+    if frame.empty:
+        return pd.DataFrame(columns=['start_time', 'end_time', *SLEEP_STAGE_COLUMNS, 'notes', 'rows'])
+
+    frame['minutes'] = (frame['end_utc'] - frame['start_utc']).dt.total_seconds() / 60
+    frame['night'] = frame['start_time'].dt.normalize()
+
+    # Earliest start / latest end by instant, reported as that row's local wall time
+    first = frame.sort_values('start_utc', kind='stable').drop_duplicates('night').set_index('night')
+    last = frame.sort_values('end_utc', kind='stable').drop_duplicates('night', keep='last').set_index('night')
+    nights = pd.DataFrame({
+        'start_time': first['start_time'],
+        'end_time': last['end_time'],
+        'rows': frame.groupby('night').size(),
+    })
+    stages = frame.pivot_table(index='night', columns='field', values='minutes', aggfunc='sum', fill_value=0)
+    for column in SLEEP_STAGE_COLUMNS:
+        nights[column] = stages[column].astype(float) if column in stages else 0.0
+
+    # Notes carry the source of the first row whose raw start matches the night start
+    keys = pd.Series(nights['start_time'].values).dt.strftime('%Y-%m-%d %H:%M:%S')
+    sources = {}
+    if 'source_name' in df:
+        matches = df.loc[df['start_time'].isin(set(keys)), ['start_time', 'source_name']]
+        sources = matches.drop_duplicates('start_time').set_index('start_time')['source_name'].to_dict()
+    nights['notes'] = [f"Source: {sources[key]}" if key in sources else "" for key in keys]
+    return nights.reset_index(drop=True)
+
+
+class SleepAccumulator:
+    """
+    Groups sleep stage rows by night (start date) the same way the CSV import does,
+    holding one small dict per day rather than every stage row
+    """
+    def __init__(self):
+        self.nights = {}
+        self.sources = {}
+
+    def add(self, row):
+        start_time = parse_timestamp(row['start_time'])
+        end_time = parse_timestamp(row['end_time'])
+        duration = (end_time - start_time).total_seconds() / 60  # Convert to minutes
+
+        date_key = start_time.date()
+        night = self.nights.get(date_key)
+        if night is None:
+            night = self.nights[date_key] = {
+                'start_time': start_time,
+                'end_time': end_time,
+                'duration': 0,
+                'deep_sleep': 0,
+                'light_sleep': 0,
+                'rem_sleep': 0,
+                'awake': 0
+            }
+        night[sleep_stage_field(row.get('stage'))] += duration
+
+        # Update time range
+        if end_time > night['end_time']:
+            night['end_time'] = end_time
+        if start_time < night['start_time']:
+            night['start_time'] = start_time
+
+        # Remember the first source seen for each raw start time, used for the notes column
+        self.sources.setdefault(row['start_time'], row.get('source_name'))
+
+    def rows(self, user_id, import_log_id):
+        """Yield one sleeps table row per night"""
+        for night in self.nights.values():
+            source_name = self.sources.get(night['start_time'].strftime('%Y-%m-%d %H:%M:%S'))
+            yield {
+                'user_id': user_id,
+                'import_log_id': import_log_id,
+                'duration': night['duration'],
+                'deep_sleep': night['deep_sleep'],
+                'light_sleep': night['light_sleep'],
+                'rem_sleep': night['rem_sleep'],
+                'awake': night['awake'],
+                'unit': 'minutes',
+                'start_time': night['start_time'],
+                'end_time': night['end_time'],
+                'timestamp': night['start_time'],
+                'notes': f"Source: {source_name}" if source_name is not None else ""
+            }
+
 
 class DataImportService:
     def __init__(self, user_id, import_log=None):
@@ -54,6 +156,91 @@ class DataImportService:
         self.import_log = import_log
         self.logger = logging.getLogger(__name__)
         self.batch_size = 10000  
+        self._writers = {}
+
+    def _writer(self, model):
+        """Return the shared BulkWriter for a model, creating it on first use"""
+        writer = self._writers.get(model)
+        if writer is None:
+            writer = self._writers[model] = BulkWriter(
+                model,
+                on_flush=lambda batch_count, rows: self._count_batch(batch_count, model, rows),
+                skip_duplicates=True
+            )
+        return writer
+
+    def _count_batch(self, batch_count, model=None, rows=()):
+        """Refresh the rollups a written batch touched and add it to the import log counters"""
+        if batch_count and model is not None:
+            refresh_rollups_for_rows(model, rows)
+            db.session.commit()
+        if self.import_log:
+            if self.import_log.records_processed is None:
+                self.import_log.records_processed = 0
+            self.import_log.records_processed += batch_count
+            self.import_log.duplicates_skipped = self._duplicates_skipped()
+            self.import_log.rows_per_second = self._rows_per_second()
+            self.import_log.heartbeat_at = datetime.utcnow()
+            db.session.commit()
+        self.logger.info(f"Successfully saved batch of {batch_count} records.")
+
+    def _duplicates_skipped(self):
+        """Rows dropped by the natural-key check across all writers used by this import"""
+        return sum(w.skipped for w in self._writers.values())
+
+    def _rows_per_second(self):
+        """Insert throughput across all writers used by this import"""
+        rows = sum(w.count for w in self._writers.values())
+        seconds = sum(w.write_seconds for w in self._writers.values())
+        return round(rows / seconds, 1) if seconds else None
+
+    def import_watermarks(self, data_source):
+        """
+        Latest data already imported for this user from one data source
+
+        Activities, heart rates and weights keep the device name, so each activity
+        type (or metric) and device gets its own watermark. Heart rates and weights
+        with an empty source, e.g. imported before they kept it, give a watermark for
+        every device (source None) that no device's own watermark falls below. Sleep
+        rows do not keep the device name and get a single watermark.
+
+        Only rows from successful imports of the same data source count: a Fitbit
+        upload never hides Apple Health history, and a failed, partial or requeued
+        import is retried in full rather than from wherever its committed batches
+        happened to stop.
+
+        Returns:
+            dict: (output key, activity type or None, source name or None) -> datetime,
+                  the format AppleHealthParser.watermarks expects
+        """
+        def scoped(query, model):
+            return query.select_from(model).join(ImportLog, ImportLog.id == model.import_log_id).filter(
+                model.user_id == self.user_id, ImportLog.data_source == data_source,
+                ImportLog.status == 'success')
+
+        watermarks = {}
+        for key, model in (('heart_rate', HeartRate), ('weight', Weight)):
+            latest = dict(scoped(db.session.query(model.data_source, func.max(model.timestamp)), model)
+                          .group_by(model.data_source).all())
+            legacy = latest.pop('', None)
+            watermarks[(key, None, None)] = legacy
+            for source_name, timestamp in latest.items():
+                watermarks[(key, None, source_name)] = max(timestamp, legacy) if legacy else timestamp
+
+        activities = scoped(
+            db.session.query(Activity.activity_type, Activity.data_source, func.max(Activity.timestamp)), Activity
+        ).group_by(Activity.activity_type, Activity.data_source)
+        for activity_type, source_name, timestamp in activities:
+            watermarks[('activity', activity_type, source_name or '')] = timestamp
+
+        last_night = scoped(db.session.query(func.max(Sleep.start_time)), Sleep).scalar()
+        if last_night is not None:
+            # Nights are keyed by start date: skip whole days already imported rather than
+            # re-importing the tail of the last night as a second, shorter night
+            watermarks[('sleep', None, None)] = datetime.combine(last_night.date() + timedelta(days=1),
+                                                                 datetime.min.time())
+
+        return {key: value for key, value in watermarks.items() if value is not None}
 
     def check_imported_data(self):
         """Check data in each table for the current user"""
@@ -155,13 +342,11 @@ class DataImportService:
         """Import data from CSV files"""
         records_to_commit = []
         sample_data = []
-        total_processed = 0  # 添加总记录计数器
         
         def commit_batch_local():
-            nonlocal records_to_commit, total_processed
+            nonlocal records_to_commit
             if records_to_commit:
                 self._save_health_data_batch(records_to_commit)
-                total_processed += len(records_to_commit)  # 更新总记录数
                 records_to_commit = []
 
         try:
@@ -180,89 +365,46 @@ class DataImportService:
                     else:
                         df = pd.read_csv(sleep_csv)
                         if not df.empty:
-                            # Group sleep records by date to combine different stages
-                            sleep_records = {}
-                            for _, row in df.iterrows():
-                                try:
-                                    start_time = parse_datetime(row['start_time'])
-                                    end_time = parse_datetime(row['end_time'])
-                                    duration = (end_time - start_time).total_seconds() / 60  # Convert to minutes
-                                    
-                                    date_key = start_time.date()
-                                    if date_key not in sleep_records:
-                                        sleep_records[date_key] = {
-                                            'start_time': start_time,
-                                            'end_time': end_time,
-                                            'total_duration': 0,
-                                            'deep_sleep': 0,
-                                            'light_sleep': 0,
-                                            'rem_sleep': 0,
-                                            'awake': 0
-                                        }
-                                    
-                                    # Update sleep stage durations based on the stage column
-                                    stage = row.get('stage', '').lower()
-                                    if 'deep' in stage:
-                                        sleep_records[date_key]['deep_sleep'] += duration
-                                    elif 'light' in stage or 'core' in stage:
-                                        sleep_records[date_key]['light_sleep'] += duration
-                                    elif 'rem' in stage:
-                                        sleep_records[date_key]['rem_sleep'] += duration
-                                    elif 'awake' in stage:
-                                        sleep_records[date_key]['awake'] += duration
-                                    else:
-                                        # If no stage information, add to total duration only
-                                        sleep_records[date_key]['total_duration'] += duration
-                                    
-                                    # Update time range
-                                    if end_time > sleep_records[date_key]['end_time']:
-                                        sleep_records[date_key]['end_time'] = end_time
-                                    if start_time < sleep_records[date_key]['start_time']:
-                                        sleep_records[date_key]['start_time'] = start_time
-                                    
-                                except Exception as e:
-                                    self.logger.error(f"Error processing sleep record: {str(e)}")
-                                    continue
-                            
-                            # Create Sleep records from the grouped data
-                            for sleep_data in sleep_records.values():
-                                # 如果CSV文件包含source_name字段，使用它来填充notes
-                                source_name = df.loc[df['start_time'] == sleep_data['start_time'].strftime('%Y-%m-%d %H:%M:%S'), 'source_name'].values
-                                source_note = f"Source: {source_name[0]}" if len(source_name) > 0 else ""
-                                
-                                record = Sleep(
-                                    user_id=self.user_id,
-                                    import_log_id=self.import_log.id,
-                                    duration=sleep_data['total_duration'],
-                                    deep_sleep=sleep_data['deep_sleep'],
-                                    light_sleep=sleep_data['light_sleep'],
-                                    rem_sleep=sleep_data['rem_sleep'],
-                                    awake=sleep_data['awake'],
-                                    unit='minutes',
-                                    start_time=sleep_data['start_time'],
-                                    end_time=sleep_data['end_time'],
-                                    timestamp=sleep_data['start_time'],
-                                    notes=source_note
-                                )
-                                records_to_commit.append(record)
-                                
-                                # Store sample data
-                                if len(sample_data) < 5:
-                                    sample_data.append({
-                                        'type': 'sleep',
-                                        'duration': sleep_data['total_duration'],
-                                        'deep_sleep': sleep_data['deep_sleep'],
-                                        'light_sleep': sleep_data['light_sleep'],
-                                        'rem_sleep': sleep_data['rem_sleep'],
-                                        'awake': sleep_data['awake'],
-                                        'unit': 'minutes',
-                                        'start_time': sleep_data['start_time'].isoformat(),
-                                        'end_time': sleep_data['end_time'].isoformat()
-                                    })
-                                
-                                # Commit batch if size threshold reached
-                                if len(records_to_commit) >= self.batch_size:
-                                    commit_batch_local() # Use the local helper function
+                            # Group sleep stage rows into nights in one vectorized pass
+                            nights = aggregate_sleep_nights(df)
+                            dropped = len(df) - int(nights['rows'].sum()) if not nights.empty else len(df)
+                            if dropped:
+                                self.logger.warning(f"Skipped {dropped} sleep records with unparseable times")
+
+                            sleep_rows = [
+                                {
+                                    'user_id': self.user_id,
+                                    'import_log_id': self.import_log.id,
+                                    'duration': night.duration,
+                                    'deep_sleep': night.deep_sleep,
+                                    'light_sleep': night.light_sleep,
+                                    'rem_sleep': night.rem_sleep,
+                                    'awake': night.awake,
+                                    'unit': 'minutes',
+                                    'start_time': night.start_time.to_pydatetime(),
+                                    'end_time': night.end_time.to_pydatetime(),
+                                    'timestamp': night.start_time.to_pydatetime(),
+                                    'notes': night.notes
+                                }
+                                for night in nights.itertuples(index=False)
+                            ]
+                            writer = self._writer(Sleep)
+                            writer.write_many(sleep_rows)
+                            writer.flush()
+
+                            # Store sample data
+                            for row in sleep_rows[:max(0, 5 - len(sample_data))]:
+                                sample_data.append({
+                                    'type': 'sleep',
+                                    'duration': row['duration'],
+                                    'deep_sleep': row['deep_sleep'],
+                                    'light_sleep': row['light_sleep'],
+                                    'rem_sleep': row['rem_sleep'],
+                                    'awake': row['awake'],
+                                    'unit': 'minutes',
+                                    'start_time': row['start_time'].isoformat(),
+                                    'end_time': row['end_time'].isoformat()
+                                })
                 except pd.errors.EmptyDataError:
                     self.logger.info("Sleep CSV is empty or has invalid format, skipping")
                 except Exception as e:
@@ -286,15 +428,16 @@ class DataImportService:
                             for _, row in df.iterrows():
                                 try:
                                     # Create Weight record - make sure we're only using valid parameters
-                                    timestamp = parse_datetime(row['timestamp'])
+                                    timestamp = parse_timestamp(row['timestamp'])
                                     
                                     record = Weight(
                                         user_id=self.user_id,
                                         import_log_id=self.import_log.id,
                                         value=float(row.get('value', 0)),
                                         unit=row.get('unit', 'kg'),
-                                        timestamp=timestamp
-                                        # weight_type, source_name, source_version, device are in CSV but not in model
+                                        timestamp=timestamp,
+                                        data_source=row.get('source_name') if pd.notna(row.get('source_name')) else ''
+                                        # weight_type, source_version, device are in CSV but not in model
                                     )
                                     records_to_commit.append(record)
                                     
@@ -336,15 +479,16 @@ class DataImportService:
                             for _, row in df.iterrows():
                                 try:
                                     # Create HeartRate record - make sure we're only using valid parameters
-                                    timestamp = parse_datetime(row['timestamp'])
+                                    timestamp = parse_timestamp(row['timestamp'])
                                     
                                     record = HeartRate(
                                         user_id=self.user_id,
                                         import_log_id=self.import_log.id,
                                         value=float(row.get('value', 0)),
                                         unit=row.get('unit', 'count/min'),
-                                        timestamp=timestamp
-                                        # heart_type, source_name, source_version, device are in CSV but not in model
+                                        timestamp=timestamp,
+                                        data_source=row.get('source_name') if pd.notna(row.get('source_name')) else ''
+                                        # heart_type, source_version, device are in CSV but not in model
                                     )
                                     records_to_commit.append(record)
                                     
@@ -386,7 +530,7 @@ class DataImportService:
                             for _, row in df.iterrows():
                                 try:
                                     # Create Activity record - make sure we're only using valid parameters
-                                    start_time = parse_datetime(row['start_time'])
+                                    start_time = parse_timestamp(row['start_time'])
                                     # Build activity info string with information that doesn't map to model fields
                                     activity_info = f"Start: {start_time.isoformat()}"
                                     if pd.notna(row.get('end_time')):
@@ -405,7 +549,7 @@ class DataImportService:
                                         value=float(row.get('value', 0)),
                                         unit=row.get('unit', 'unknown'),
                                         timestamp=start_time,
-                                        data_source=row.get('source_name', '')  # Store source in the data_source field
+                                        data_source=row.get('source_name') if pd.notna(row.get('source_name')) else ''  # Store source in the data_source field
                                     )
                                     records_to_commit.append(record)
                                     
@@ -436,7 +580,9 @@ class DataImportService:
             
             # Update import log with record count
             if self.import_log:
-                self.import_log.records_processed = total_processed  # 使用实际处理的记录总数
+                # Rows actually inserted; duplicates of existing rows are counted separately
+                self.import_log.records_processed = sum(w.count for w in self._writers.values())
+                self.import_log.duplicates_skipped = self._duplicates_skipped()
                 self.import_log.sample_data = str(sample_data[:5]) if sample_data else "[]"
                 db.session.commit()
                 
@@ -455,6 +601,93 @@ class DataImportService:
                 return True
             raise DataImportError(f'Error importing CSV data: {str(e)}')
 
+    def import_stream(self, parser):
+        """
+        Import rows yielded by a streaming parser straight into the database.
+
+        Skips the intermediate CSV files and pandas entirely: each parser row is
+        normalized to a plain dict and written with batched executemany inserts,
+        so memory stays flat regardless of export size.
+
+        Args:
+            parser: Parser exposing iter_rows() -> (output key, row) and stats
+
+        Returns:
+            dict: records_processed, duplicates_skipped, partial_results, error and parser throughput
+        """
+        if not self.import_log:
+            raise DataImportError('An import log is required for streaming imports')
+
+        import_log_id = self.import_log.id
+        self.import_log.records_processed = self.import_log.records_processed or 0
+
+        sinks = {
+            'weight': self._writer(Weight),
+            'heart_rate': self._writer(HeartRate),
+            'activity': self._writer(Activity),
+        }
+        sleep = SleepAccumulator()
+        skipped = 0
+        error = None
+
+        try:
+            for key, row in parser.iter_rows():
+                try:
+                    if key == 'sleep':
+                        sleep.add(row)
+                    elif key == 'activity':
+                        sinks['activity'].write({
+                            'user_id': self.user_id,
+                            'import_log_id': import_log_id,
+                            'activity_type': row.get('activity_type') or 'unknown',
+                            'value': float(row.get('value') or 0),
+                            'unit': row.get('unit') or 'unknown',
+                            'timestamp': parse_timestamp(row['start_time']),
+                            'data_source': row.get('source_name', '')
+                        })
+                    else:
+                        sinks[key].write({
+                            'user_id': self.user_id,
+                            'import_log_id': import_log_id,
+                            'value': float(row.get('value') or 0),
+                            'unit': row.get('unit') or ('kg' if key == 'weight' else 'count/min'),
+                            'timestamp': parse_timestamp(row['timestamp']),
+                            'data_source': row.get('source_name', '')
+                        })
+                except (ValueError, TypeError, KeyError) as e:
+                    skipped += 1
+                    self.logger.error(f"Error processing {key} record: {str(e)}")
+        except TimeoutError as e:
+            self.logger.warning(f"{str(e)}. Keeping records imported so far.")
+            error = str(e)
+        except ET.ParseError as e:
+            db.session.rollback()
+            raise FileValidationError(f'Invalid XML format: {str(e)}')
+
+        try:
+            sleep_sink = self._writer(Sleep)
+            sleep_sink.write_many(sleep.rows(self.user_id, import_log_id))
+            sleep_sink.flush()
+            for sink in sinks.values():
+                sink.flush()
+        except Exception as e:
+            db.session.rollback()
+            self.logger.error(f"Error saving streamed records: {str(e)}", exc_info=True)
+            raise DataImportError(f'Error saving streamed records: {str(e)}')
+
+        self.logger.info(f"Streaming import finished: {self.import_log.records_processed} records, "
+                         f"{skipped} skipped, {self.import_log.duplicates_skipped or 0} duplicates, "
+                         f"{self.import_log.rows_per_second} rows/s")
+        return {
+            'records_processed': self.import_log.records_processed,
+            'rows_per_second': self.import_log.rows_per_second,
+            'records_skipped': skipped,
+            'duplicates_skipped': self.import_log.duplicates_skipped or 0,
+            'partial_results': error is not None,
+            'error': error,
+            'throughput': parser.stats.report() if getattr(parser, 'stats', None) else None
+        }
+
     def _process_zip(self, file):
         """Process ZIP file containing health data"""
         self.logger.info(f"Processing ZIP file: {file}")
@@ -489,8 +722,8 @@ class DataImportService:
             sleep_records = {}  # Dictionary to group sleep records by start time
             for record in root.findall('.//Record[@type="HKCategoryTypeIdentifierSleepAnalysis"]'):
                 try:
-                    start_time = datetime.fromisoformat(record.get('startDate'))
-                    end_time = datetime.fromisoformat(record.get('endDate', record.get('startDate')))
+                    start_time = parse_timestamp(record.get('startDate'))
+                    end_time = parse_timestamp(record.get('endDate', record.get('startDate')))
                     value = record.get('value')
                     source_name = record.get('sourceName', '')
                     duration = (end_time - start_time).total_seconds() / 60  # Convert to minutes
@@ -572,7 +805,7 @@ class DataImportService:
                     if record_type in activity_types:
                         value = float(record.get('value', 0))
                         unit = record.get('unit', '')
-                        start_time = datetime.fromisoformat(record.get('startDate'))
+                        start_time = parse_timestamp(record.get('startDate'))
                         date_key = start_time.date()
                         
                         # Initialize daily activity record if not exists
@@ -603,14 +836,15 @@ class DataImportService:
                     elif 'weight' in record_type.lower():
                         value = float(record.get('value', 0))
                         unit = record.get('unit', '')
-                        timestamp = datetime.fromisoformat(record.get('startDate'))
+                        timestamp = parse_timestamp(record.get('startDate'))
                         
                         weight_record = Weight(
                             user_id=self.user_id,
                             import_log_id=self.import_log.id,
                             value=value,
                             unit=unit,
-                            timestamp=timestamp
+                            timestamp=timestamp,
+                            data_source=record.get('sourceName', '')
                         )
                         records_to_commit.append(weight_record)
                         total_records += 1
@@ -618,14 +852,15 @@ class DataImportService:
                     elif 'heart' in record_type.lower() or 'bpm' in record_type.lower():
                         value = float(record.get('value', 0))
                         unit = record.get('unit', '')
-                        timestamp = datetime.fromisoformat(record.get('startDate'))
+                        timestamp = parse_timestamp(record.get('startDate'))
                         
                         heart_rate_record = HeartRate(
                             user_id=self.user_id,
                             import_log_id=self.import_log.id,
                             value=value,
                             unit=unit,
-                            timestamp=timestamp
+                            timestamp=timestamp,
+                            data_source=record.get('sourceName', '')
                         )
                         records_to_commit.append(heart_rate_record)
                         total_records += 1
@@ -692,30 +927,26 @@ class DataImportService:
 
     # In class DataImportService
     def _save_health_data_batch(self, records):
-        """Save a batch of health data records"""
+        """Save a batch of health data records with Core bulk inserts"""
         try:
             if not records:
                 return
 
-            batch_count = len(records) # Get the number of records in the batch
+            # Group the unsaved ORM instances by model and write them as plain dicts
+            by_model = {}
+            for record in records:
+                by_model.setdefault(type(record), []).append(model_to_row(record))
 
-            db.session.add_all(records)
-            db.session.commit()
-
-            # Update import log count correctly
-            if self.import_log:
-                if self.import_log.records_processed is None:
-                    self.import_log.records_processed = 0
-                self.import_log.records_processed += batch_count # Increment by the number of records in the batch
-                db.session.commit() # Commit the log update
-
-            self.logger.info(f"Successfully saved batch of {batch_count} records.")
+            for model, rows in by_model.items():
+                writer = self._writer(model)
+                writer.write_many(rows)
+                writer.flush()
 
         except Exception as e:
             # Log the specific error and rollback
             self.logger.warning(f"Error saving batch: {str(e)}", exc_info=True) # Log full traceback for debugging
             db.session.rollback()
+            for writer in self._writers.values():
+                writer.rows = []
             # Optionally re-raise or handle differently if needed
             # raise DataImportError(f"Failed to save batch: {str(e)}")
-
-        # Ensure records list is cleared by the caller function (commit_batch_local)
\ No newline at end of file
@@ -1,6 +1,5 @@
 from app import db
 from app.models.weight import Weight
-from app.models.heart_rate import HeartRate
 from app.models.activity import Activity
 from app.models.sleep import Sleep
 from app.models.goal import Goal
@@ -8,6 +7,8 @@ from app.models.achievement import Achievement, UserAchievement
 from sqlalchemy import and_, func
 from datetime import datetime, timedelta
 from collections import defaultdict
+import numpy as np
+from app.services.heart_rate_store import HeartRateStore
 
 def get_user_data_in_range(user_id, start_date, end_date, 
                           include_weight=True, include_heart_rate=True,
@@ -80,44 +81,40 @@ def get_user_data_in_range(user_id, start_date, end_date,
     
     # Include heart rate data if requested
     if include_heart_rate:
-        heart_rates = HeartRate.query.filter(
-            and_(
-                HeartRate.user_id == user_id,
-                HeartRate.timestamp >= start_date,
-                HeartRate.timestamp <= end_date
-            )
-        ).order_by(HeartRate.timestamp.desc()).all()
+        # Sliced from the memory-mapped heart rate arrays instead of loading ORM rows
+        heart_rates = HeartRateStore().load(user_id).between(start_date, end_date)
         
-        grouped_heart = defaultdict(list)
-        for h in heart_rates:
+        heart_data = []
+        if len(heart_rates):
             if group_by == 'hour':
-                key = h.timestamp.strftime('%Y-%m-%d %H:00')
+                buckets, key_format = heart_rates.datetimes().astype('datetime64[h]'), '%Y-%m-%d %H:00'
             else:
-                key = h.timestamp.strftime('%Y-%m-%d')
-            grouped_heart[key].append(h)
-        
-        heart_data = []
-        for key, hs in grouped_heart.items():
-            avg_hr = sum(h.value for h in hs if h.value) / len(hs) if hs else 0
-            min_hr = min((h.value for h in hs if h.value), default=None)
-            max_hr = max((h.value for h in hs if h.value), default=None)
-            heart_data.append({
-                'date': key,
-                'avg_heart_rate': avg_hr,
-                'min_heart_rate': min_hr,
-                'max_heart_rate': max_hr
-            })
+                buckets, key_format = heart_rates.datetimes().astype('datetime64[D]'), '%Y-%m-%d'
+            # Timestamps are sorted, so each bucket is one contiguous run
+            keys, starts = np.unique(buckets, return_index=True)
+            values = np.asarray(heart_rates.values, dtype=float)
+            counts = np.diff(np.append(starts, len(values)))
+            for key, total, count, min_hr, max_hr in zip(
+                keys.astype('datetime64[s]').astype(object), np.add.reduceat(values, starts), counts,
+                np.minimum.reduceat(values, starts), np.maximum.reduceat(values, starts)
+            ):
+                heart_data.append({
+                    'date': key.strftime(key_format),
+                    'avg_heart_rate': float(total / count),
+                    'min_heart_rate': float(min_hr),
+                    'max_heart_rate': float(max_hr)
+                })
         
-        # Sort by date in ascending order (old to new)
-        heart_data = sorted(heart_data, key=lambda x: x['date'], reverse=False)
+        # Buckets are already in ascending order (old to new)
         data['heart_rates'] = heart_data[:7] if limit_to_week else heart_data
         
         # Calculate heart rate statistics
-        if heart_rates:
+        stats = heart_rates.stats()
+        if stats:
             data['heart_rate_stats'] = {
-                'min': min(hr.value for hr in heart_rates if hr.value is not None),
-                'max': max(hr.value for hr in heart_rates if hr.value is not None),
-                'avg': sum(hr.value for hr in heart_rates if hr.value is not None) / len([hr for hr in heart_rates if hr.value is not None]),
+                'min': stats['min'],
+                'max': stats['max'],
+                'avg': stats['avg'],
                 'resting': None
             }
         else:
@@ -0,0 +1,244 @@
+"""
+Progress of every open goal, computed in bulk
+
+`flask update-goals` used to call GoalService.update_goal_progress for one
+goal at a time: a user lookup, the goal's metric queries and a commit each.
+update_all_goals loads the open goals in chunks instead and groups each chunk
+by category. The metric is read for every user in the chunk with one grouped
+query per category, and the results are written with one bulk UPDATE and one
+commit per chunk.
+
+Values are the ones GoalService computes:
+
+    steps       per-period totals from the daily activity rollups, evaluated
+                by GoalService._evaluate_steps_goal
+    weight      the user's latest weight
+    sleep       total sleep in the timeframe (average per night for daily goals)
+    heart_rate  average heart rate in the timeframe
+
+With workers > 1 the users are split into shards by user_id % workers and each
+shard is updated by its own process.
+"""
+import logging
+import multiprocessing
+import time
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import func, select, update
+from app import db
+from app.models.goal import Goal
+from app.models.rollup import ActivityDailyRollup, HeartRateDailyRollup, SleepDailyRollup
+from app.models.user import User
+from app.models.weight import Weight
+from app.services.goal_service import GoalService
+from app.utils.cache_utils import invalidate_dashboard_cache
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+TIMEFRAMES = ('daily', 'weekly', 'monthly')
+GOAL_COLUMNS = (
+    Goal.id, Goal.user_id, Goal.category, Goal.target_value, Goal.current_value, Goal.unit, Goal.timeframe,
+    Goal.start_date, Goal.end_date, Goal.completed, Goal.progress_related, Goal.progress_baseline,
+)
+
+
+def _open_goal_chunks(shard, shards, chunk_size):
+    """Open goals of existing users in the shard, as detached Goal objects, chunk_size at a time"""
+    last_id = 0
+    while True:
+        query = select(*GOAL_COLUMNS).join(User, User.id == Goal.user_id).where(
+            Goal.completed == False, Goal.id > last_id
+        )
+        if shards > 1:
+            query = query.where(Goal.user_id % shards == shard)
+        rows = db.session.execute(query.order_by(Goal.id).limit(chunk_size)).all()
+        if not rows:
+            return
+        # Never added to the session: they only carry values to the bulk update
+        yield [Goal(**row._mapping) for row in rows]
+        last_id = rows[-1].id
+
+
+def _daily_totals(measures, rollup, user_ids, first_day, last_day):
+    """{user_id: {day: [sum of each measure]}} from a daily rollup, in one grouped query"""
+    rows = db.session.execute(
+        select(rollup.user_id, rollup.day, *[func.sum(measure) for measure in measures]).where(
+            rollup.user_id.in_(user_ids), rollup.day >= first_day, rollup.day <= last_day
+        ).group_by(rollup.user_id, rollup.day)
+    )
+    totals = defaultdict(dict)
+    for user_id, day, *sums in rows:
+        totals[user_id][day] = [value or 0 for value in sums]
+    return totals
+
+
+def _timeframe_sums(goals, measures, rollup):
+    """Each goal's sums of the measures over its GoalService timeframe, {goal id: [sums]}"""
+    ranges = {goal.id: GoalService._get_timeframe_dates(goal) for goal in goals}
+    totals = _daily_totals(
+        measures, rollup, {goal.user_id for goal in goals},
+        min(start for start, _ in ranges.values()).date(), max(end for _, end in ranges.values()).date()
+    )
+    sums = {}
+    for goal in goals:
+        start, end = ranges[goal.id][0].date(), ranges[goal.id][1].date()
+        days = [values for day, values in totals[goal.user_id].items() if start <= day <= end]
+        sums[goal.id] = [sum(values[index] for values in days) for index in range(len(measures))]
+    return sums
+
+
+def _apply_steps(goals):
+    windows = {}
+    for goal in goals:
+        goal_start, goal_end = GoalService._steps_window(goal)
+        windows[goal.id] = (goal_start, goal_end, GoalService._steps_periods(goal_start, goal_end, goal.timeframe))
+    steps = _daily_totals(
+        [ActivityDailyRollup.steps], ActivityDailyRollup, {goal.user_id for goal in goals},
+        min(periods[0][0] for _, _, periods in windows.values()),
+        max(periods[-1][1] for _, _, periods in windows.values())
+    )
+    for goal in goals:
+        goal_start, goal_end, periods = windows[goal.id]
+        steps_by_day = {day: values[0] for day, values in steps[goal.user_id].items()}
+        goal.current_value, goal.completed = GoalService._evaluate_steps_goal(
+            goal.target_value, goal_start, goal_end, periods, steps_by_day
+        )
+
+
+def _apply_weight(goals):
+    ranked = select(
+        Weight.user_id, Weight.value,
+        func.row_number().over(partition_by=Weight.user_id, order_by=Weight.timestamp.desc()).label('newest')
+    ).where(Weight.user_id.in_({goal.user_id for goal in goals})).subquery()
+    latest = dict(db.session.execute(select(ranked.c.user_id, ranked.c.value).where(ranked.c.newest == 1)).all())
+    for goal in goals:
+        if goal.user_id in latest:
+            goal.current_value = latest[goal.user_id]
+
+
+def _apply_sleep(goals):
+    sums = _timeframe_sums(goals, [SleepDailyRollup.duration, SleepDailyRollup.count], SleepDailyRollup)
+    for goal in goals:
+        total_sleep, sleep_count = sums[goal.id]
+        if goal.timeframe != 'daily':
+            goal.current_value = total_sleep
+        elif sleep_count:
+            goal.current_value = total_sleep / sleep_count
+
+
+def _apply_heart_rate(goals):
+    sums = _timeframe_sums(goals, [HeartRateDailyRollup.total, HeartRateDailyRollup.count], HeartRateDailyRollup)
+    for goal in goals:
+        total, count = sums[goal.id]
+        if count:
+            goal.current_value = total / count
+
+
+CATEGORY_UPDATES = {
+    'steps': _apply_steps,
+    'weight': _apply_weight,
+    'sleep': _apply_sleep,
+    'heart_rate': _apply_heart_rate,
+}
+
+
+def update_goal_chunk(goals):
+    """
+    Compute the progress of a chunk of goals and write the changes with one bulk UPDATE
+
+    Returns:
+        dict: Numbers of goals 'updated', newly 'completed' and 'failed' (skipped)
+    """
+    before = {goal.id: (goal.current_value, goal.completed) for goal in goals}
+    failed = [goal for goal in goals if goal.timeframe not in TIMEFRAMES]
+    for goal in failed:
+        logger.warning(f"Skipping goal {goal.id}: unknown timeframe {goal.timeframe!r}")
+    valid = [goal for goal in goals if goal.timeframe in TIMEFRAMES]
+
+    by_category = defaultdict(list)
+    for goal in valid:
+        by_category[goal.category].append(goal)
+    for category, category_goals in by_category.items():
+        if category in CATEGORY_UPDATES:
+            CATEGORY_UPDATES[category](category_goals)
+
+    now = datetime.utcnow()
+    changes = []
+    for goal in valid:
+        try:
+            if goal.calculate_progress() >= 100:
+                goal.completed = True
+        except ZeroDivisionError:
+            logger.warning(f"Skipping goal {goal.id}: its target equals its baseline or is zero")
+            failed.append(goal)
+            continue
+        if (goal.current_value, goal.completed) != before[goal.id]:
+            changes.append({'id': goal.id, 'current_value': goal.current_value,
+                            'completed': goal.completed, 'updated_at': now})
+
+    if changes:
+        db.session.execute(update(Goal), changes)
+    db.session.commit()
+    # A bulk UPDATE bypasses the flush events that bump cache versions
+    changed = {change['id'] for change in changes}
+    for user_id in {goal.user_id for goal in goals if goal.id in changed}:
+        invalidate_dashboard_cache(user_id)
+
+    return {
+        'updated': len(changes),
+        'completed': sum(1 for change in changes if change['completed']),
+        'failed': len(failed),
+    }
+
+
+def update_goal_shard(shard=0, shards=1, chunk_size=CHUNK_SIZE):
+    """
+    Update every open goal of the users with user_id % shards == shard
+
+    Returns:
+        dict: Numbers of 'goals' read and goals 'updated', 'completed' and 'failed'
+    """
+    stats = {'goals': 0, 'updated': 0, 'completed': 0, 'failed': 0}
+    for goals in _open_goal_chunks(shard, shards, chunk_size):
+        stats['goals'] += len(goals)
+        for name, count in update_goal_chunk(goals).items():
+            stats[name] += count
+    db.session.remove()
+    return stats
+
+
+def _shard_process(config_name, shard, shards, chunk_size):
+    """Entry point of a pool process: build its own app and database connections"""
+    from app import create_app
+
+    app = create_app(config_name)
+    with app.app_context():
+        return update_goal_shard(shard, shards, chunk_size)
+
+
+def update_all_goals(workers=1, chunk_size=CHUNK_SIZE, config_name=None):
+    """
+    Update the progress of every open goal, in `workers` processes
+
+    Returns:
+        dict: The update_goal_shard counts summed over the shards, with the
+        'seconds' taken and the throughput in 'goals_per_second'
+    """
+    started = time.perf_counter()
+    if workers <= 1:
+        results = [update_goal_shard(0, 1, chunk_size)]
+    else:
+        # Spawned children must not inherit the parent's pooled connections
+        db.engine.dispose()
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(workers) as pool:
+            results = pool.starmap(
+                _shard_process, [(config_name, shard, workers, chunk_size) for shard in range(workers)]
+            )
+
+    stats = {name: sum(result[name] for result in results) for name in ('goals', 'updated', 'completed', 'failed')}
+    stats['seconds'] = round(time.perf_counter() - started, 3)
+    stats['goals_per_second'] = round(stats['goals'] / stats['seconds'], 1) if stats['seconds'] else None
+    logger.info(f"Updated {stats['goals']} goals in {stats['seconds']}s with {workers} worker(s)")
+    return stats
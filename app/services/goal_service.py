@@ -1,11 +1,10 @@
 from datetime import datetime, timedelta
+from sqlalchemy import func
 from app import db
 from app.models.goal import Goal
 from app.models.user import User
-from app.models.activity import Activity
 from app.models.weight import Weight
-from app.models.sleep import Sleep
-from app.models.heart_rate import HeartRate
+from app.models.rollup import ActivityDailyRollup, HeartRateDailyRollup, SleepDailyRollup
 
 class GoalService:
     @staticmethod
@@ -57,8 +56,18 @@ class GoalService:
     
     @staticmethod
     def _update_steps_goal(goal):
-        # First, check if target was met on any day between start_date and end_date
-        # Get start and end dates of the goal
+        # Check every day, week or month between the goal's start and end
+        goal_start, goal_end = GoalService._steps_window(goal)
+        periods = GoalService._steps_periods(goal_start, goal_end, goal.timeframe)
+        steps_by_day = GoalService._daily_steps(goal.user_id, periods[0][0], periods[-1][1])
+        goal.current_value, goal.completed = GoalService._evaluate_steps_goal(
+            goal.target_value, goal_start, goal_end, periods, steps_by_day
+        )
+        db.session.commit()
+    
+    @staticmethod
+    def _steps_window(goal):
+        """First and last day of a steps goal, today for a missing start or end"""
         goal_start = goal.start_date
         if not goal_start:
             goal_start = datetime.utcnow().date()
@@ -74,89 +83,82 @@ class GoalService:
         # Ensure goal_start is not after goal_end
         if goal_start > goal_end:
             goal_start = goal_end
+        return goal_start, goal_end
+    
+    @staticmethod
+    def _evaluate_steps_goal(target_value, goal_start, goal_end, periods, steps_by_day):
+        """
+        Current value and completion of a steps goal from its daily step totals
         
-        # Initialize max steps found in the period
-        max_daily_steps = 0
+        Returns:
+            tuple: (current_value, completed)
+        """
         current_date = datetime.utcnow().date()
-        
-        # Check each day in the goal period
-        current_day = goal_start
-        while current_day <= goal_end:
-            # Get timeframe for this specific day (based on goal timeframe)
-            if goal.timeframe == 'daily':
-                day_start = datetime.combine(current_day, datetime.min.time())
-                day_end = datetime.combine(current_day, datetime.max.time())
-            elif goal.timeframe == 'weekly':
-                # Get the week containing this day
-                week_start = current_day - timedelta(days=current_day.weekday())
-                day_start = datetime.combine(week_start, datetime.min.time())
-                day_end = day_start + timedelta(days=7) - timedelta(microseconds=1)
-            elif goal.timeframe == 'monthly':
-                # Get the month containing this day
-                month_start = current_day.replace(day=1)
-                day_start = datetime.combine(month_start, datetime.min.time())
-                # Get last day of month
-                if month_start.month == 12:
-                    next_month = month_start.replace(year=month_start.year+1, month=1)
-                else:
-                    next_month = month_start.replace(month=month_start.month+1)
-                day_end = datetime.combine(next_month - timedelta(days=1), datetime.max.time())
-            
-            # Query activities for this timeframe
-            activities = Activity.query.filter(
-                Activity.user_id == goal.user_id,
-                Activity.timestamp >= day_start,
-                Activity.timestamp <= day_end
-            ).all()
-            
-            # Sum steps for this day/period
-            daily_steps = 0
-            for activity in activities:
-                if activity.total_steps is not None and activity.total_steps > 0:
-                    daily_steps += activity.total_steps
-                elif activity.activity_type == 'steps' and activity.value is not None:
-                    daily_steps += int(activity.value)
-            
-            # Update max steps found
-            max_daily_steps = max(max_daily_steps, daily_steps)
+        max_period_steps = 0
+        todays_steps = 0
+        for period_start, period_end in periods:
+            period_steps = int(sum(
+                steps_by_day.get(period_start + timedelta(days=offset), 0)
+                for offset in range((period_end - period_start).days + 1)
+            ))
+            max_period_steps = max(max_period_steps, period_steps)
             
-            # If we're checking today's date, save today's progress
-            if current_day == current_date:
-                todays_steps = daily_steps
+            # Today's progress is the total of the period containing today
+            if period_start <= current_date <= period_end:
+                todays_steps = period_steps
             
-            # Check if goal is reached
-            if daily_steps >= goal.target_value:
-                # Goal reached on this day!
-                goal.current_value = daily_steps
-                goal.completed = True
-                db.session.commit()
-                return
-            
-            # Move to next period based on timeframe
-            if goal.timeframe == 'daily':
-                current_day += timedelta(days=1)
-            elif goal.timeframe == 'weekly':
-                current_day += timedelta(days=7)
-            elif goal.timeframe == 'monthly':
-                # Move to first day of next month
-                if current_day.month == 12:
-                    current_day = current_day.replace(year=current_day.year+1, month=1, day=1)
-                else:
-                    current_day = current_day.replace(month=current_day.month+1, day=1)
+            # The first period that reaches the target completes the goal
+            if period_steps >= target_value:
+                return period_steps, True
         
-        # If we reach here, goal wasn't completed in any day of the period
-        
-        # If today is within the goal period, use today's progress
+        # If today is within the goal period, use today's progress,
+        # otherwise the maximum progress achieved in any period
         if goal_start <= current_date <= goal_end:
-            # Use today's progress
-            goal.current_value = todays_steps
-        else:
-            # Goal period has passed without completion, use the maximum progress achieved
-            goal.current_value = max_daily_steps
+            return todays_steps, False
+        return max_period_steps, False
+    
+    @staticmethod
+    def _steps_periods(goal_start, goal_end, timeframe):
+        """
+        First and last day of each period a steps goal is checked over, in order
         
-        # Make sure goal is marked as not completed
-        goal.completed = False
-        db.session.commit()
+        Periods are whole days, Monday-based weeks or calendar months, starting
+        with the one containing goal_start and ending with the one containing
+        goal_end.
+        """
+        periods = []
+        current_day = goal_start
+        while current_day <= goal_end:
+            if timeframe == 'weekly':
+                period_start = current_day - timedelta(days=current_day.weekday())
+                period_end = period_start + timedelta(days=6)
+                next_day = current_day + timedelta(days=7)
+            elif timeframe == 'monthly':
+                period_start = current_day.replace(day=1)
+                if period_start.month == 12:
+                    next_day = period_start.replace(year=period_start.year + 1, month=1)
+                else:
+                    next_day = period_start.replace(month=period_start.month + 1)
+                period_end = next_day - timedelta(days=1)
+            else:
+                period_start = period_end = current_day
+                next_day = current_day + timedelta(days=1)
+            periods.append((period_start, period_end))
+            current_day = next_day
+        return periods
+    
+    @staticmethod
+    def _daily_steps(user_id, first_day, last_day):
+        """Steps per day from the daily activity rollups, in one grouped query"""
+        rows = db.session.query(
+            ActivityDailyRollup.day,
+            func.sum(ActivityDailyRollup.steps)
+        ).filter(
+            ActivityDailyRollup.user_id == user_id,
+            ActivityDailyRollup.day >= first_day,
+            ActivityDailyRollup.day <= last_day
+        ).group_by(ActivityDailyRollup.day).all()
+        return {day: steps or 0 for day, steps in rows}
     
     @staticmethod
     def _update_weight_goal(goal):
@@ -172,21 +174,23 @@ class GoalService:
         # Get timeframe dates
         start_date, end_date = GoalService._get_timeframe_dates(goal)
         
-        # Query sleep records in timeframe
-        sleeps = Sleep.query.filter(
-            Sleep.user_id == goal.user_id,
-            Sleep.timestamp >= start_date,
-            Sleep.timestamp <= end_date
-        ).all()
+        # Sleep totals for the timeframe from the daily rollups
+        total_sleep, sleep_count = db.session.query(
+            func.coalesce(func.sum(SleepDailyRollup.duration), 0),
+            func.coalesce(func.sum(SleepDailyRollup.count), 0)
+        ).filter(
+            SleepDailyRollup.user_id == goal.user_id,
+            SleepDailyRollup.day >= start_date.date(),
+            SleepDailyRollup.day <= end_date.date()
+        ).one()
         
         if goal.timeframe == 'daily':
             # Calculate average daily sleep
-            if sleeps:
-                avg_sleep = sum(sleep.duration or 0 for sleep in sleeps) / len(sleeps)
+            if sleep_count:
+                avg_sleep = total_sleep / sleep_count
                 goal.current_value = avg_sleep
         else:
             # Sum total sleep over period
-            total_sleep = sum(sleep.duration or 0 for sleep in sleeps)
             goal.current_value = total_sleep
         
         db.session.commit()
@@ -196,16 +200,19 @@ class GoalService:
         # Get timeframe dates
         start_date, end_date = GoalService._get_timeframe_dates(goal)
         
-        # Query heart rate records in timeframe
-        heart_rates = HeartRate.query.filter(
-            HeartRate.user_id == goal.user_id,
-            HeartRate.timestamp >= start_date,
-            HeartRate.timestamp <= end_date
-        ).all()
+        # Heart rate totals for the timeframe from the daily rollups
+        total, count = db.session.query(
+            func.coalesce(func.sum(HeartRateDailyRollup.total), 0),
+            func.coalesce(func.sum(HeartRateDailyRollup.count), 0)
+        ).filter(
+            HeartRateDailyRollup.user_id == goal.user_id,
+            HeartRateDailyRollup.day >= start_date.date(),
+            HeartRateDailyRollup.day <= end_date.date()
+        ).one()
         
-        if heart_rates:
+        if count:
             # Calculate average heart rate
-            avg_hr = sum(hr.value for hr in heart_rates) / len(heart_rates)
+            avg_hr = total / count
             goal.current_value = avg_hr
             db.session.commit()
     
@@ -0,0 +1,201 @@
+"""
+Columnar copy of each user's heart rate readings, memory-mapped from .npy files
+
+Heart rate is by far the largest table, and most readers only need the
+timestamp and value of every reading in a range. HeartRateStore keeps those two
+columns per user as sorted arrays under TIMESERIES_FOLDER/heart_rate
+(INSTANCE_PATH/timeseries by default):
+
+    <user_id>/timestamps.npy  int64 epoch seconds of the (naive) wall-clock timestamp
+    <user_id>/values.npy      int16 beats per minute, rounded
+
+Files are opened with np.load(mmap_mode='r'), so only the pages a range slice
+touches are read, and ranges are found with searchsorted instead of a query.
+
+The arrays are refreshed after each import (appending readings newer than the
+last stored one, or rebuilding when older rows were added). ORM writes to
+HeartRate drop the user's files on commit and the next load() rebuilds them.
+"""
+import os
+from datetime import datetime, timedelta
+import numpy as np
+from flask import current_app
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+from app import db
+from app.models.heart_rate import HeartRate
+
+TIMESTAMP_DTYPE = np.int64
+VALUE_DTYPE = np.int16
+REBUILD_CHUNK_SIZE = 100000
+
+
+def to_epoch_seconds(timestamps):
+    """Datetime(s) as int64 seconds since 1970-01-01, ignoring any time zone"""
+    return np.asarray(timestamps, dtype='datetime64[s]').astype(TIMESTAMP_DTYPE)
+
+
+def _to_values(values):
+    """Readings as int16 beats per minute"""
+    limits = np.iinfo(VALUE_DTYPE)
+    return np.clip(np.rint(np.asarray(values, dtype=float)), limits.min, limits.max).astype(VALUE_DTYPE)
+
+
+class HeartRateSeries:
+    """Heart rate readings of one user, sorted by timestamp"""
+
+    def __init__(self, timestamps, values):
+        self.timestamps = timestamps
+        self.values = values
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def between(self, start=None, end=None):
+        """Readings with start <= timestamp <= end, as a view on the same arrays"""
+        low = np.searchsorted(self.timestamps, to_epoch_seconds(start), side='left') if start else 0
+        high = np.searchsorted(self.timestamps, to_epoch_seconds(end), side='right') if end else len(self)
+        return HeartRateSeries(self.timestamps[low:high], self.values[low:high])
+
+    def tail(self, count):
+        """The latest count readings"""
+        start = max(len(self) - count, 0)
+        return HeartRateSeries(self.timestamps[start:], self.values[start:])
+
+    def datetimes(self):
+        """Timestamps as a datetime64 array, e.g. for chart_utils.aggregate_into_slots"""
+        return np.asarray(self.timestamps).astype('datetime64[s]')
+
+    def days(self):
+        """Sorted distinct dates with at least one reading"""
+        return np.unique(self.datetimes().astype('datetime64[D]')).astype(object).tolist()
+
+    def stats(self):
+        """{'min', 'max', 'avg', 'count'} of the readings, None when there are none"""
+        if not len(self):
+            return None
+        values = np.asarray(self.values)
+        return {
+            'min': int(values.min()),
+            'max': int(values.max()),
+            'avg': float(values.mean(dtype=np.float64)),
+            'count': len(values)
+        }
+
+
+class HeartRateStore:
+    """Per-user heart rate arrays stored as .npy files"""
+
+    def __init__(self, root=None):
+        self.root = root or os.path.join(current_app.config['TIMESERIES_FOLDER'], 'heart_rate')
+
+    def _paths(self, user_id):
+        directory = os.path.join(self.root, str(user_id))
+        return os.path.join(directory, 'timestamps.npy'), os.path.join(directory, 'values.npy')
+
+    def exists(self, user_id):
+        return all(os.path.exists(path) for path in self._paths(user_id))
+
+    def load(self, user_id):
+        """Memory-mapped readings for a user, built from the database if missing"""
+        if not self.exists(user_id):
+            return self.rebuild(user_id)
+        timestamps_path, values_path = self._paths(user_id)
+        timestamps = np.load(timestamps_path, mmap_mode='r')
+        values = np.load(values_path, mmap_mode='r')
+        if len(timestamps) != len(values):
+            # Caught between the two file replacements of a concurrent write
+            return self.rebuild(user_id)
+        return HeartRateSeries(timestamps, values)
+
+    def rebuild(self, user_id):
+        """Rewrite a user's arrays from every heart rate row in the database"""
+        timestamps, values = self._read_rows(user_id)
+        return self._write(user_id, timestamps, values)
+
+    def refresh(self, user_id):
+        """
+        Bring a user's arrays up to date after an import
+
+        Readings newer than the last stored one are appended. If the row count
+        shows older rows were added (or rows removed), the arrays are rebuilt.
+        """
+        if not self.exists(user_id):
+            return self.rebuild(user_id)
+        series = self.load(user_id)
+        after = None
+        if len(series):
+            after = datetime(1970, 1, 1) + timedelta(seconds=int(series.timestamps[-1]) + 1)
+        timestamps, values = self._read_rows(user_id, after)
+        total = db.session.scalar(
+            select(func.count(HeartRate.id)).where(HeartRate.user_id == user_id, HeartRate.value.isnot(None))
+        )
+        if len(series) + len(timestamps) != total:
+            return self.rebuild(user_id)
+        if not len(timestamps):
+            return series
+        return self._write(
+            user_id,
+            np.concatenate([series.timestamps, timestamps]),
+            np.concatenate([series.values, values])
+        )
+
+    def invalidate(self, user_id):
+        """Remove a user's arrays so the next load() rebuilds them"""
+        for path in self._paths(user_id):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _read_rows(self, user_id, after=None):
+        """Timestamps and values of a user's readings (at or after a time), without ORM objects"""
+        query = select(HeartRate.timestamp, HeartRate.value).where(
+            HeartRate.user_id == user_id, HeartRate.value.isnot(None)
+        ).order_by(HeartRate.timestamp).execution_options(yield_per=REBUILD_CHUNK_SIZE)
+        if after is not None:
+            query = query.where(HeartRate.timestamp >= after)
+
+        timestamp_chunks, value_chunks = [], []
+        for rows in db.session.execute(query).partitions():
+            timestamps, values = zip(*rows)
+            timestamp_chunks.append(to_epoch_seconds(timestamps))
+            value_chunks.append(_to_values(values))
+        if not timestamp_chunks:
+            return np.empty(0, dtype=TIMESTAMP_DTYPE), np.empty(0, dtype=VALUE_DTYPE)
+        return np.concatenate(timestamp_chunks), np.concatenate(value_chunks)
+
+    def _write(self, user_id, timestamps, values):
+        """Replace a user's files; readers holding the old maps keep the old data"""
+        timestamps_path, values_path = self._paths(user_id)
+        os.makedirs(os.path.dirname(timestamps_path), exist_ok=True)
+        for path, array in ((values_path, values), (timestamps_path, timestamps)):
+            temp_path = f'{path[:-len(".npy")]}.{os.getpid()}.tmp.npy'
+            np.save(temp_path, np.ascontiguousarray(array))
+            os.replace(temp_path, path)
+        return self.load(user_id)
+
+
+def _collect_heart_rate_users(session, flush_context):
+    users = session.info.setdefault('heart_rate_store_users', set())
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(instance, HeartRate) and instance.user_id is not None:
+            users.add(instance.user_id)
+
+
+def _invalidate_heart_rate_users(session):
+    users = session.info.pop('heart_rate_store_users', None)
+    if users:
+        store = HeartRateStore()
+        for user_id in users:
+            store.invalidate(user_id)
+
+
+def _forget_heart_rate_users(session):
+    session.info.pop('heart_rate_store_users', None)
+
+
+def register_store_events():
+    """Drop a user's heart rate arrays when their HeartRate rows change through the ORM"""
+    if not event.contains(Session, 'after_flush', _collect_heart_rate_users):
+        event.listen(Session, 'after_flush', _collect_heart_rate_users)
+        event.listen(Session, 'after_commit', _invalidate_heart_rate_users)
+        event.listen(Session, 'after_rollback', _forget_heart_rate_users)
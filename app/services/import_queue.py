@@ -0,0 +1,195 @@
+"""
+Database-backed import job queue
+
+Uploads are stored as ImportLog rows with status 'queued'. Worker processes
+started with `flask import-worker` claim jobs with an atomic UPDATE, so any
+number of workers can poll the same table without handing one job out twice.
+Running jobs write heartbeat_at with every batch and progress update, which is
+how orphaned jobs are told apart from long-running ones.
+"""
+import logging
+import multiprocessing
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import func, select, update
+from app import db
+from app.models import ImportLog
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+
+
+def make_worker_id(index=0):
+    """Identify a worker by host, pid and pool slot"""
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"[:64]
+
+
+def claim_next_job(worker_id):
+    """
+    Atomically move the oldest queued job to running and return it
+
+    The UPDATE only matches while the row is still queued, so if two workers
+    race for the same job exactly one of them sees a rowcount of 1.
+    """
+    while True:
+        job_id = db.session.execute(
+            select(ImportLog.id)
+            .where(ImportLog.status == QUEUED)
+            .order_by(ImportLog.created_at, ImportLog.id)
+            .limit(1)
+        ).scalar()
+        if job_id is None:
+            db.session.commit()
+            return None
+
+        result = db.session.execute(
+            update(ImportLog)
+            .where(ImportLog.id == job_id, ImportLog.status == QUEUED)
+            .values(status=RUNNING, worker_id=worker_id, started_at=datetime.utcnow(),
+                    heartbeat_at=datetime.utcnow(), progress=0)
+        )
+        db.session.commit()
+        if result.rowcount == 1:
+            return db.session.get(ImportLog, job_id, populate_existing=True)
+        # Another worker won the race; try the next job
+
+
+def worker_alive(worker_id):
+    """
+    Whether the process behind a worker id is still running
+
+    Returns:
+        bool: True or False for workers on this host, None when it cannot be told
+    """
+    try:
+        host, pid, _ = (worker_id or '').rsplit(':', 2)
+        pid = int(pid)
+    except ValueError:
+        return None
+    if host != socket.gethostname():
+        return None
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Running as another user
+    return True
+
+
+def requeue_stale_jobs(max_age_seconds):
+    """
+    Put running jobs back in the queue when their worker has gone quiet for too long
+
+    A job is stale once neither a batch nor a progress update has been written for
+    max_age_seconds. Jobs whose worker process is still alive on this host are left
+    alone however quiet they are.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=max_age_seconds)
+    last_seen = func.coalesce(ImportLog.heartbeat_at, ImportLog.started_at)
+    stale = db.session.execute(
+        select(ImportLog.id, ImportLog.worker_id).where(ImportLog.status == RUNNING, last_seen < cutoff)
+    ).all()
+    job_ids = [job_id for job_id, worker_id in stale if not worker_alive(worker_id)]
+    if not job_ids:
+        db.session.commit()
+        return 0
+
+    # Guarded on the heartbeat again in case a worker reported in meanwhile
+    result = db.session.execute(
+        update(ImportLog)
+        .where(ImportLog.id.in_(job_ids), ImportLog.status == RUNNING, last_seen < cutoff)
+        .values(status=QUEUED, worker_id=None, started_at=None, heartbeat_at=None, progress=0)
+    )
+    db.session.commit()
+    if result.rowcount:
+        logger.warning(f"Requeued {result.rowcount} stale import jobs")
+    return result.rowcount
+
+
+def run_job(import_log):
+    """Process one claimed job to completion (no request timeout applies here)"""
+    from app.services.cache_warming import warm_in_worker
+    from app.services.upload_service import UploadService
+
+    logger.info(f"Worker {import_log.worker_id} processing import {import_log.id} ({import_log.file_name})")
+    service = UploadService(import_log.user_id)
+    service.import_log = import_log
+    try:
+        service.process_saved_file(import_log.file_path, import_log.data_source, parser_timeout=None)
+    except Exception as e:
+        # UploadService has already marked the import as failed
+        logger.error(f"Import {import_log.id} failed: {str(e)}")
+    else:
+        warm_in_worker(import_log)
+    return import_log
+
+
+def run_worker(worker_id, poll_interval=2.0, once=False):
+    """
+    Claim and run jobs until interrupted
+
+    Args:
+        worker_id (str): Identifier stored on claimed jobs
+        poll_interval (float): Seconds to sleep when the queue is empty
+        once (bool): Drain the queue and return instead of polling forever
+
+    Returns:
+        int: Number of jobs processed
+    """
+    processed = 0
+    logger.info(f"Import worker {worker_id} started")
+    while True:
+        job = claim_next_job(worker_id)
+        if job is None:
+            if once:
+                return processed
+            db.session.remove()
+            time.sleep(poll_interval)
+            continue
+        run_job(job)
+        processed += 1
+        db.session.remove()
+
+
+def _worker_process(config_name, index, poll_interval, once):
+    """Entry point of a pool process: build its own app and database connections"""
+    from app import create_app
+
+    app = create_app(config_name)
+    with app.app_context():
+        run_worker(make_worker_id(index), poll_interval=poll_interval, once=once)
+
+
+def start_worker_pool(workers, poll_interval=2.0, once=False, config_name=None):
+    """Run `workers` worker processes and wait for them to exit"""
+    if workers <= 1:
+        return run_worker(make_worker_id(), poll_interval=poll_interval, once=once)
+
+    # Spawned children must not inherit the parent's pooled connections
+    db.engine.dispose()
+    context = multiprocessing.get_context('spawn')
+    processes = [
+        context.Process(
+            target=_worker_process,
+            args=(config_name, index, poll_interval, once),
+            name=f"import-worker-{index}",
+            daemon=False
+        )
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+    return None
@@ -15,7 +15,10 @@ import shutil
 import gc
 import time
 import signal
+import heapq
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from app.utils.error_handlers import FileValidationError
+from app.utils.timestamp_parser import timestamp_sort_key
 
 # Constants for optimization
 BATCH_SIZE = 20000  # Increased batch size for faster processing
@@ -47,26 +50,499 @@ class TimeoutHandler:
                 print(f"Status: {status}")
             self.checkpoint_time = current_time
         
-        # If we're approaching the timeout, raise exception to allow graceful handling
-        if elapsed_time > self.timeout:
+        # If we're approaching the timeout, raise exception to allow graceful handling.
+        # A timeout of None (background import workers) never expires.
+        if self.timeout is not None and elapsed_time > self.timeout:
             raise TimeoutError(f"Operation exceeded maximum allowed time ({self.timeout}s)")
 
+# Record types we import, mapped to (activity_type, default unit) for activity records
+ACTIVITY_RECORD_TYPES = {
+    'HKQuantityTypeIdentifierStepCount': ('steps', 'count'),
+    'HKQuantityTypeIdentifierDistanceWalkingRunning': ('distance', 'km'),
+    'HKQuantityTypeIdentifierActiveEnergyBurned': ('calories', 'kcal'),
+}
+HEART_RATE_RECORD_TYPE = 'HKQuantityTypeIdentifierHeartRate'
+SLEEP_RECORD_TYPE = 'HKCategoryTypeIdentifierSleepAnalysis'
+WEIGHT_RECORD_TYPE = 'HKQuantityTypeIdentifierBodyMass'
+WORKOUT_TAG = 'Workout'
+
+# CSV headers for each generated file
+ACTIVITY_FIELDS = ['user_id', 'activity_type', 'subtype', 'start_time', 'end_time', 'value', 'unit', 'source_name', 'source_version', 'device', 'import_batch_id']
+HEART_RATE_FIELDS = ['user_id', 'heart_type', 'timestamp', 'value', 'unit', 'source_name', 'source_version', 'device', 'import_batch_id']
+SLEEP_FIELDS = ['user_id', 'stage', 'start_time', 'end_time', 'source_name', 'source_version', 'device', 'import_batch_id']
+WEIGHT_FIELDS = ['user_id', 'weight_type', 'timestamp', 'value', 'unit', 'source_name', 'source_version', 'device', 'import_batch_id']
+
+
+def activity_row(r, activity_type, default_unit):
+    """Transform a step/distance/energy Record into an activity.csv row"""
+    return {
+        'user_id': 'user_id',
+        'activity_type': activity_type,
+        'subtype': None,
+        'start_time': r.get('startDate'),
+        'end_time': r.get('endDate'),
+        'value': float(r.get('value', 0)),
+        'unit': r.get('unit', default_unit),
+        'source_name': r.get('sourceName', ''),
+        'source_version': None,
+        'device': r.get('device', ''),
+        'import_batch_id': 'import_batch_id'
+    }
+
+
+def workout_row(w):
+    """Transform a Workout element into an activity.csv row"""
+    return {
+        'user_id': 'user_id',
+        'activity_type': 'workout',
+        'subtype': w.get('workoutActivityType', ''),
+        'start_time': w.get('startDate'),
+        'end_time': w.get('endDate'),
+        'value': float(w.get('totalDistance', 0)) if w.get('totalDistance') else (float(w.get('totalEnergyBurned', 0)) if w.get('totalEnergyBurned') else 0),
+        'unit': 'km' if w.get('totalDistance') else 'kcal',
+        'source_name': w.get('sourceName', ''),
+        'source_version': None,
+        'device': w.get('device', ''),
+        'import_batch_id': 'import_batch_id'
+    }
+
+
+def heart_rate_row(r):
+    """Transform a heart rate Record into a heart_rate.csv row"""
+    return {
+        'user_id': 'user_id',
+        'heart_type': 'active',
+        'timestamp': r.get('startDate'),
+        'value': float(r.get('value', 0)),
+        'unit': r.get('unit', 'count/min'),
+        'source_name': r.get('sourceName', ''),
+        'source_version': None,
+        'device': r.get('device', ''),
+        'import_batch_id': 'import_batch_id'
+    }
+
+
+def sleep_row(r):
+    """Transform a sleep analysis Record into a sleep.csv row"""
+    return {
+        'user_id': 'user_id',
+        'stage': r.get('value', ''),
+        'start_time': r.get('startDate'),
+        'end_time': r.get('endDate'),
+        'source_name': r.get('sourceName', ''),
+        'source_version': None,
+        'device': r.get('device', ''),
+        'import_batch_id': 'import_batch_id'
+    }
+
+
+def weight_row(r):
+    """Transform a body mass Record into a weight.csv row"""
+    return {
+        'user_id': 'user_id',
+        'weight_type': 'body_mass',
+        'timestamp': r.get('startDate'),
+        'value': float(r.get('value', 0)),
+        'unit': r.get('unit', 'kg'),
+        'source_name': r.get('sourceName', ''),
+        'source_version': None,
+        'device': r.get('device', ''),
+        'import_batch_id': 'import_batch_id'
+    }
+
+
+class CsvSink:
+    """Streams transformed rows for one output file straight to disk"""
+    def __init__(self, path, fieldnames):
+        self.path = path
+        self.count = 0
+        self._file = open(path, 'w', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=fieldnames)
+        # Always write the header so empty data types still produce a valid CSV
+        self._writer.writeheader()
+
+    def write(self, row):
+        self._writer.writerow(row)
+        self.count += 1
+        if self.count % 5000 == 0:
+            self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+class ParseStats:
+    """Per record type counters used to report parser throughput"""
+    def __init__(self):
+        self.start_time = time.time()
+        self.end_time = None
+        self.elements_seen = 0
+        self.skipped = 0
+        self.below_watermark = 0
+        self.counts = {}
+
+    def add(self, record_type):
+        self.counts[record_type] = self.counts.get(record_type, 0) + 1
+
+    def merge(self, result):
+        """Fold the counters returned by a parse_shard worker into these stats"""
+        for record_type, count in result['counts'].items():
+            self.counts[record_type] = self.counts.get(record_type, 0) + count
+        self.skipped += result['skipped']
+        self.below_watermark += result['below_watermark']
+        self.elements_seen += result['elements_seen']
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    def finish(self):
+        self.end_time = time.time()
+
+    def report(self):
+        """Return elapsed time and records/sec for every record type seen"""
+        elapsed = max((self.end_time or time.time()) - self.start_time, 1e-6)
+        return {
+            'elapsed_seconds': round(elapsed, 2),
+            'elements_seen': self.elements_seen,
+            'records_skipped': self.skipped,
+            'records_below_watermark': self.below_watermark,
+            'records_per_second': round(self.total / elapsed, 1),
+            'record_types': {
+                record_type: {
+                    'count': count,
+                    'records_per_second': round(count / elapsed, 1)
+                }
+                for record_type, count in sorted(self.counts.items())
+            }
+        }
+
+    def log_summary(self):
+        report = self.report()
+        print(f"Parsed {self.total} records from {report['elements_seen']} elements in "
+              f"{report['elapsed_seconds']}s ({report['records_per_second']} records/s)")
+        for record_type, info in report['record_types'].items():
+            print(f"  {record_type}: {info['count']} records ({info['records_per_second']} records/s)")
+
+
+OUTPUT_FIELDS = {
+    'activity': ACTIVITY_FIELDS,
+    'heart_rate': HEART_RATE_FIELDS,
+    'sleep': SLEEP_FIELDS,
+    'weight': WEIGHT_FIELDS,
+}
+# Column each output is ordered by when shards are merged
+OUTPUT_TIME_FIELDS = {
+    'activity': 'start_time',
+    'heart_rate': 'timestamp',
+    'sleep': 'start_time',
+    'weight': 'timestamp',
+}
+SHARD_SCAN_WINDOW = 1024 * 1024
+SHARD_RUN_ROWS = 100000  # Rows per output a shard worker sorts in memory before writing a run
+RECORD_START = b'<Record '
+CORRELATION_START = b'<Correlation '
+CORRELATION_END = b'</Correlation>'
+
+
+def build_routes():
+    """
+    Map record types to (output, transform) pairs for the single-pass dispatcher
+
+    Returns:
+        dict: Record type -> (output key, transform function), where the output key is
+              one of 'activity', 'heart_rate', 'sleep' or 'weight'
+    """
+    routes = {
+        HEART_RATE_RECORD_TYPE: ('heart_rate', heart_rate_row),
+        SLEEP_RECORD_TYPE: ('sleep', sleep_row),
+        WEIGHT_RECORD_TYPE: ('weight', weight_row),
+    }
+    for record_type, (activity_type, default_unit) in ACTIVITY_RECORD_TYPES.items():
+        routes[record_type] = (
+            'activity',
+            lambda r, a=activity_type, u=default_unit: activity_row(r, a, u)
+        )
+    return routes
+
+
+def record_type_cutoffs(watermarks):
+    """
+    Turn importer watermarks into the per record type cutoffs iter_export_rows checks
+
+    Args:
+        watermarks (dict): (output key, activity type or None, source name or None) -> latest
+                           datetime already imported. A None source applies to every source.
+
+    Returns:
+        dict: Record type -> {source name or None: 'YYYY-MM-DD HH:MM:SS'}, or None if there
+              are no watermarks
+    """
+    if not watermarks:
+        return None
+    record_types = {
+        ('heart_rate', None): [HEART_RATE_RECORD_TYPE],
+        ('sleep', None): [SLEEP_RECORD_TYPE],
+        ('weight', None): [WEIGHT_RECORD_TYPE],
+        ('activity', 'workout'): [WORKOUT_TAG],
+    }
+    for record_type, (activity_type, _) in ACTIVITY_RECORD_TYPES.items():
+        record_types.setdefault(('activity', activity_type), []).append(record_type)
+
+    cutoffs = {}
+    for (key, activity_type, source_name), latest in watermarks.items():
+        if latest is None:
+            continue
+        for record_type in record_types.get((key, activity_type), []):
+            # Same wall-clock layout as the startDate attribute, so plain string comparison works
+            cutoffs.setdefault(record_type, {})[source_name] = latest.strftime('%Y-%m-%d %H:%M:%S')
+    return cutoffs or None
+
+
+def iter_export_rows(source, stats, on_tick=None, cutoffs=None):
+    """
+    Yield (output key, row) for every Record/Workout in an export.xml stream
+
+    Args:
+        source: Binary file-like object positioned at the start of a <HealthData> document
+        stats (ParseStats): Counters updated as records are dispatched
+        on_tick (callable): Called with source every 1000 elements (timeouts, progress)
+        cutoffs (dict): From record_type_cutoffs; records starting before their cutoff are
+                        already imported and are skipped before any conversion
+    """
+    routes = build_routes()
+    workout_route = ('activity', workout_row)
+    root = None
+
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            # The first start event is the HealthData root; keep it so it can be cleared
+            if root is None:
+                root = elem
+            continue
+
+        stats.elements_seen += 1
+        if on_tick is not None and stats.elements_seen % 1000 == 0:
+            on_tick(source)
+
+        tag = elem.tag
+        if tag == 'Record':
+            record_type = elem.get('type')
+            route = routes.get(record_type)
+        elif tag == WORKOUT_TAG:
+            record_type = WORKOUT_TAG
+            route = workout_route
+        else:
+            # Child elements (MetadataEntry, WorkoutEvent...) are freed with their parent
+            continue
+
+        if route is not None and cutoffs is not None:
+            by_source = cutoffs.get(record_type)
+            if by_source is not None:
+                cutoff = by_source.get(elem.get('sourceName', ''), by_source.get(None))
+                if cutoff is not None and elem.get('startDate', '')[:19] < cutoff:
+                    stats.below_watermark += 1
+                    route = None
+
+        if route is not None:
+            key, transform = route
+            try:
+                row = transform(elem.attrib)
+            except (ValueError, TypeError):
+                stats.skipped += 1
+                row = None
+            if row is not None:
+                stats.add(record_type)
+                yield key, row
+
+        # Drop the processed element and anything the root still holds on to
+        elem.clear()
+        if root is not None:
+            root.clear()
+
+
+def _next_record_boundary(f, position, size):
+    """
+    Return the offset of the first top-level <Record at or after position
+
+    Records nested in a <Correlation> (blood pressure, food...) must stay with
+    their parent, so candidates inside an open Correlation are skipped.
+    """
+    while position < size:
+        f.seek(position)
+        chunk = f.read(SHARD_SCAN_WINDOW)
+        index = chunk.find(RECORD_START)
+        if index == -1:
+            if len(chunk) < SHARD_SCAN_WINDOW:
+                return None
+            # Overlap windows so a tag split across two reads is still found
+            position += len(chunk) - len(RECORD_START)
+            continue
+
+        candidate = position + index
+        look_back = max(0, candidate - SHARD_SCAN_WINDOW)
+        f.seek(look_back)
+        before = f.read(candidate - look_back)
+        if before.rfind(CORRELATION_START) > before.rfind(CORRELATION_END):
+            # Inside a Correlation: resume after it closes
+            f.seek(candidate)
+            after = f.read(SHARD_SCAN_WINDOW)
+            end = after.find(CORRELATION_END)
+            position = candidate + (end + len(CORRELATION_END) if end != -1 else len(after))
+            continue
+        return candidate
+    return None
+
+
+def find_shard_ranges(xml_path, shards):
+    """
+    Split export.xml into at most `shards` byte ranges that each start at a
+    top-level <Record element (the first range also holds the prolog/DTD)
+
+    Returns:
+        list: (start, end) byte offsets covering the whole file
+    """
+    size = os.path.getsize(xml_path)
+    offsets = [0]
+    with open(xml_path, 'rb') as f:
+        for i in range(1, shards):
+            target = max(size * i // shards, offsets[-1] + 1)
+            boundary = _next_record_boundary(f, target, size)
+            if boundary is None:
+                break
+            if boundary > offsets[-1]:
+                offsets.append(boundary)
+    offsets.append(size)
+    return list(zip(offsets[:-1], offsets[1:]))
+
+
+class ShardReader:
+    """File-like view of one byte range of export.xml wrapped in <HealthData> tags"""
+    def __init__(self, path, start, end, size):
+        self._file = open(path, 'rb')
+        self._file.seek(start)
+        self._remaining = end - start
+        self._prefix = b'' if start == 0 else b'<HealthData>'
+        self._suffix = b'' if end >= size else b'</HealthData>'
+        self._consumed = 0
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            n = len(self._prefix) + self._remaining + len(self._suffix)
+        out = b''
+        if self._prefix:
+            out, self._prefix = self._prefix[:n], self._prefix[n:]
+        if len(out) < n and self._remaining:
+            data = self._file.read(min(n - len(out), self._remaining))
+            self._remaining -= len(data)
+            out += data
+        if len(out) < n and not self._remaining and self._suffix:
+            take = n - len(out)
+            out, self._suffix = out + self._suffix[:take], self._suffix[take:]
+        self._consumed += len(out)
+        return out
+
+    def tell(self):
+        return self._consumed
+
+    def close(self):
+        self._file.close()
+
+
+def _time_key(field):
+    # Order by actual instant so rows recorded under different UTC offsets interleave correctly
+    return lambda row: timestamp_sort_key(row.get(field))
+
+
+def parse_shard(task):
+    """
+    Parse one byte range of export.xml in a worker process
+
+    Rows are collected per output and, every run_rows rows, sorted by timestamp
+    and written to <key>.<index>.<run>.csv in work_dir, so a worker never holds
+    more than one run per output. The parent k-way merges the runs of all shards.
+    """
+    xml_path, start, end, size, index, work_dir, timeout, cutoffs, run_rows = task
+    stats = ParseStats()
+    timeout_handler = TimeoutHandler(timeout)
+    rows = {key: [] for key in OUTPUT_FIELDS}
+    paths = {key: [] for key in OUTPUT_FIELDS}
+    error = None
+
+    def write_run(key):
+        path = os.path.join(work_dir, f'{key}.{index:04d}.{len(paths[key]):04d}.csv')
+        sink = CsvSink(path, OUTPUT_FIELDS[key])
+        for row in sorted(rows[key], key=_time_key(OUTPUT_TIME_FIELDS[key])):
+            sink.write(row)
+        sink.close()
+        paths[key].append(path)
+        rows[key] = []
+
+    reader = ShardReader(xml_path, start, end, size)
+    try:
+        for key, row in iter_export_rows(
+                reader, stats, lambda source: timeout_handler.check_timeout(f'shard {index}', stats.total), cutoffs):
+            rows[key].append(row)
+            if len(rows[key]) >= run_rows:
+                write_run(key)
+    except TimeoutError as e:
+        error = str(e)
+    finally:
+        reader.close()
+
+    for key in OUTPUT_FIELDS:
+        if rows[key]:
+            write_run(key)
+
+    return {
+        'index': index,
+        'paths': paths,
+        'counts': stats.counts,
+        'skipped': stats.skipped,
+        'below_watermark': stats.below_watermark,
+        'elements_seen': stats.elements_seen,
+        'error': error,
+    }
+
+
+def merge_shard_rows(paths, key):
+    """k-way merge of timestamp-sorted shard runs for one output, ties kept in file order"""
+    files = [open(path, newline='') for path in paths]
+    try:
+        yield from heapq.merge(*(csv.DictReader(f) for f in files), key=_time_key(OUTPUT_TIME_FIELDS[key]))
+    finally:
+        for f in files:
+            f.close()
+
+
 class AppleHealthParser:
     """
     Parser for Apple Health export data (export.xml)
     Uses incremental parsing and batch processing to handle large files efficiently
     """
-    
-    def __init__(self, file_path):
+
+    def __init__(self, file_path, single_pass=True, workers=1):
         """
         Initialize parser with file path
-        
+
         Args:
             file_path (str): Path to Apple Health export file (ZIP or XML)
+            single_pass (bool): Read export.xml once and route every record type to its
+                output file, instead of re-reading the file once per metric
+            workers (int): Parse the single pass in this many processes by splitting
+                export.xml into byte ranges (1 = parse in the current process)
         """
         self.file_path = file_path
         self.xml_path = None
+        self.single_pass = single_pass
+        self.workers = max(int(workers or 1), 1)
         self.timeout_handler = TimeoutHandler()
+        self.stats = None
+        # Latest timestamps already imported (see record_type_cutoffs); older records are skipped
+        self.watermarks = None
+        # Optional callable receiving the percentage of export.xml consumed so far
+        self.progress_callback = None
         self._prepare_file()
     
     def _prepare_file(self):
@@ -367,6 +843,134 @@ class AppleHealthParser:
         except Exception as e:
             raise FileValidationError(f'Error parsing file: {str(e)}')
     
+    def iter_rows(self, stats=None):
+        """
+        Walk export.xml exactly once and yield (output key, row) for every Record/Workout
+        we import. Elements are cleared as soon as they are transformed, so memory stays
+        flat regardless of export size. With workers > 1 the file is parsed in parallel
+        shards and rows are yielded per output in timestamp order. Records older than
+        self.watermarks are dropped at the attribute check (the legacy multi-pass
+        generate_* methods do not apply watermarks).
+
+        Args:
+            stats (ParseStats): Counters updated as records are dispatched; a new one is
+                                created and stored on self.stats if not given
+
+        Raises:
+            TimeoutError: When the parser timeout is exceeded; rows yielded so far are valid
+        """
+        if stats is None:
+            stats = ParseStats()
+        self.stats = stats
+
+        if self.workers > 1:
+            yield from self._iter_parallel_rows(stats)
+            return
+
+        total_bytes = os.path.getsize(self.xml_path) or 1
+        last_progress = [-1]
+
+        def on_tick(source):
+            self.timeout_handler.check_timeout('single_pass', stats.total)
+            if self.progress_callback is not None:
+                progress = int(source.tell() * 100 / total_bytes)
+                if progress != last_progress[0]:
+                    last_progress[0] = progress
+                    self.progress_callback(progress)
+
+        try:
+            with open(self.xml_path, 'rb') as source:
+                yield from iter_export_rows(source, stats, on_tick, record_type_cutoffs(self.watermarks))
+        finally:
+            stats.finish()
+
+    def _iter_parallel_rows(self, stats):
+        """Parse byte-range shards in worker processes, then merge their outputs"""
+        work_dir = tempfile.mkdtemp(prefix='shards_', dir=os.path.dirname(self.xml_path))
+        try:
+            results, error = self._run_shards(work_dir, stats)
+            for key in OUTPUT_FIELDS:
+                for row in merge_shard_rows([path for r in results for path in r['paths'][key]], key):
+                    yield key, row
+            if error:
+                raise TimeoutError(error)
+        finally:
+            stats.finish()
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def _run_shards(self, work_dir, stats):
+        """
+        Split export.xml at top-level <Record boundaries and parse every range in a
+        ProcessPoolExecutor. Each worker writes timestamp-sorted runs of at most
+        SHARD_RUN_ROWS rows per output.
+
+        Returns:
+            tuple: (shard results ordered by position in the file, first timeout error or None)
+        """
+        shards = find_shard_ranges(self.xml_path, self.workers)
+        size = os.path.getsize(self.xml_path)
+        timeout = self.timeout_handler.timeout
+        if timeout is not None:
+            timeout = max(timeout - (time.time() - self.timeout_handler.start_time), 1)
+        cutoffs = record_type_cutoffs(self.watermarks)
+        tasks = [
+            (self.xml_path, start, end, size, index, work_dir, timeout, cutoffs, SHARD_RUN_ROWS)
+            for index, (start, end) in enumerate(shards)
+        ]
+        print(f"Parsing {len(tasks)} shards of {self.xml_path} with {self.workers} workers")
+
+        results = []
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(tasks))) as pool:
+            futures = [pool.submit(parse_shard, task) for task in tasks]
+            try:
+                for done, future in enumerate(as_completed(futures), start=1):
+                    results.append(future.result())
+                    if self.progress_callback is not None:
+                        self.progress_callback(int(done * 100 / len(futures)))
+            except ET.ParseError as e:
+                for future in futures:
+                    future.cancel()
+                raise FileValidationError(f'Invalid XML format: {str(e)}')
+
+        results.sort(key=lambda r: r['index'])
+        for result in results:
+            stats.merge(result)
+        errors = [r['error'] for r in results if r['error']]
+        return results, (errors[0] if errors else None)
+
+    def _parse_all_single_pass(self, output_dir):
+        """Generate all CSV files from a single iterparse walk over export.xml"""
+        print(f"Starting single-pass Apple Health parsing at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        stats = ParseStats()
+        sinks = {
+            'activity': CsvSink(os.path.join(output_dir, 'activity.csv'), ACTIVITY_FIELDS),
+            'heart_rate': CsvSink(os.path.join(output_dir, 'heart_rate.csv'), HEART_RATE_FIELDS),
+            'sleep': CsvSink(os.path.join(output_dir, 'sleep.csv'), SLEEP_FIELDS),
+            'weight': CsvSink(os.path.join(output_dir, 'weight.csv'), WEIGHT_FIELDS),
+        }
+        error = None
+        try:
+            for key, row in self.iter_rows(stats):
+                sinks[key].write(row)
+        except TimeoutError as e:
+            print(f"Warning: {str(e)}. Returning partial results.")
+            error = str(e)
+        except ET.ParseError as e:
+            raise FileValidationError(f'Invalid XML format: {str(e)}')
+        finally:
+            for sink in sinks.values():
+                sink.close()
+
+        stats.log_summary()
+        return {
+            'output_dir': output_dir,
+            'files_generated': [f'{name}.csv' for name in sinks],
+            'processing_time': int(stats.end_time - stats.start_time),
+            'partial_results': error is not None,
+            'error': error,
+            'throughput': stats.report()
+        }
+
     def _stream_generate_csv_batched(self, batch_generator, output_path, transform_func):
         """
         Stream-generate a CSV file from batched parsed data to minimize memory usage
@@ -463,19 +1067,7 @@ class AppleHealthParser:
         steps_count = self._stream_generate_csv_batched(
             self._iterparse_records_batched('HKQuantityTypeIdentifierStepCount'),
             steps_path,
-            lambda r: {
-                'user_id': 'user_id',
-                'activity_type': 'steps',
-                'subtype': None,
-                'start_time': r.get('startDate'),
-                'end_time': r.get('endDate'),
-                'value': float(r.get('value', 0)),
-                'unit': r.get('unit', 'count'),
-                'source_name': r.get('sourceName', ''),
-                'source_version': None,
-                'device': r.get('device', ''),
-                'import_batch_id': 'import_batch_id'
-            }
+            lambda r: activity_row(r, 'steps', 'count')
         )
         total_records += steps_count
         print(f"Processed {steps_count} step count records")
@@ -484,19 +1076,7 @@ class AppleHealthParser:
         distance_count = self._stream_generate_csv_batched(
             self._iterparse_records_batched('HKQuantityTypeIdentifierDistanceWalkingRunning'),
             distance_path,
-            lambda r: {
-                'user_id': 'user_id',
-                'activity_type': 'distance',
-                'subtype': None,
-                'start_time': r.get('startDate'),
-                'end_time': r.get('endDate'),
-                'value': float(r.get('value', 0)),
-                'unit': r.get('unit', 'km'),
-                'source_name': r.get('sourceName', ''),
-                'source_version': None,
-                'device': r.get('device', ''),
-                'import_batch_id': 'import_batch_id'
-            }
+            lambda r: activity_row(r, 'distance', 'km')
         )
         total_records += distance_count
         print(f"Processed {distance_count} distance records")
@@ -505,19 +1085,7 @@ class AppleHealthParser:
         calories_count = self._stream_generate_csv_batched(
             self._iterparse_records_batched('HKQuantityTypeIdentifierActiveEnergyBurned'),
             calories_path,
-            lambda r: {
-                'user_id': 'user_id',
-                'activity_type': 'calories',
-                'subtype': None,
-                'start_time': r.get('startDate'),
-                'end_time': r.get('endDate'),
-                'value': float(r.get('value', 0)),
-                'unit': r.get('unit', 'kcal'),
-                'source_name': r.get('sourceName', ''),
-                'source_version': None,
-                'device': r.get('device', ''),
-                'import_batch_id': 'import_batch_id'
-            }
+            lambda r: activity_row(r, 'calories', 'kcal')
         )
         total_records += calories_count
         print(f"Processed {calories_count} calories records")
@@ -526,19 +1094,7 @@ class AppleHealthParser:
         workout_count = self._stream_generate_csv_batched(
             self._iterparse_workouts_batched(),
             workout_path,
-            lambda w: {
-                'user_id': 'user_id',
-                'activity_type': 'workout',
-                'subtype': w.get('workoutActivityType', ''),
-                'start_time': w.get('startDate'),
-                'end_time': w.get('endDate'),
-                'value': float(w.get('totalDistance', 0)) if w.get('totalDistance') else (float(w.get('totalEnergyBurned', 0)) if w.get('totalEnergyBurned') else 0),
-                'unit': 'km' if w.get('totalDistance') else 'kcal',
-                'source_name': w.get('sourceName', ''),
-                'source_version': None,
-                'device': w.get('device', ''),
-                'import_batch_id': 'import_batch_id'
-            }
+            workout_row
         )
         total_records += workout_count
         print(f"Processed {workout_count} workout records")
@@ -613,17 +1169,7 @@ class AppleHealthParser:
                 # Chain the first batch with the remaining batches
                 ([first_batch] if first_batch else []) + list(heart_rate_records_generator),
                 csv_file_path,
-                lambda r: {
-                    'user_id': 'user_id',
-                    'heart_type': 'active',
-                    'timestamp': r.get('startDate'),
-                    'value': float(r.get('value', 0)),
-                    'unit': r.get('unit', 'count/min'),
-                    'source_name': r.get('sourceName', ''),
-                    'source_version': None,
-                    'device': r.get('device', ''),
-                    'import_batch_id': 'import_batch_id'
-                }
+                heart_rate_row
             )
             
             print(f"Processed {count} heart rate records")
@@ -664,16 +1210,7 @@ class AppleHealthParser:
                 # Chain the first batch with the remaining batches
                 ([first_batch] if first_batch else []) + list(sleep_records_generator),
                 csv_file_path,
-                lambda r: {
-                    'user_id': 'user_id',
-                    'stage': r.get('value', ''),
-                    'start_time': r.get('startDate'),
-                    'end_time': r.get('endDate'),
-                    'source_name': r.get('sourceName', ''),
-                    'source_version': None,
-                    'device': r.get('device', ''),
-                    'import_batch_id': 'import_batch_id'
-                }
+                sleep_row
             )
             
             print(f"Processed {count} sleep records")
@@ -714,17 +1251,7 @@ class AppleHealthParser:
                 # Chain the first batch with the remaining batches
                 ([first_batch] if first_batch else []) + list(weight_records_generator),
                 csv_file_path,
-                lambda r: {
-                    'user_id': 'user_id',
-                    'weight_type': 'body_mass',
-                    'timestamp': r.get('startDate'),
-                    'value': float(r.get('value', 0)),
-                    'unit': r.get('unit', 'kg'),
-                    'source_name': r.get('sourceName', ''),
-                    'source_version': None,
-                    'device': r.get('device', ''),
-                    'import_batch_id': 'import_batch_id'
-                }
+                weight_row
             )
             
             print(f"Processed {count} weight records")
@@ -739,7 +1266,31 @@ class AppleHealthParser:
             return csv_file_path
 
     def parse_all(self, output_dir):
-        """Parse all available health data and generate CSV files incrementally with batched processing"""
+        """
+        Parse all available health data and generate CSV files
+
+        Uses the single-pass dispatcher by default; the legacy per-type multi-pass
+        path is kept for comparison and can be selected with single_pass=False.
+        """
+        try:
+            if self.single_pass:
+                return self._parse_all_single_pass(output_dir)
+            return self._parse_all_multi_pass(output_dir)
+        finally:
+            # Clean up temp files to ensure we free memory
+            self.cleanup()
+
+    def cleanup(self):
+        """Remove the temp directory a ZIP export was extracted to"""
+        try:
+            temp_dir = os.path.join(os.path.dirname(self.file_path), 'temp')
+            if os.path.exists(temp_dir) and os.path.isdir(temp_dir):
+                shutil.rmtree(temp_dir)
+        except Exception as e:
+            print(f"Warning: Could not remove temporary directory: {str(e)}")
+
+    def _parse_all_multi_pass(self, output_dir):
+        """Generate CSV files with one iterparse walk per record type (legacy path)"""
         try:
             start_time = time.time()
             print(f"Starting Apple Health data parsing at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -820,12 +1371,4 @@ class AppleHealthParser:
                 'files_generated': generated_files,
                 'partial_results': True,
                 'error': str(e)
-            }
-        finally:
-            # Clean up temp files to ensure we free memory
-            try:
-                temp_dir = os.path.join(os.path.dirname(self.file_path), 'temp')
-                if os.path.exists(temp_dir) and os.path.isdir(temp_dir):
-                    shutil.rmtree(temp_dir)
-            except Exception as e:
-                print(f"Warning: Could not remove temporary directory: {str(e)}")
\ No newline at end of file
+            }
\ No newline at end of file
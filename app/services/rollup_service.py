@@ -0,0 +1,264 @@
+"""
+Daily and hourly rollups of the raw health tables
+
+Dashboards, charts, goals and share pages mostly need per-day (or per-hour)
+min/max/sum/count, not individual samples. Those aggregates are kept in the
+rollup tables from app.models.rollup and rebuilt for just the days that raw
+rows were written to:
+
+- bulk imports call refresh_rollups() after every BulkWriter batch
+- ORM writes (single records added through a form, tests, scripts) are picked
+  up by session events registered with register_rollup_events()
+
+A refresh recomputes the affected days from the raw rows with GROUP BY and
+replaces the rollup rows, so it is idempotent and unaffected by rows the
+natural-key check skipped. rebuild_rollups() recomputes everything for a user.
+
+Listeners added with add_rollup_listener() are handed the old and new rows of
+each daily rollup a refresh replaces, so running aggregates built on the
+rollups (app.services.achievement_stats) can apply just the difference.
+"""
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import Date, case, cast, delete, event, func, inspect, select
+from sqlalchemy.orm import Session
+from app import db
+from app.models import Activity, HeartRate, Sleep, Weight
+from app.models.rollup import (
+    ActivityDailyRollup, HeartRateDailyRollup, HeartRateHourlyRollup, SleepDailyRollup, WeightDailyRollup
+)
+
+# rollup: target model; source: raw model; bucket: 'day' or 'hour';
+# keys: extra grouping columns {rollup column: raw column};
+# measures: {rollup column: aggregate over raw rows}
+RollupSpec = namedtuple('RollupSpec', ['rollup', 'source', 'bucket', 'keys', 'measures'])
+
+
+def _value_measures(model):
+    return {
+        'min_value': func.min(model.value),
+        'max_value': func.max(model.value),
+        'total': func.coalesce(func.sum(model.value), 0),
+        'count': func.count(model.value),
+    }
+
+
+ROLLUP_SPECS = [
+    RollupSpec(HeartRateDailyRollup, HeartRate, 'day', {'unit': func.coalesce(HeartRate.unit, '')},
+               _value_measures(HeartRate)),
+    RollupSpec(HeartRateHourlyRollup, HeartRate, 'hour', {}, _value_measures(HeartRate)),
+    RollupSpec(ActivityDailyRollup, Activity, 'day', {'activity_type': func.coalesce(Activity.activity_type, '')}, {
+        'total': func.coalesce(func.sum(Activity.value), 0),
+        'steps': func.coalesce(func.sum(case(
+            (Activity.total_steps > 0, Activity.total_steps),
+            (Activity.activity_type == 'steps', Activity.value),
+            else_=0
+        )), 0),
+        'count': func.count(),
+    }),
+    RollupSpec(SleepDailyRollup, Sleep, 'day', {}, {
+        'duration': func.coalesce(func.sum(Sleep.duration), 0),
+        'deep_sleep': func.coalesce(func.sum(Sleep.deep_sleep), 0),
+        'light_sleep': func.coalesce(func.sum(Sleep.light_sleep), 0),
+        'rem_sleep': func.coalesce(func.sum(Sleep.rem_sleep), 0),
+        'awake': func.coalesce(func.sum(Sleep.awake), 0),
+        'count': func.count(),
+    }),
+    RollupSpec(WeightDailyRollup, Weight, 'day', {}, _value_measures(Weight)),
+]
+SOURCE_MODELS = (HeartRate, Weight, Activity, Sleep)
+
+# {rollup model: [listener(connection, rollup, user_id, first_day, last_day, old_rows, new_rows)]}
+_rollup_listeners = {}
+# Run when rebuild_rollups() starts over: reset(connection, user_id or None)
+_rebuild_listeners = []
+
+
+def add_rollup_listener(rollup, listener, on_rebuild=None):
+    """
+    Call listener after every refresh of a daily rollup table
+
+    The listener gets the rollup rows of the refreshed days before and after the
+    refresh, as dicts of the day, key and measure columns. on_rebuild, if given,
+    is called before rebuild_rollups() recomputes a user (None for everyone).
+    """
+    listeners = _rollup_listeners.setdefault(rollup, [])
+    if listener not in listeners:
+        listeners.append(listener)
+    if on_rebuild is not None and on_rebuild not in _rebuild_listeners:
+        _rebuild_listeners.append(on_rebuild)
+
+
+def bucket_expression(column, bucket, dialect_name):
+    """Start of the day or hour containing a timestamp, in SQL"""
+    if bucket == 'day':
+        return func.date(column) if dialect_name == 'sqlite' else cast(column, Date)
+    if dialect_name == 'sqlite':
+        return func.strftime('%Y-%m-%d %H:00:00', column)
+    return func.date_trunc('hour', column)
+
+
+def _bucket_value(value, bucket):
+    """SQLite returns buckets as text; convert them to the column's Python type"""
+    if isinstance(value, str):
+        return date.fromisoformat(value) if bucket == 'day' else datetime.fromisoformat(value)
+    if bucket == 'day' and isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def _refresh_spec(connection, spec, user_id, first_day, last_day):
+    """Recompute one rollup table for a user over whole days first_day..last_day"""
+    start = datetime.combine(first_day, time.min)
+    end = datetime.combine(last_day + timedelta(days=1), time.min)
+    bucket = bucket_expression(spec.source.timestamp, spec.bucket, connection.dialect.name).label('bucket')
+    keys = [expression.label(name) for name, expression in spec.keys.items()]
+    measures = [expression.label(name) for name, expression in spec.measures.items()]
+
+    rows = connection.execute(
+        select(bucket, *keys, *measures)
+        .where(spec.source.user_id == user_id, spec.source.timestamp >= start, spec.source.timestamp < end)
+        .group_by(bucket, *keys)
+    ).mappings().all()
+
+    bucket_column = spec.rollup.day if spec.bucket == 'day' else spec.rollup.hour
+    lower, upper = (first_day, last_day) if spec.bucket == 'day' else (start, end - timedelta(microseconds=1))
+    in_range = (spec.rollup.user_id == user_id, bucket_column >= lower, bucket_column <= upper)
+    columns = [spec.bucket] + list(spec.keys) + list(spec.measures)
+    listeners = _rollup_listeners.get(spec.rollup, []) if spec.bucket == 'day' else []
+    old_rows = []
+    if listeners:
+        old_rows = [dict(row) for row in connection.execute(
+            select(*[spec.rollup.__table__.c[name] for name in columns]).where(*in_range)
+        ).mappings()]
+
+    connection.execute(delete(spec.rollup.__table__).where(*in_range))
+    now = datetime.utcnow()
+    new_rows = [
+        {
+            **{name: row[name] for name in list(spec.keys) + list(spec.measures)},
+            'user_id': user_id,
+            spec.bucket: _bucket_value(row['bucket'], spec.bucket),
+            'updated_at': now,
+        }
+        for row in rows
+    ]
+    if new_rows:
+        connection.execute(spec.rollup.__table__.insert(), new_rows)
+    for listener in listeners:
+        listener(connection, spec.rollup, user_id, first_day, last_day, old_rows,
+                 [{name: row[name] for name in columns} for row in new_rows])
+    return len(rows)
+
+
+def refresh_rollups(user_id, source, first_day, last_day, connection=None):
+    """
+    Rebuild every rollup fed by a raw table for a user and a range of days
+
+    Args:
+        user_id: The user ID
+        source: Raw model (HeartRate, Weight, Activity or Sleep)
+        first_day: First day to rebuild (date or datetime)
+        last_day: Last day to rebuild, inclusive
+        connection: Connection to run on; defaults to the session's, caller commits
+
+    Returns:
+        Number of rollup rows written
+    """
+    connection = connection or db.session.connection()
+    first_day = first_day.date() if isinstance(first_day, datetime) else first_day
+    last_day = last_day.date() if isinstance(last_day, datetime) else last_day
+    return sum(
+        _refresh_spec(connection, spec, user_id, first_day, last_day)
+        for spec in ROLLUP_SPECS if spec.source is source
+    )
+
+
+def refresh_rollups_for_rows(source, rows, connection=None):
+    """
+    Rebuild the rollups covering a batch of raw rows (dicts with user_id and timestamp)
+
+    Returns:
+        Number of rollup rows written
+    """
+    spans = {}
+    for row in rows:
+        timestamp = row.get('timestamp')
+        if timestamp is None:
+            continue
+        first, last = spans.get(row['user_id'], (timestamp, timestamp))
+        spans[row['user_id']] = (min(first, timestamp), max(last, timestamp))
+    return sum(
+        refresh_rollups(user_id, source, first, last, connection=connection)
+        for user_id, (first, last) in spans.items()
+    )
+
+
+def rebuild_rollups(user_id=None):
+    """
+    Recompute all rollups from scratch, for one user or everyone, and commit
+
+    Returns:
+        Number of rollup rows written
+    """
+    for on_rebuild in _rebuild_listeners:
+        on_rebuild(db.session.connection(), user_id)
+    for spec in ROLLUP_SPECS:
+        stale = delete(spec.rollup.__table__)
+        if user_id is not None:
+            stale = stale.where(spec.rollup.user_id == user_id)
+        db.session.execute(stale)
+
+    written = 0
+    for source in SOURCE_MODELS:
+        spans = db.session.query(
+            source.user_id, func.min(source.timestamp), func.max(source.timestamp)
+        ).group_by(source.user_id)
+        if user_id is not None:
+            spans = spans.filter(source.user_id == user_id)
+        for row_user_id, first, last in spans.all():
+            written += refresh_rollups(row_user_id, source, first, last)
+    db.session.commit()
+    return written
+
+
+def _timestamps_touched(instance, deleted=False):
+    """Old and new timestamps of a raw row changed in a flush"""
+    if deleted:
+        return [instance.timestamp]
+    history = inspect(instance).attrs.timestamp.history
+    return [value for value in list(history.added) + list(history.deleted) + list(history.unchanged)
+            if value is not None]
+
+
+def _collect_touched_rows(session, flush_context):
+    touched = session.info.setdefault('rollup_rows', {})
+    changed = [(instance, False) for instance in list(session.new) + list(session.dirty)]
+    changed += [(instance, True) for instance in session.deleted]
+    for instance, deleted in changed:
+        if isinstance(instance, SOURCE_MODELS) and instance.user_id is not None:
+            rows = touched.setdefault(type(instance), [])
+            rows.extend({'user_id': instance.user_id, 'timestamp': timestamp}
+                        for timestamp in _timestamps_touched(instance, deleted))
+
+
+def _refresh_touched_rows(session, flush_context):
+    touched = session.info.pop('rollup_rows', None)
+    if not touched:
+        return
+    connection = session.connection()
+    for source, rows in touched.items():
+        refresh_rollups_for_rows(source, rows, connection=connection)
+
+
+def _load_old_timestamp(target, value, oldvalue, initiator):
+    """Registered with active_history so a moved row also refreshes the day it left"""
+
+
+def register_rollup_events():
+    """Keep rollups current for raw rows written through the ORM"""
+    if not event.contains(Session, 'after_flush', _collect_touched_rows):
+        event.listen(Session, 'after_flush', _collect_touched_rows)
+        event.listen(Session, 'after_flush_postexec', _refresh_touched_rows)
+        for model in SOURCE_MODELS:
+            event.listen(model.timestamp, 'set', _load_old_timestamp, active_history=True)
@@ -0,0 +1,258 @@
+"""
+Current and longest streaks of consecutive qualifying days, per user and metric
+
+A day qualifies for a metric when its daily rollup says so (see STREAK_SPECS):
+a weight, sleep or heart rate record that day, or at least STEPS_STREAK_TARGET
+steps. compute_streak() finds the runs of consecutive qualifying days with a
+gaps-and-islands query: consecutive days minus their ROW_NUMBER() share one
+value per run, so grouping by it gives each run's first day, last day and
+length, and two more ROW_NUMBER()s pick the latest and the longest run.
+Databases without window functions (SQLite before 3.25) get the qualifying
+days instead and the runs are found with NumPy run-length encoding.
+
+The result is persisted as one Streak row per user and metric and kept current
+from the rollup refreshes of every import batch and ORM write: days that start
+to qualify are joined to the runs either side of them, read outward in doubling
+windows, and only a day that stops qualifying makes the metric be recomputed.
+Readers (goal pages, the dashboard goals panel, the achievement rules) load the
+rows with get_streaks().
+"""
+import sqlite3
+from collections import namedtuple
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import Integer, cast, delete, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models.rollup import ActivityDailyRollup, HeartRateDailyRollup, SleepDailyRollup, WeightDailyRollup
+from app.models.streak import Streak
+from app.services.rollup_service import add_rollup_listener
+
+STEPS_STREAK_TARGET = 5000
+STREAK_WINDOW = 8  # Days read at a time when following a run past the refreshed days, doubling each time
+
+# metric: Streak.metric; rollup: daily rollup model; qualifies: whether a rollup row makes its
+# day count; condition: the same test as SQL
+StreakSpec = namedtuple('StreakSpec', ['metric', 'rollup', 'qualifies', 'condition'])
+
+STREAK_SPECS = {
+    spec.metric: spec for spec in (
+        StreakSpec('steps', ActivityDailyRollup,
+                   lambda row: row['activity_type'] == 'steps' and (row['total'] or 0) >= STEPS_STREAK_TARGET,
+                   (ActivityDailyRollup.activity_type == 'steps', ActivityDailyRollup.total >= STEPS_STREAK_TARGET)),
+        StreakSpec('weight', WeightDailyRollup, lambda row: row['count'] > 0, (WeightDailyRollup.count > 0,)),
+        StreakSpec('sleep', SleepDailyRollup, lambda row: row['count'] > 0, (SleepDailyRollup.count > 0,)),
+        StreakSpec('heart_rate', HeartRateDailyRollup, lambda row: row['count'] > 0, (HeartRateDailyRollup.count > 0,)),
+    )
+}
+
+Run = namedtuple('Run', ['start', 'end', 'length'])
+
+
+def _qualifying_days(connection, spec, user_id, first_day=None, last_day=None):
+    """Days that count towards a streak, oldest first"""
+    query = select(spec.rollup.day).distinct().where(spec.rollup.user_id == user_id, *spec.condition)
+    if first_day is not None:
+        query = query.where(spec.rollup.day >= first_day, spec.rollup.day <= last_day)
+    return connection.execute(query.order_by(spec.rollup.day)).scalars().all()
+
+
+def _supports_window_functions(connection):
+    if connection.dialect.name != 'sqlite':
+        return True
+    return sqlite3.sqlite_version_info >= (3, 25)
+
+
+def _runs_statement(spec, user_id, dialect_name):
+    """The latest and the longest run of qualifying days, found in SQL with gaps and islands"""
+    days = select(spec.rollup.day.label('day')).distinct().where(
+        spec.rollup.user_id == user_id, *spec.condition
+    ).subquery('days')
+    position = func.row_number().over(order_by=days.c.day)
+    # Constant within a run of consecutive days, different between runs
+    if dialect_name == 'sqlite':
+        island = func.julianday(days.c.day) - position
+    else:
+        island = days.c.day - cast(position, Integer)
+    islands = select(days.c.day, island.label('island')).subquery('islands')
+    runs = select(
+        func.min(islands.c.day).label('start'),
+        func.max(islands.c.day).label('end'),
+        func.count().label('length'),
+    ).group_by(islands.c.island).subquery('runs')
+    ranked = select(
+        runs,
+        func.row_number().over(order_by=runs.c.end.desc()).label('latest'),
+        func.row_number().over(order_by=(runs.c.length.desc(), runs.c.end.desc())).label('longest'),
+    ).subquery('ranked')
+    return select(ranked).where(or_(ranked.c.latest == 1, ranked.c.longest == 1))
+
+
+def runs_from_days(days):
+    """Runs of consecutive days in a sorted list, by run-length encoding with NumPy"""
+    if not len(days):
+        return []
+    ordinals = np.fromiter((day.toordinal() for day in days), dtype=np.int64, count=len(days))
+    breaks = np.flatnonzero(np.diff(ordinals) != 1) + 1
+    starts = np.concatenate(([0], breaks))
+    ends = np.concatenate((breaks, [len(days)])) - 1
+    return [Run(days[start], days[end], int(end - start + 1)) for start, end in zip(starts, ends)]
+
+
+def _day(value):
+    """Days from the SQL path come back as text on SQLite"""
+    if isinstance(value, str):
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    return value
+
+
+def _streak_values(latest, longest):
+    return {
+        'current_length': latest.length if latest else 0,
+        'current_start': latest.start if latest else None,
+        'current_end': latest.end if latest else None,
+        'longest_length': longest.length if longest else 0,
+        'longest_start': longest.start if longest else None,
+        'longest_end': longest.end if longest else None,
+    }
+
+
+def compute_streak(connection, spec, user_id, method=None):
+    """
+    A user's latest and longest run for one metric, from the rollups
+
+    Args:
+        method: 'sql' for the window-function query, 'numpy' for run-length
+            encoding in Python; by default 'sql' where the database supports it
+
+    Returns:
+        dict: Streak column values
+    """
+    method = method or ('sql' if _supports_window_functions(connection) else 'numpy')
+    if method == 'numpy':
+        runs = runs_from_days(_qualifying_days(connection, spec, user_id))
+        latest = runs[-1] if runs else None
+        longest = max(reversed(runs), key=lambda run: run.length) if runs else None
+        return _streak_values(latest, longest)
+
+    latest = longest = None
+    for row in connection.execute(_runs_statement(spec, user_id, connection.dialect.name)):
+        run = Run(_day(row.start), _day(row.end), row.length)
+        if row.latest == 1:
+            latest = run
+        if row.longest == 1:
+            longest = run
+    return _streak_values(latest, longest)
+
+
+def _run_length(connection, spec, user_id, start, step):
+    """Consecutive qualifying days from start, going back (step -1) or forward (step 1)"""
+    total, window = 0, STREAK_WINDOW
+    while True:
+        end = start + timedelta(days=step * (window - 1))
+        days = set(_qualifying_days(connection, spec, user_id, min(start, end), max(start, end)))
+        run = 0
+        while run < window and start + timedelta(days=step * run) in days:
+            run += 1
+        total += run
+        if run < window:
+            return total
+        start += timedelta(days=step * window)
+        window *= 2
+
+
+def _runs_through(connection, spec, user_id, first_day, last_day, qualifying):
+    """Runs that include a refreshed day, extended past first_day and last_day as far as they go"""
+    runs, start = [], None
+    day = first_day
+    while day <= last_day + timedelta(days=1):
+        if day <= last_day and day in qualifying:
+            start = start or day
+        elif start is not None:
+            end = day - timedelta(days=1)
+            if start == first_day:
+                start -= timedelta(days=_run_length(connection, spec, user_id, first_day - timedelta(days=1), -1))
+            if end == last_day:
+                end += timedelta(days=_run_length(connection, spec, user_id, last_day + timedelta(days=1), 1))
+            runs.append(Run(start, end, (end - start).days + 1))
+            start = None
+        day += timedelta(days=1)
+    return runs
+
+
+def apply_rollup_change(connection, rollup, user_id, first_day, last_day, old_rows, new_rows):
+    """
+    Apply a refresh of a user's daily rollup to their Streak rows
+
+    Registered with rollup_service; metrics without a row yet are skipped, they
+    are computed from the up-to-date rollups when first read.
+    """
+    table = Streak.__table__
+    for spec in STREAK_SPECS.values():
+        if spec.rollup is not rollup:
+            continue
+        before = {row['day'] for row in old_rows if spec.qualifies(row)}
+        after = {row['day'] for row in new_rows if spec.qualifies(row)}
+        if before == after:
+            continue
+        key = (table.c.user_id == user_id, table.c.metric == spec.metric)
+        streak = connection.execute(select(table).where(*key)).mappings().first()
+        if streak is None:
+            continue
+
+        if before - after:
+            # A run may have been broken or shortened; start over from the rollups
+            values = compute_streak(connection, spec, user_id)
+        else:
+            # Days were only added: the best runs are the stored ones or ones through the new days
+            values = dict(streak)
+            for run in _runs_through(connection, spec, user_id, first_day, last_day, after):
+                if values['current_end'] is None or run.end >= values['current_end']:
+                    values.update(current_length=run.length, current_start=run.start, current_end=run.end)
+                if run.length > (values['longest_length'] or 0) or (
+                        run.length == values['longest_length'] and run.end > values['longest_end']):
+                    values.update(longest_length=run.length, longest_start=run.start, longest_end=run.end)
+            values = {name: values[name] for name in _streak_values(None, None)}
+        connection.execute(update(table).where(*key).values(**values, updated_at=datetime.utcnow()))
+
+
+def reset_streaks(connection, user_id=None):
+    """Drop the streaks of a user (or everyone) so they are recomputed when next read"""
+    stale = delete(Streak.__table__)
+    if user_id is not None:
+        stale = stale.where(Streak.user_id == user_id)
+    connection.execute(stale)
+
+
+def get_streaks(user_id):
+    """
+    A user's Streak for every metric, computing and committing any that do not exist yet
+
+    Returns:
+        dict: {metric: Streak}
+    """
+    query = Streak.query.filter_by(user_id=user_id).populate_existing()
+    streaks = {streak.metric: streak for streak in query}
+    missing = [spec for metric, spec in STREAK_SPECS.items() if metric not in streaks]
+    if not missing:
+        return streaks
+
+    connection = db.session.connection()
+    now = datetime.utcnow()
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(Streak), [
+                {'user_id': user_id, 'metric': spec.metric, 'updated_at': now,
+                 **compute_streak(connection, spec, user_id)}
+                for spec in missing
+            ])
+    except IntegrityError:
+        pass  # Computed by a concurrent request in the meantime
+    db.session.commit()
+    return {streak.metric: streak for streak in query}
+
+
+def register_streak_listeners():
+    """Keep Streak rows current whenever the daily rollups are refreshed"""
+    for spec in STREAK_SPECS.values():
+        add_rollup_listener(spec.rollup, apply_rollup_change, on_rebuild=reset_streaks)
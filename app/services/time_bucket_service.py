@@ -0,0 +1,153 @@
+"""
+Time-bucket aggregation for the chart routes
+
+The chart pages used to load every row in the range and walk the list of time
+slots for each one. Here the bucketing is done by the database instead: a CASE
+expression maps each timestamp to its slot number and min/max/sum/count are
+computed per slot with GROUP BY, so only one row per slot comes back. Plain
+CASE and comparison operators behave the same on SQLite and PostgreSQL.
+
+aggregate_rollup_slots does the same over the daily/hourly rollup tables, for
+slots that start and end on whole days (or hours).
+"""
+from datetime import datetime, time, timedelta
+from sqlalchemy import case, func
+from app import db
+
+
+def slot_bucket_expression(column, time_slots):
+    """
+    SQL expression giving the index of the slot a timestamp falls in
+
+    Slots from generate_time_slots are contiguous, so checking the end of each
+    slot in order is enough once the query is limited to the whole range.
+
+    Args:
+        column: Timestamp column to bucket
+        time_slots: Slots from chart_utils.generate_time_slots
+
+    Returns:
+        CASE expression evaluating to the slot index
+    """
+    return case(
+        *[(column < slot['end'], index) for index, slot in enumerate(time_slots)],
+        else_=None
+    )
+
+
+def empty_slot_stats():
+    """Metrics for a slot with no readings"""
+    return {'min': 0, 'max': 0, 'avg': 0, 'count': 0, 'total': 0}
+
+
+def aggregate_time_slots(model, user_id, time_slots, value_column=None, filters=()):
+    """
+    Min, max, average and count of a metric per chart time slot
+
+    Args:
+        model: Model with user_id, timestamp and value columns (e.g. HeartRate)
+        user_id: The user ID
+        time_slots: Slots from chart_utils.generate_time_slots
+        value_column: Column to aggregate, model.value by default
+        filters: Extra filter clauses, e.g. Activity.activity_type == 'steps'
+
+    Returns:
+        Dict keyed by slot label, each {'min', 'max', 'avg', 'count', 'total'},
+        as prepare_chart_data expects. Slots without readings are all zero.
+    """
+    data = {slot['label']: empty_slot_stats() for slot in time_slots}
+    if not time_slots:
+        return data
+
+    value = model.value if value_column is None else value_column
+    bucket = slot_bucket_expression(model.timestamp, time_slots).label('bucket')
+    rows = db.session.query(
+        bucket,
+        func.min(value),
+        func.max(value),
+        func.sum(value),
+        func.count(value)
+    ).filter(
+        model.user_id == user_id,
+        model.timestamp >= time_slots[0]['start'],
+        model.timestamp < time_slots[-1]['end'],
+        value.isnot(None),
+        *filters
+    ).group_by(bucket).all()
+
+    return _fill_slot_stats(data, time_slots, rows)
+
+
+def _fill_slot_stats(data, time_slots, rows):
+    """Merge (slot index, min, max, total, count) rows into per-label stats"""
+    for index, minimum, maximum, total, count in rows:
+        if index is None or not count:
+            continue
+        stats = data[time_slots[index]['label']]
+        # Slots sharing a label are merged, as the per-row loop did
+        if stats['count']:
+            minimum = min(stats['min'], minimum)
+            maximum = max(stats['max'], maximum)
+        stats['min'] = minimum
+        stats['max'] = maximum
+        stats['total'] += total
+        stats['count'] += count
+
+    for stats in data.values():
+        if stats['count'] > 0:
+            stats['avg'] = round(stats['total'] / stats['count'], 1)
+
+    return data
+
+
+def _bucket_bound(value, hourly):
+    """Round a slot boundary up to the rollup bucket (day or hour) that starts at or after it"""
+    if hourly:
+        floor = value.replace(minute=0, second=0, microsecond=0)
+        return floor if floor == value else floor + timedelta(hours=1)
+    floor = value.date()
+    return floor if value == datetime.combine(floor, time.min) else floor + timedelta(days=1)
+
+
+def aggregate_rollup_slots(rollup, user_id, time_slots, filters=()):
+    """
+    aggregate_time_slots over a rollup table instead of raw rows
+
+    Each rollup bucket is counted in the slot containing the bucket's start, so
+    slot boundaries should fall on whole days (whole hours for hourly rollups).
+    The range end is rounded up to the end of its day (or hour); chart ranges end
+    at the current time, so that adds no readings.
+
+    Args:
+        rollup: Rollup model with user_id, day or hour, min_value, max_value, total and count
+        user_id: The user ID
+        time_slots: Slots from chart_utils.generate_time_slots
+        filters: Extra filter clauses on the rollup table
+
+    Returns:
+        Dict keyed by slot label, each {'min', 'max', 'avg', 'count', 'total'}
+    """
+    data = {slot['label']: empty_slot_stats() for slot in time_slots}
+    if not time_slots:
+        return data
+
+    hourly = hasattr(rollup, 'hour')
+    column = rollup.hour if hourly else rollup.day
+    bucket = case(
+        *[(column < _bucket_bound(slot['end'], hourly), index) for index, slot in enumerate(time_slots)],
+        else_=None
+    ).label('bucket')
+    rows = db.session.query(
+        bucket,
+        func.min(rollup.min_value),
+        func.max(rollup.max_value),
+        func.sum(rollup.total),
+        func.sum(rollup.count)
+    ).filter(
+        rollup.user_id == user_id,
+        column >= _bucket_bound(time_slots[0]['start'], hourly),
+        column < _bucket_bound(time_slots[-1]['end'], hourly),
+        *filters
+    ).group_by(bucket).all()
+
+    return _fill_slot_stats(data, time_slots, rows)
@@ -0,0 +1,408 @@
+"""
+Chart data for every health metric and chart period, from one place
+
+The activities, sleep, weight and heart rate blueprints each serve the same
+five periods (daily, weekly, monthly, six_months, yearly). TimeSeriesQuery
+builds the time slots for a period, reads the metric from the cheapest source
+that can answer it and returns chart-ready data:
+
+- 'rollup': the daily/hourly rollup tables, when slot edges fall on whole days
+  (or hours) the rollup covers
+- 'sql': min/max/sum/count per slot with GROUP BY over the raw table
+- 'store': heart rate slices from the memory-mapped HeartRateStore
+- 'rows': the columns a metric needs, for rules that look at single records
+  (preferred devices, maximum device totals, implausible sleep lengths)
+
+Each metric lists its sources cheapest first and the first that applies wins.
+Results are cached for TIMESERIES_CACHE_TIMEOUT seconds under the user's data
+version (see cache_utils.user_cache_key), and every query is timed per metric
+and source in QUERY_TIMINGS.
+"""
+import logging
+import time
+from collections import namedtuple
+from datetime import datetime
+from flask import current_app
+from app import cache, db
+from app.models import Activity, Sleep, Weight
+from app.models.rollup import HeartRateDailyRollup, HeartRateHourlyRollup, WeightDailyRollup
+from app.services.heart_rate_store import HeartRateStore
+from app.services.time_bucket_service import aggregate_rollup_slots, aggregate_time_slots
+from app.utils.cache_utils import user_cache_key
+from app.utils.chart_utils import SlotIndex, aggregate_into_slots, generate_time_slots, get_time_range, prepare_chart_data
+
+logger = logging.getLogger(__name__)
+
+PERIODS = ('daily', 'weekly', 'monthly', 'six_months', 'yearly')
+PERIOD_NAMES = {
+    'daily': 'Daily',
+    'weekly': 'Weekly',
+    'monthly': 'Monthly',
+    'six_months': 'Six Months',
+    'yearly': 'Yearly'
+}
+# Periods whose slots span several days and show a per-day average
+DAILY_AVERAGE_PERIODS = ('six_months', 'yearly')
+# Show every nth label on crowded charts
+SPARSE_LABEL_INTERVALS = {'six_months': 3}
+
+# name: metric key; titles and datasets: per period; template: chart page;
+# sources: [(source name, function(query) -> slot data, or None if it cannot answer)]
+MetricSpec = namedtuple('MetricSpec', ['name', 'titles', 'template', 'datasets', 'sources'])
+
+
+def _dataset(metric, label, color):
+    return {
+        'metric': metric,
+        'label': label,
+        'backgroundColor': f'rgba({color}, 0.5)',
+        'borderColor': f'rgba({color}, 1)',
+        'borderWidth': 1
+    }
+
+
+def _aligned(time_slots, unit):
+    """Whether every slot edge but the last end (the current time) starts a whole day or hour"""
+    edges = [slot['start'] for slot in time_slots] + [slot['end'] for slot in time_slots[:-1]]
+    if unit == 'day':
+        return all(edge.hour == 0 and edge.minute == 0 and edge.second == 0 and edge.microsecond == 0
+                   for edge in edges)
+    return all(edge.minute == 0 and edge.second == 0 and edge.microsecond == 0 for edge in edges)
+
+
+# ----------------------------------------------------------------------------
+# Heart rate
+
+def _heart_rate_rollup(query):
+    if _aligned(query.time_slots, 'day'):
+        return aggregate_rollup_slots(HeartRateDailyRollup, query.user_id, query.time_slots)
+    if _aligned(query.time_slots, 'hour'):
+        return aggregate_rollup_slots(HeartRateHourlyRollup, query.user_id, query.time_slots)
+    return None
+
+
+def _heart_rate_store(query):
+    series = HeartRateStore().load(query.user_id).between(query.start_date, query.end_date)
+    data = aggregate_into_slots(series.datetimes(), series.values, query.time_slots,
+                                metrics=('min', 'max', 'avg', 'count'))
+    for stats in data.values():
+        stats['avg'] = round(stats['avg'], 1)
+    return data
+
+
+# ----------------------------------------------------------------------------
+# Weight
+
+def _weight_stats(slot_stats):
+    return {label: {'weight': stats['avg'], 'count': stats['count']} for label, stats in slot_stats.items()}
+
+
+def _weight_rollup(query):
+    if not _aligned(query.time_slots, 'day'):
+        return None
+    return _weight_stats(aggregate_rollup_slots(WeightDailyRollup, query.user_id, query.time_slots))
+
+
+def _weight_sql(query):
+    return _weight_stats(aggregate_time_slots(Weight, query.user_id, query.time_slots))
+
+
+# ----------------------------------------------------------------------------
+# Activity
+
+ACTIVITY_METRICS = ('steps', 'distance', 'calories')
+
+
+def _empty_activity():
+    return {'steps': 0, 'distance': 0, 'calories': 0, 'count': 0}
+
+
+def _add_activity(totals, record):
+    """Fold one activity record into a slot (or day)"""
+    # Device totals are running totals, so keep the largest
+    if record.total_steps is not None:
+        totals['steps'] = max(totals['steps'], record.total_steps)
+
+    if record.total_distance is not None:
+        totals['distance'] = max(totals['distance'], record.total_distance)
+
+    if record.calories is not None:
+        totals['calories'] = max(totals['calories'], record.calories)
+
+    # Otherwise process by activity_type
+    elif record.activity_type == 'steps':
+        totals['steps'] += record.value
+    elif record.activity_type == 'distance':
+        totals['distance'] += record.value
+    elif record.activity_type == 'calories':
+        totals['calories'] += record.value
+
+    totals['count'] += 1
+
+
+def _activity_rows(query):
+    records = db.session.query(
+        Activity.timestamp,
+        Activity.activity_type,
+        Activity.value,
+        Activity.total_steps,
+        Activity.total_distance,
+        Activity.calories
+    ).filter(
+        Activity.user_id == query.user_id,
+        Activity.timestamp >= query.start_date,
+        Activity.timestamp < query.end_date
+    ).order_by(Activity.timestamp).all()
+
+    data = {slot['label']: _empty_activity() for slot in query.time_slots}
+    if query.period not in DAILY_AVERAGE_PERIODS:
+        for record in records:
+            label = query.slot_index.label_for(record.timestamp)
+            if label is not None:
+                _add_activity(data[label], record)
+        return data
+
+    # Long periods show the average day: total each day, then average the days in a slot
+    daily_values = {}
+    for record in records:
+        _add_activity(daily_values.setdefault(record.timestamp.date(), _empty_activity()), record)
+
+    for stats in data.values():
+        stats['days'] = 0
+    for day, values in daily_values.items():
+        label = query.slot_index.label_for(datetime.combine(day, datetime.min.time()))
+        if label is None:
+            continue
+        for metric in ACTIVITY_METRICS:
+            data[label][metric] += values[metric]
+        data[label]['days'] += 1
+
+    for stats in data.values():
+        if stats['days'] > 0:
+            stats['steps'] = round(stats['steps'] / stats['days'])
+            stats['distance'] = round(stats['distance'] / stats['days'], 2)
+            stats['calories'] = round(stats['calories'] / stats['days'])
+    return data
+
+
+# ----------------------------------------------------------------------------
+# Sleep
+
+SLEEP_METRICS = ('total_duration', 'deep_sleep', 'light_sleep', 'rem_sleep', 'awake')
+SLEEP_COLUMNS = {
+    'total_duration': 'duration',
+    'deep_sleep': 'deep_sleep',
+    'light_sleep': 'light_sleep',
+    'rem_sleep': 'rem_sleep',
+    'awake': 'awake'
+}
+MAX_SLEEP_MINUTES = 720  # Longer records are treated as bad data
+
+
+def _sleep_rows(query):
+    records = db.session.query(
+        Sleep.timestamp,
+        Sleep.duration,
+        Sleep.deep_sleep,
+        Sleep.light_sleep,
+        Sleep.rem_sleep,
+        Sleep.awake,
+        Sleep.notes
+    ).filter(
+        Sleep.user_id == query.user_id,
+        Sleep.timestamp >= query.start_date,
+        Sleep.timestamp < query.end_date
+    ).order_by(Sleep.timestamp).all()
+
+    data = {slot['label']: dict({metric: 0 for metric in SLEEP_METRICS}, count=0) for slot in query.time_slots}
+    average = query.period in DAILY_AVERAGE_PERIODS
+    for record in records:
+        # Skip unreasonably long sleep records (over 12 hours)
+        if (record.duration or 0) > MAX_SLEEP_MINUTES:
+            continue
+        label = query.slot_index.label_for(record.timestamp)
+        if label is None:
+            continue
+        stats = data[label]
+
+        if average:
+            # Long periods average every night in the slot
+            for metric, column in SLEEP_COLUMNS.items():
+                stats[metric] += getattr(record, column) or 0
+            stats['count'] += 1
+        elif stats['count'] == 0 or (record.notes and 'Connect' in record.notes):
+            # One night per slot, preferring Connect devices
+            for metric, column in SLEEP_COLUMNS.items():
+                stats[metric] = getattr(record, column) or 0
+            stats['count'] = 1
+
+    # Minutes to hours
+    for stats in data.values():
+        if stats['count'] > 0:
+            nights = stats['count'] if average else 1
+            for metric in SLEEP_METRICS:
+                stats[metric] = round(stats[metric] / nights / 60, 1)
+    return data
+
+
+# ----------------------------------------------------------------------------
+# Metric registry
+
+_HEART_RATE_DATASETS = [
+    _dataset('min', 'Min Heart Rate', '54, 162, 235'),
+    _dataset('max', 'Max Heart Rate', '255, 99, 132'),
+    _dataset('avg', 'Average Heart Rate', '75, 192, 192')
+]
+
+
+def _activity_datasets(period):
+    prefix, suffix = ('Avg. ', '/Day') if period in DAILY_AVERAGE_PERIODS else ('', '')
+    return [
+        _dataset('steps', f'{prefix}Steps{suffix}', '54, 162, 235'),
+        _dataset('distance', f'{prefix}Distance (km){suffix}', '255, 99, 132'),
+        _dataset('calories', f'{prefix}Calories{suffix}', '75, 192, 192')
+    ]
+
+
+def _sleep_datasets(period):
+    prefix = 'Daily Avg ' if period in DAILY_AVERAGE_PERIODS else ''
+    return [
+        _dataset('total_duration', f'{prefix}Sleep (hours)' if prefix else 'Total Sleep (hours)', '75, 192, 192'),
+        _dataset('deep_sleep', f'{prefix}Deep Sleep (hours)', '54, 162, 235'),
+        _dataset('light_sleep', f'{prefix}Light Sleep (hours)', '255, 206, 86'),
+        _dataset('rem_sleep', f'{prefix}REM Sleep (hours)', '153, 102, 255'),
+        _dataset('awake', f'{prefix}Awake (hours)', '255, 99, 132')
+    ]
+
+
+METRICS = {
+    'heart_rate': MetricSpec(
+        name='heart_rate',
+        titles={period: f'{PERIOD_NAMES[period]} Heart Rate' for period in PERIODS},
+        template='charts/base.html',
+        datasets={period: _HEART_RATE_DATASETS for period in PERIODS},
+        sources=[('rollup', _heart_rate_rollup), ('store', _heart_rate_store)]
+    ),
+    'weight': MetricSpec(
+        name='weight',
+        titles={period: f'{PERIOD_NAMES[period]} Weight' for period in PERIODS},
+        template='charts/base.html',
+        datasets={period: [_dataset('weight', 'Weight (kg)', '54, 162, 235' if period == 'daily' else '75, 192, 192')]
+                  for period in PERIODS},
+        sources=[('rollup', _weight_rollup), ('sql', _weight_sql)]
+    ),
+    'activity': MetricSpec(
+        name='activity',
+        titles={period: f'{PERIOD_NAMES[period]} Activities' for period in PERIODS},
+        template='charts/activity.html',
+        datasets={period: _activity_datasets(period) for period in PERIODS},
+        sources=[('rows', _activity_rows)]
+    ),
+    'sleep': MetricSpec(
+        name='sleep',
+        titles={
+            period: f'{PERIOD_NAMES[period]} Sleep '
+                    f'({"Daily Average" if period in DAILY_AVERAGE_PERIODS else "Hours"})'
+            for period in PERIODS
+        },
+        template='charts/base.html',
+        datasets={period: _sleep_datasets(period) for period in PERIODS},
+        sources=[('rows', _sleep_rows)]
+    ),
+}
+
+
+class QueryTimings:
+    """Latency of TimeSeriesQuery per metric and source, for this process"""
+
+    def __init__(self):
+        self.entries = {}
+
+    def add(self, metric, source, seconds):
+        entry = self.entries.setdefault((metric, source), {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0})
+        entry['count'] += 1
+        entry['total_seconds'] += seconds
+        entry['max_seconds'] = max(entry['max_seconds'], seconds)
+
+    def reset(self):
+        self.entries.clear()
+
+    def report(self):
+        """{metric: {source: {'count', 'avg_ms', 'max_ms'}}}; source 'cache' counts cache hits"""
+        report = {}
+        for (metric, source), entry in sorted(self.entries.items()):
+            report.setdefault(metric, {})[source] = {
+                'count': entry['count'],
+                'avg_ms': round(entry['total_seconds'] / entry['count'] * 1000, 2),
+                'max_ms': round(entry['max_seconds'] * 1000, 2)
+            }
+        return report
+
+
+QUERY_TIMINGS = QueryTimings()
+
+
+class TimeSeriesQuery:
+    """
+    Chart data for one metric, user and period
+
+    Args:
+        metric: Key of METRICS ('heart_rate', 'weight', 'activity' or 'sleep')
+        user_id: The user ID
+        period: One of PERIODS
+        start_date, end_date: Range to chart, get_time_range(period) by default
+    """
+
+    def __init__(self, metric, user_id, period, start_date=None, end_date=None):
+        if metric not in METRICS:
+            raise ValueError(f'Unknown time series metric: {metric}')
+        if period not in PERIODS:
+            raise ValueError(f'Unknown chart period: {period}')
+        self.spec = METRICS[metric]
+        self.user_id = user_id
+        self.period = period
+        if start_date is None or end_date is None:
+            start_date, end_date = get_time_range(period)
+        self.start_date = start_date
+        self.end_date = end_date
+        self.time_slots = generate_time_slots(period, start_date, end_date)
+        self.slot_index = SlotIndex(self.time_slots)
+
+    @property
+    def title(self):
+        return self.spec.titles[self.period]
+
+    @property
+    def labels(self):
+        return [slot['label'] for slot in self.time_slots]
+
+    def slot_data(self):
+        """(source name, {slot label: metrics}) from the first source that can answer"""
+        for source, fetch in self.spec.sources:
+            data = fetch(self)
+            if data is not None:
+                return source, data
+        raise ValueError(f'No source can answer {self.spec.name} for {self.period}')
+
+    def cache_key(self):
+        start = self.time_slots[0]['start'] if self.time_slots else self.start_date
+        return user_cache_key(self.user_id, 'timeseries', self.spec.name, self.period, f'{start:%Y%m%d%H}')
+
+    def chart_data(self):
+        """Chart.js data (labels and datasets), cached and timed per metric and source"""
+        started = time.perf_counter()
+        key = self.cache_key()
+        chart_data = cache.get(key)
+        source = 'cache'
+        if chart_data is None:
+            source, data = self.slot_data()
+            interval = SPARSE_LABEL_INTERVALS.get(self.period)
+            chart_data = prepare_chart_data(data, self.labels, self.spec.datasets[self.period],
+                                            sparse_labels=interval is not None, label_interval=interval or 2)
+            cache.set(key, chart_data, timeout=current_app.config.get('TIMESERIES_CACHE_TIMEOUT', 60))
+
+        elapsed = time.perf_counter() - started
+        QUERY_TIMINGS.add(self.spec.name, source, elapsed)
+        logger.info(f"TimeSeriesQuery {self.spec.name}/{self.period} for user {self.user_id}: "
+                    f"{source} in {elapsed * 1000:.1f} ms")
+        return chart_data
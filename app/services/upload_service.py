@@ -1,5 +1,7 @@
 from werkzeug.utils import secure_filename
 import os
+import shutil
+import uuid
 from datetime import datetime
 import logging
 from app import db
@@ -9,7 +11,10 @@ from app.services.parsers.google_fit_parser import GoogleFitParser
 from app.services.parsers.fitbit_parser import FitbitParser
 from app.services.parsers.samsung_health_parser import SamsungHealthParser
 from app.services.parsers.custom_parser import CustomParser
+from app.services.cache_warming import warm_in_background
 from app.services.data_import import DataImportService
+from app.services.heart_rate_store import HeartRateStore
+from app.utils.cache_utils import bump_data_version
 from app.utils.error_handlers import FileValidationError, DataImportError
 from flask import current_app
 
@@ -49,7 +54,54 @@ class UploadService:
             except Exception as e:
                 self.logger.error(f"Error saving file: {str(e)}")
                 raise FileValidationError(f"Error saving file: {str(e)}")
-            
+
+        except Exception as e:
+            self.logger.error(f"Error processing file: {str(e)}", exc_info=True)
+            self._mark_failed(str(e))
+            raise DataImportError(f'Error processing file: {str(e)}')
+
+        import_log = self.process_saved_file(file_path, data_source)
+        if current_app.config.get('CACHE_WARM_AFTER_IMPORT'):
+            warm_in_background(import_log.id)
+        return import_log
+
+    def enqueue_file(self, file, data_source):
+        """Save the uploaded file and queue it for a background import worker"""
+        try:
+            os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
+            file_path = self.upload_file(file, unique=True)
+
+            self.import_log = ImportLog(
+                user_id=self.user_id,
+                data_source=data_source,
+                file_name=file.filename,
+                file_path=file_path,
+                progress=0,
+                status='queued'
+            )
+            db.session.add(self.import_log)
+            db.session.commit()
+            self.logger.info(f"Queued import log {self.import_log.id} for {file_path}")
+            return self.import_log
+        except FileValidationError:
+            raise
+        except Exception as e:
+            self.logger.error(f"Error queueing file: {str(e)}", exc_info=True)
+            db.session.rollback()
+            raise DataImportError(f'Error queueing file: {str(e)}')
+
+    def process_saved_file(self, file_path, data_source, parser_timeout=False):
+        """
+        Parse and import a file already saved to the upload folder
+
+        Args:
+            file_path (str): Path of the saved upload
+            data_source (str): Data source key used to pick the parser
+            parser_timeout: Seconds the parser may run, None for no limit,
+                            False to keep the parser's own default
+        """
+        output_dir = os.path.dirname(file_path)
+        try:
             # Get appropriate parser based on data source
             try:
                 parser = self.get_parser(data_source, file_path)
@@ -57,61 +109,22 @@ class UploadService:
             except Exception as e:
                 self.logger.error(f"Error creating parser: {str(e)}")
                 raise DataImportError(f"Error creating parser: {str(e)}")
+
+            if parser_timeout is not False and hasattr(parser, 'timeout_handler'):
+                parser.timeout_handler.timeout = parser_timeout
+            if hasattr(parser, 'progress_callback'):
+                parser.progress_callback = self._update_progress
+            if hasattr(parser, 'workers'):
+                parser.workers = max(current_app.config.get('IMPORT_PARSER_WORKERS', 1), 1)
+            if hasattr(parser, 'watermarks') and current_app.config.get('IMPORT_INCREMENTAL', True):
+                parser.watermarks = DataImportService(self.user_id).import_watermarks(data_source)
+                self.logger.info(f"Incremental import from watermarks: {parser.watermarks}")
             
-            # Parse data using the selected parser
-            try:
-                output_dir = os.path.dirname(file_path)
-                self.logger.info(f"Parsing data to directory: {output_dir}")
-                parse_result = parser.parse_all(output_dir)
-                self.logger.info("Data parsing completed")
-                
-                # Handle different parser return structures
-                if isinstance(parse_result, dict):
-                    parsed_output_dir = parse_result.get('output_dir', output_dir)
-                    
-                    # Check if we have partial results
-                    if parse_result.get('partial_results', False):
-                        self.logger.warning(f"Parser returned partial results: {parse_result.get('error', 'Unknown reason')}")
-                        self.import_log.status = 'partial'
-                        self.import_log.error_message = f"Partial import: {parse_result.get('error', 'Processing timed out')}"
-                        db.session.commit()
-                else:
-                    # Original format from other parsers
-                    parsed_output_dir = output_dir
-            except Exception as e:
-                self.logger.error(f"Error parsing data: {str(e)}")
-                raise DataImportError(f"Error parsing data: {str(e)}")
-            
-            # Import data using DataImportService
-            try:
-                import_service = DataImportService(self.user_id, self.import_log)
-                import_result = import_service.process_file(file, data_source, parsed_output_dir)
-                self.logger.info("Data import completed")
-                
-                if import_result:
-                    # Consider it a success even if partially successful
-                    if self.import_log.status != 'partial':
-                        self.import_log.status = 'success'
-                else:
-                    self.import_log.status = 'failed'
-                    self.import_log.error_message = "Failed to import data, no records processed"
-                
-                self.import_log.completed_at = datetime.utcnow()
-                db.session.commit()
-            except DataImportError as e:
-                self.logger.error(f"Error importing data: {str(e)}")
-                # Check if the error is just about empty files
-                if "No columns to parse from file" in str(e) or "Empty CSV file" in str(e):
-                    self.import_log.status = 'partial'
-                    self.import_log.error_message = "Some data types had no records to import"
-                    self.import_log.completed_at = datetime.utcnow()
-                    db.session.commit()
-                    self.logger.warning("Completed with partial results - some data types had no records")
-                else:
-                    raise DataImportError(f"Error importing data: {str(e)}")
-            except Exception as e:
-                self.logger.error(f"Error importing data: {str(e)}")
-                raise DataImportError(f"Error importing data: {str(e)}")
+            import_mode = current_app.config.get('IMPORT_MODE', 'stream')
+            if import_mode == 'stream' and hasattr(parser, 'iter_rows'):
+                parse_result = self._import_stream(parser)
+            else:
+                parse_result = self._import_csv(parser, None, data_source, output_dir)
 
             # Log summary
             if isinstance(parse_result, dict) and 'processing_time' in parse_result:
@@ -121,46 +134,171 @@ class UploadService:
             else:
                 self.logger.info("File processing completed successfully")
 
+            self._refresh_heart_rate_store()
+            # Imported rows are written without ORM events, so move the user's caches on here
+            bump_data_version(self.user_id)
+
+            if self.import_log.is_finished:
+                self.import_log.progress = 100
+                db.session.commit()
+
             # Clean up temporary files directory
-            try:
-                temp_dir = os.path.join(output_dir, 'temp')
-                if os.path.exists(temp_dir) and os.path.isdir(temp_dir):
-                    import shutil
-                    shutil.rmtree(temp_dir)
-                    self.logger.info(f"Removed temporary directory: {temp_dir}")
-            except Exception as e:
-                self.logger.warning(f"Failed to remove temporary directory: {str(e)}")
+            self._remove_temp_dir(output_dir)
 
             return self.import_log
 
         except Exception as e:
             self.logger.error(f"Error processing file: {str(e)}", exc_info=True)
-            if self.import_log:
-                self.import_log.status = 'failed'
-                self.import_log.error_message = str(e)
-                self.import_log.completed_at = datetime.utcnow()
-                db.session.commit()
+            self._mark_failed(str(e))
             
             # Try to clean up temporary files even in error cases
-            try:
-                output_dir = os.path.dirname(file_path) if 'file_path' in locals() else None
-                if output_dir:
-                    temp_dir = os.path.join(output_dir, 'temp')
-                    if os.path.exists(temp_dir) and os.path.isdir(temp_dir):
-                        import shutil
-                        shutil.rmtree(temp_dir)
-                        self.logger.info(f"Removed temporary directory after error: {temp_dir}")
-            except Exception as cleanup_error:
-                self.logger.warning(f"Failed to remove temporary directory after error: {str(cleanup_error)}")
+            self._remove_temp_dir(output_dir)
                 
             raise DataImportError(f'Error processing file: {str(e)}')
 
+    def _update_progress(self, progress):
+        """Parser progress callback: persist the percentage on the import log"""
+        if self.import_log is not None and progress != self.import_log.progress:
+            self.import_log.progress = min(progress, 99)
+            self.import_log.heartbeat_at = datetime.utcnow()
+            db.session.commit()
+
+    def _refresh_heart_rate_store(self):
+        """Add the imported readings to the user's memory-mapped heart rate arrays"""
+        store = HeartRateStore()
+        try:
+            store.refresh(self.user_id)
+        except Exception as e:
+            # The arrays are only a cache of the table; drop them and let the next read rebuild
+            self.logger.warning(f"Failed to refresh heart rate store: {str(e)}")
+            store.invalidate(self.user_id)
+
+    def _mark_failed(self, message):
+        if self.import_log:
+            db.session.rollback()
+            self.import_log.status = 'failed'
+            self.import_log.error_message = message
+            self.import_log.completed_at = datetime.utcnow()
+            db.session.commit()
+            # Batches committed before the failure are already visible
+            bump_data_version(self.user_id)
+
+    def _remove_temp_dir(self, output_dir):
+        try:
+            temp_dir = os.path.join(output_dir, 'temp')
+            if os.path.exists(temp_dir) and os.path.isdir(temp_dir):
+                shutil.rmtree(temp_dir)
+                self.logger.info(f"Removed temporary directory: {temp_dir}")
+        except Exception as e:
+            self.logger.warning(f"Failed to remove temporary directory: {str(e)}")
+
+    def _import_stream(self, parser):
+        """Stream parsed rows straight into the database (no intermediate CSV files)"""
+        self.logger.info("Streaming parsed records directly into the database")
+        try:
+            import_service = DataImportService(self.user_id, self.import_log)
+            result = import_service.import_stream(parser)
+        except (FileValidationError, DataImportError):
+            raise
+        except Exception as e:
+            self.logger.error(f"Error streaming data: {str(e)}")
+            raise DataImportError(f"Error streaming data: {str(e)}")
+        finally:
+            if hasattr(parser, 'cleanup'):
+                parser.cleanup()
+
+        if result.get('partial_results'):
+            self.logger.warning(f"Streaming import returned partial results: {result.get('error')}")
+            self.import_log.status = 'partial'
+            self.import_log.error_message = f"Partial import: {result.get('error') or 'Processing timed out'}"
+        elif self.import_log.records_processed or self.import_log.duplicates_skipped:
+            # A re-upload that only contains rows we already have is still a successful import
+            self.import_log.status = 'success'
+        else:
+            self.import_log.status = 'failed'
+            self.import_log.error_message = "Failed to import data, no records processed"
+        self.import_log.completed_at = datetime.utcnow()
+        db.session.commit()
+
+        throughput = result.get('throughput')
+        if throughput:
+            self.logger.info(f"Parser throughput: {throughput['records_per_second']} records/s "
+                             f"over {throughput['elapsed_seconds']}s")
+            result['processing_time'] = int(throughput['elapsed_seconds'])
+        return result
+
+    def _import_csv(self, parser, file, data_source, output_dir):
+        """Parse to intermediate CSV files and import them with DataImportService"""
+        # Parse data using the selected parser
+        try:
+            self.logger.info(f"Parsing data to directory: {output_dir}")
+            parse_result = parser.parse_all(output_dir)
+            self.logger.info("Data parsing completed")
+            
+            # Handle different parser return structures
+            if isinstance(parse_result, dict):
+                parsed_output_dir = parse_result.get('output_dir', output_dir)
+                
+                # Check if we have partial results
+                if parse_result.get('partial_results', False):
+                    self.logger.warning(f"Parser returned partial results: {parse_result.get('error', 'Unknown reason')}")
+                    self.import_log.status = 'partial'
+                    self.import_log.error_message = f"Partial import: {parse_result.get('error', 'Processing timed out')}"
+                    db.session.commit()
+            else:
+                # Original format from other parsers
+                parsed_output_dir = output_dir
+        except Exception as e:
+            self.logger.error(f"Error parsing data: {str(e)}")
+            raise DataImportError(f"Error parsing data: {str(e)}")
+        
+        # Import data using DataImportService
+        try:
+            import_service = DataImportService(self.user_id, self.import_log)
+            import_result = import_service.process_file(file, data_source, parsed_output_dir)
+            self.logger.info("Data import completed")
+            
+            if import_result:
+                # Consider it a success even if partially successful
+                if self.import_log.status != 'partial':
+                    self.import_log.status = 'success'
+            else:
+                self.import_log.status = 'failed'
+                self.import_log.error_message = "Failed to import data, no records processed"
+            
+            self.import_log.completed_at = datetime.utcnow()
+            db.session.commit()
+        except DataImportError as e:
+            self.logger.error(f"Error importing data: {str(e)}")
+            # Check if the error is just about empty files
+            if "No columns to parse from file" in str(e) or "Empty CSV file" in str(e):
+                self.import_log.status = 'partial'
+                self.import_log.error_message = "Some data types had no records to import"
+                self.import_log.completed_at = datetime.utcnow()
+                db.session.commit()
+                self.logger.warning("Completed with partial results - some data types had no records")
+            else:
+                raise DataImportError(f"Error importing data: {str(e)}")
+        except Exception as e:
+            self.logger.error(f"Error importing data: {str(e)}")
+            raise DataImportError(f"Error importing data: {str(e)}")
+
+        return parse_result
+
     @staticmethod
-    def upload_file(file):
-        """Save uploaded file to upload directory"""
+    def upload_file(file, unique=False):
+        """
+        Save uploaded file to upload directory
+
+        With unique=True the file goes into its own sub-directory so queued jobs
+        never share (or clean up) each other's files and temp directories.
+        """
         try:
             filename = secure_filename(file.filename)
-            file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+            upload_dir = current_app.config['UPLOAD_FOLDER']
+            if unique:
+                upload_dir = os.path.join(upload_dir, uuid.uuid4().hex)
+            file_path = os.path.join(upload_dir, filename)
             
             # Ensure the directory exists
             os.makedirs(os.path.dirname(file_path), exist_ok=True)
@@ -1 +1,22 @@
-# Authentication unit tests for the health tracking application 
\ No newline at end of file
+# Authentication unit tests for the health tracking application
+from contextlib import contextmanager
+from sqlalchemy import event
+
+
+@contextmanager
+def count_statements():
+    """
+    Collect the SQL of every statement sent to the database inside the block
+
+    Yields:
+        list: The statements, filled in as they run
+    """
+    from app import db
+
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
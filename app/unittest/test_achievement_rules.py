@@ -0,0 +1,139 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy.dialects import postgresql
+from app import create_app, db, cache
+from app.init.achievements import init_achievements
+from app.models import Activity, Sleep, Weight
+from app.models.achievement import Achievement, UserAchievement
+from app.models.goal import Goal
+from app.models.user import User
+from app.services.achievement_rules import RULES, AchievementRuleQuery, Rule
+from app.services.achievement_service import check_achievements_for_user
+from app.services.achievement_stats import get_stats
+from app.services.streak_service import get_streaks
+from app.unittest import count_statements
+
+TODAY = datetime.utcnow().date()
+NOON = datetime.combine(TODAY, datetime.min.time()) + timedelta(hours=12)
+
+
+@pytest.fixture
+def app():
+    """Create and configure Flask application for testing"""
+    app = create_app(config_name='testing')
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+
+    with app.app_context():
+        db.create_all()
+        cache.clear()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def test_user(app):
+    """Create test user and return its ID"""
+    user = User(username='ruleuser', email='rules@example.com')
+    user.set_password('TestPassword123')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def add_steps(user_id, days_ago, value):
+    db.session.add(Activity(user_id=user_id, activity_type='steps', value=value, total_steps=value,
+                            timestamp=NOON - timedelta(days=days_ago)))
+
+
+def achievement(name, category, condition_type, condition_value):
+    return Achievement(name=name, description='', category=category, icon='star', level='bronze',
+                       condition_type=condition_type, condition_value=condition_value)
+
+
+def selects(statements):
+    return [statement for statement in statements if statement.lstrip().upper().startswith('SELECT')]
+
+
+def test_all_rules_are_one_select(app, test_user):
+    """Every predefined achievement is evaluated by a single SELECT, however many there are"""
+    init_achievements()
+    for days_ago in range(3):
+        add_steps(test_user, days_ago, 12000)
+    db.session.add_all([
+        Weight(user_id=test_user, value=80, unit='kg', timestamp=NOON - timedelta(days=1)),
+        Sleep(user_id=test_user, duration=420, start_time=NOON, end_time=NOON + timedelta(hours=7), timestamp=NOON),
+    ] + [Goal(user_id=test_user, category=category, target_value=1, unit='', timeframe='daily')
+         for category in ('steps', 'weight', 'sleep', 'heart_rate')])
+    db.session.commit()
+    get_stats(test_user)
+    get_streaks(test_user)
+
+    with count_statements() as statements:
+        earned = check_achievements_for_user(test_user)
+    assert len(selects(statements)) == 1
+    assert sorted(a.name for a in earned) == [
+        'Daily Walker', 'Data Enthusiast', 'First Steps', 'Goal Master', 'Goal Setter', 'Power Walker',
+        'Sleep Tracker', 'Weight Tracker',
+    ]
+
+    db.session.add_all([achievement(f'Walker {n}', 'steps', 'milestone', 1000 * n) for n in range(1, 20)])
+    db.session.commit()
+    with count_statements() as statements:
+        earned = check_achievements_for_user(test_user)
+    assert len(selects(statements)) == 1
+    assert len(earned) == 12
+    with count_statements() as statements:
+        check_achievements_for_user(test_user)
+    assert len(selects(statements)) == 1
+
+
+def test_first_check_builds_stats(app, test_user):
+    db.session.add(achievement('Walker', 'steps', 'milestone', 5000))
+    add_steps(test_user, 0, 6000)
+    db.session.commit()
+    assert AchievementRuleQuery(test_user).fetch() is None
+    assert [a.name for a in check_achievements_for_user(test_user)] == ['Walker']
+    assert AchievementRuleQuery(test_user).fetch() == []
+    assert check_achievements_for_user(test_user + 1) == []
+
+
+def test_windowed_rules(app, test_user):
+    """Rules with a window aggregate the rollups of the last N days only"""
+    db.session.add_all([
+        achievement('Busy week', 'steps', 'weekly', 20000),
+        achievement('Regular', 'steps', 'active_days', 3),
+        achievement('Long night', 'sleep', 'longest', 500),
+    ])
+    for days_ago, value in ((0, 6000), (1, 7000), (2, 8000), (10, 50000)):
+        add_steps(test_user, days_ago, value)
+    db.session.add(Sleep(user_id=test_user, duration=480, start_time=NOON, end_time=NOON + timedelta(hours=8),
+                         timestamp=NOON))
+    db.session.commit()
+    get_stats(test_user)
+    get_streaks(test_user)
+
+    rules = {
+        ('steps', 'weekly'): Rule('steps', 'sum', window=7),
+        ('steps', 'active_days'): Rule('steps', 'days', window=3),
+        ('sleep', 'longest'): Rule('sleep_minutes', 'max'),
+    }
+    assert [a.name for a in AchievementRuleQuery(test_user, rules).fetch()] == ['Busy week', 'Regular']
+    assert [a.name for a in AchievementRuleQuery(test_user, rules, today=TODAY - timedelta(days=1)).fetch()] == []
+    assert [a.name for a in AchievementRuleQuery(test_user, rules, today=TODAY + timedelta(days=5)).fetch()] == []
+
+
+def test_rules_sharing_an_aggregate_share_a_column(app, test_user):
+    statement = AchievementRuleQuery(test_user, {
+        ('steps', 'milestone'): Rule('steps', 'max'),
+        ('steps', 'record'): Rule('steps', 'max', threshold=30000),
+    }).statement()
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+    assert sql.count('max_daily_steps') == 1
+    assert 'LEFT OUTER JOIN' in sql
+
+    str(AchievementRuleQuery(test_user, RULES).statement().compile(dialect=postgresql.dialect()))
+    with pytest.raises(ValueError):
+        AchievementRuleQuery(test_user, {('steps', 'streak'): Rule('steps', 'streak', window=30)}).statement()
+    assert UserAchievement.query.count() == 0
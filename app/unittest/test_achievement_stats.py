@@ -0,0 +1,162 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import insert
+from app import create_app, db, cache
+from app.models import Activity, HeartRate, Sleep, Weight
+from app.models.achievement import Achievement, AchievementStats, UserAchievement
+from app.models.user import User
+from app.services.achievement_service import check_achievements_for_user
+from app.services.achievement_stats import build_stats, get_stats
+from app.services.rollup_service import rebuild_rollups, refresh_rollups_for_rows
+from app.unittest import count_statements
+
+DAY = datetime.now().replace(hour=9, minute=0, second=0, microsecond=0) - timedelta(days=40)
+STATS_COLUMNS = [column.name for column in AchievementStats.__table__.columns if column.name not in ('id', 'updated_at')]
+
+
+@pytest.fixture
+def app():
+    """Create and configure Flask application for testing"""
+    app = create_app(config_name='testing')
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+
+    with app.app_context():
+        db.create_all()
+        cache.clear()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def test_user(app):
+    """Create test user and return its ID"""
+    user = User(username='statsuser', email='stats@example.com')
+    user.set_password('TestPassword123')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def steps(user_id, day, value):
+    return Activity(user_id=user_id, activity_type='steps', value=value, total_steps=value,
+                    timestamp=DAY + timedelta(days=day))
+
+
+def stored(user_id):
+    stats = get_stats(user_id)
+    return {name: getattr(stats, name) for name in STATS_COLUMNS}
+
+
+def rebuilt(user_id):
+    values = build_stats(db.session.connection(), user_id)
+    return {name: values[name] for name in STATS_COLUMNS}
+
+
+def test_incremental_updates_match_a_full_build(app, test_user):
+    """Adding, changing and deleting records keeps the row equal to one built from scratch"""
+    db.session.add_all([steps(test_user, day, 6000) for day in (0, 1, 2, 4)])
+    db.session.add(Weight(user_id=test_user, value=80, unit='kg', timestamp=DAY))
+    db.session.commit()
+    assert stored(test_user) == rebuilt(test_user)
+    assert stored(test_user)['max_daily_steps'] == 6000
+
+    # A new best day, and weights/heart rates before and after move first and latest
+    db.session.add_all([
+        steps(test_user, 3, 9000),
+        Weight(user_id=test_user, value=78, unit='kg', timestamp=DAY + timedelta(days=5)),
+        Weight(user_id=test_user, value=82, unit='kg', timestamp=DAY - timedelta(days=1)),
+        HeartRate(user_id=test_user, value=70, unit='bpm', timestamp=DAY),
+        HeartRate(user_id=test_user, value=60, unit='bpm', timestamp=DAY + timedelta(days=1)),
+        Sleep(user_id=test_user, duration=420, start_time=DAY, end_time=DAY + timedelta(hours=7), timestamp=DAY),
+    ])
+    db.session.commit()
+    stats = stored(test_user)
+    assert stats == rebuilt(test_user)
+    assert (stats['max_daily_steps'], stats['activity_count']) == (9000, 5)
+    assert (stats['first_weight'], stats['latest_weight'], stats['weight_count']) == (82, 78, 3)
+    assert (stats['heart_rate_total'], stats['latest_heart_rate'], stats['heart_rate_count']) == (130, 60, 2)
+
+    # Deleting the best day lowers it
+    db.session.delete(Activity.query.filter_by(user_id=test_user, value=9000).one())
+    db.session.commit()
+    stats = stored(test_user)
+    assert stats == rebuilt(test_user)
+    assert (stats['max_daily_steps'], stats['activity_count']) == (6000, 4)
+
+
+def test_import_batches_update_stats(app, test_user):
+    """Rows written by Core inserts are applied from the rollup refresh after each batch"""
+    get_stats(test_user)
+    for first in (0, 10, 5):
+        rows = [{'user_id': test_user, 'activity_type': 'steps', 'value': 5000 + day, 'unit': 'count',
+                 'data_source': '', 'timestamp': DAY + timedelta(days=day)} for day in range(first, first + 5)]
+        db.session.execute(insert(Activity), rows)
+        refresh_rollups_for_rows(Activity, rows)
+        db.session.commit()
+
+        stats = stored(test_user)
+        assert stats == rebuilt(test_user)
+    assert (stats['max_daily_steps'], stats['activity_count']) == (5014, 15)
+
+
+def test_rebuilding_rollups_resets_stats(app, test_user):
+    db.session.add(steps(test_user, 0, 6000))
+    db.session.commit()
+    get_stats(test_user)
+    rebuild_rollups(test_user)
+    assert AchievementStats.query.filter_by(user_id=test_user).count() == 0
+    assert stored(test_user)['max_daily_steps'] == 6000
+
+
+def test_checking_reads_stats_not_records(app, test_user):
+    """Rules are evaluated against the stats row, with the same statements however much data there is"""
+    db.session.add_all([
+        Achievement(name='Walker', description='', category='steps', icon='walking', level='bronze',
+                    condition_type='milestone', condition_value=7000),
+        Achievement(name='Steady', description='', category='steps', icon='walking', level='silver',
+                    condition_type='streak', condition_value=3),
+        Achievement(name='Weigh-in', description='', category='weight', icon='weight', level='bronze',
+                    condition_type='improvement', condition_value=2),
+        Achievement(name='Calmer', description='', category='heart_rate', icon='heart', level='bronze',
+                    condition_type='improvement', condition_value=5),
+        Achievement(name='Collector', description='', category='general', icon='star', level='bronze',
+                    condition_type='milestone', condition_value=8),
+    ])
+    # Three days over 5000 steps, but not consecutive calendar days
+    db.session.add_all([steps(test_user, day, 8000) for day in (0, 1, 3)])
+    db.session.add_all([
+        Weight(user_id=test_user, value=80, unit='kg', timestamp=DAY),
+        Weight(user_id=test_user, value=77, unit='kg', timestamp=DAY + timedelta(days=1)),
+        HeartRate(user_id=test_user, value=80, unit='bpm', timestamp=DAY),
+        HeartRate(user_id=test_user, value=70, unit='bpm', timestamp=DAY + timedelta(hours=1)),
+        HeartRate(user_id=test_user, value=69, unit='bpm', timestamp=DAY + timedelta(hours=2)),
+    ])
+    db.session.commit()
+    get_stats(test_user)
+
+    with count_statements() as statements:
+        earned = check_achievements_for_user(test_user)
+    assert sorted(achievement.name for achievement in earned) == ['Calmer', 'Collector', 'Walker', 'Weigh-in']
+    assert not any('FROM activities' in statement or 'FROM weights' in statement for statement in statements)
+
+    # The missing day completes the streak
+    db.session.add(steps(test_user, 2, 5000))
+    db.session.commit()
+    assert [achievement.name for achievement in check_achievements_for_user(test_user)] == ['Steady']
+    assert UserAchievement.query.filter_by(user_id=test_user).count() == 5
+
+
+def test_counts_are_incremented_in_sql(app, test_user):
+    """Deltas are added by the UPDATE itself instead of writing back a value read earlier"""
+    get_stats(test_user)
+    with count_statements() as statements:
+        db.session.add_all([steps(test_user, 0, 6000),
+                            HeartRate(user_id=test_user, value=70, unit='bpm', timestamp=DAY)])
+        db.session.commit()
+    updates = [sql.lower() for sql in statements if sql.lstrip().upper().startswith('UPDATE ACHIEVEMENT_STATS')]
+    assert any('activity_count=(coalesce(achievement_stats.activity_count' in sql.replace(' ', '') for sql in updates)
+    assert any('heart_rate_total=(coalesce(achievement_stats.heart_rate_total' in sql.replace(' ', '')
+               for sql in updates)
+    assert stored(test_user) == rebuilt(test_user)
@@ -0,0 +1,421 @@
+import csv
+from datetime import datetime
+import os
+import pytest
+from app import create_app, db
+from app.models import ImportLog, Weight, HeartRate, Activity, Sleep
+from app.models.user import User
+from app.services.data_import import DataImportService
+from app.services.parsers.apple_health_parser import AppleHealthParser
+
+SAMPLE_EXPORT = """<?xml version="1.0" encoding="UTF-8"?>
+<HealthData locale="en_US">
+ <ExportDate value="2024-05-01 10:00:00 +0800"/>
+ <Me HKCharacteristicTypeIdentifierBiologicalSex="HKBiologicalSexNotSet"/>
+ <Record type="HKQuantityTypeIdentifierStepCount" sourceName="iPhone" unit="count" startDate="2024-05-01 08:00:00 +0800" endDate="2024-05-01 08:10:00 +0800" value="420"/>
+ <Record type="HKQuantityTypeIdentifierHeartRate" sourceName="Watch" unit="count/min" startDate="2024-05-01 08:01:00 +0800" endDate="2024-05-01 08:01:00 +0800" value="72">
+  <MetadataEntry key="HKMetadataKeyHeartRateMotionContext" value="0"/>
+ </Record>
+ <Record type="HKQuantityTypeIdentifierDistanceWalkingRunning" sourceName="iPhone" unit="km" startDate="2024-05-01 08:00:00 +0800" endDate="2024-05-01 08:10:00 +0800" value="0.31"/>
+ <Record type="HKQuantityTypeIdentifierActiveEnergyBurned" sourceName="Watch" unit="kcal" startDate="2024-05-01 08:00:00 +0800" endDate="2024-05-01 08:10:00 +0800" value="18.5"/>
+ <Record type="HKCategoryTypeIdentifierSleepAnalysis" sourceName="Watch" startDate="2024-04-30 23:00:00 +0800" endDate="2024-05-01 01:00:00 +0800" value="HKCategoryValueSleepAnalysisAsleepDeep"/>
+ <Record type="HKQuantityTypeIdentifierBodyMass" sourceName="Scale" unit="kg" startDate="2024-05-01 07:00:00 +0800" endDate="2024-05-01 07:00:00 +0800" value="70.2"/>
+ <Record type="HKQuantityTypeIdentifierBodyMass" sourceName="Scale" unit="kg" startDate="2024-05-01 07:05:00 +0800" endDate="2024-05-01 07:05:00 +0800" value="not-a-number"/>
+ <Record type="HKQuantityTypeIdentifierFlightsClimbed" sourceName="iPhone" unit="count" startDate="2024-05-01 08:00:00 +0800" endDate="2024-05-01 08:10:00 +0800" value="2"/>
+ <Workout workoutActivityType="HKWorkoutActivityTypeRunning" duration="30" totalDistance="5.2" totalEnergyBurned="310" sourceName="Watch" startDate="2024-05-01 18:00:00 +0800" endDate="2024-05-01 18:30:00 +0800">
+  <WorkoutEvent type="HKWorkoutEventTypePause" date="2024-05-01 18:10:00 +0800"/>
+ </Workout>
+</HealthData>
+"""
+
+CSV_FILES = ['activity.csv', 'heart_rate.csv', 'sleep.csv', 'weight.csv']
+
+
+@pytest.fixture
+def app():
+    """Create and configure Flask application for testing"""
+    app = create_app(config_name='testing')
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def test_user(app):
+    """Create test user and return its ID"""
+    user = User(username='parseruser', email='parser@example.com')
+    user.set_password('TestPassword123')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+@pytest.fixture
+def export_file(tmp_path):
+    """Write a small Apple Health export.xml to a temp dir"""
+    path = tmp_path / 'export.xml'
+    path.write_text(SAMPLE_EXPORT)
+    return str(path)
+
+
+def read_rows(path):
+    with open(path, newline='') as f:
+        return sorted(tuple(sorted(row.items())) for row in csv.DictReader(f))
+
+
+def run_parser(export_file, output_dir, single_pass):
+    os.makedirs(output_dir)
+    parser = AppleHealthParser(export_file, single_pass=single_pass)
+    return parser, parser.parse_all(output_dir)
+
+
+def test_single_pass_matches_multi_pass(export_file, tmp_path):
+    """Single-pass dispatcher produces the same CSV rows as the per-type passes"""
+    _, single = run_parser(export_file, str(tmp_path / 'single'), True)
+    _, multi = run_parser(export_file, str(tmp_path / 'multi'), False)
+
+    assert sorted(single['files_generated']) == sorted(CSV_FILES)
+    assert sorted(multi['files_generated']) == sorted(CSV_FILES)
+    assert single['partial_results'] is False
+
+    for name in CSV_FILES:
+        assert read_rows(os.path.join(single['output_dir'], name)) == \
+            read_rows(os.path.join(multi['output_dir'], name)), name
+
+
+def test_single_pass_reports_throughput(export_file, tmp_path):
+    """Single-pass mode reports per record type counts and skipped rows"""
+    parser, result = run_parser(export_file, str(tmp_path / 'out'), True)
+    throughput = result['throughput']
+
+    record_types = throughput['record_types']
+    assert record_types['HKQuantityTypeIdentifierStepCount']['count'] == 1
+    assert record_types['HKQuantityTypeIdentifierHeartRate']['count'] == 1
+    assert record_types['HKQuantityTypeIdentifierBodyMass']['count'] == 1
+    assert record_types['Workout']['count'] == 1
+    assert 'HKQuantityTypeIdentifierFlightsClimbed' not in record_types
+    assert throughput['records_skipped'] == 1
+    assert parser.stats.total == 7
+
+
+def new_import_log(user_id):
+    import_log = ImportLog(user_id=user_id, data_source='apple_health', file_name='export.xml', status='processing')
+    db.session.add(import_log)
+    db.session.commit()
+    return import_log
+
+
+def finish_import(import_log, status='success'):
+    import_log.status = status
+    import_log.completed_at = datetime.utcnow()
+    db.session.commit()
+
+
+def table_snapshot(import_log_id):
+    """Imported rows for one import log, without ids/audit columns"""
+    return {
+        'weight': sorted((w.value, w.unit, w.timestamp) for w in Weight.query.filter_by(import_log_id=import_log_id)),
+        'heart_rate': sorted((h.value, h.unit, h.timestamp) for h in HeartRate.query.filter_by(import_log_id=import_log_id)),
+        'activity': sorted((a.activity_type, a.value, a.unit, a.timestamp, a.data_source)
+                           for a in Activity.query.filter_by(import_log_id=import_log_id)),
+        'sleep': sorted((s.start_time, s.end_time, s.duration, s.deep_sleep, s.light_sleep, s.rem_sleep, s.awake, s.notes)
+                        for s in Sleep.query.filter_by(import_log_id=import_log_id)),
+    }
+
+
+def test_stream_import_matches_csv_import(app, test_user, export_file, tmp_path):
+    """Streaming rows into the database gives the same data as the CSV + pandas path"""
+    csv_log = new_import_log(test_user)
+    output_dir = str(tmp_path / 'csv')
+    os.makedirs(output_dir)
+    AppleHealthParser(export_file).parse_all(output_dir)
+    DataImportService(test_user, csv_log).process_file(None, 'apple_health', output_dir)
+
+    # A second user, since the same rows for the same user are now skipped as duplicates
+    other_user = User(username='streamuser', email='stream@example.com')
+    other_user.set_password('TestPassword123')
+    db.session.add(other_user)
+    db.session.commit()
+    stream_log = new_import_log(other_user.id)
+    result = DataImportService(other_user.id, stream_log).import_stream(AppleHealthParser(export_file))
+
+    assert result['partial_results'] is False
+    assert result['records_processed'] == csv_log.records_processed == 7
+    assert stream_log.records_processed == 7
+    assert result['throughput']['record_types']['Workout']['count'] == 1
+    assert table_snapshot(stream_log.id) == table_snapshot(csv_log.id)
+
+
+def test_reimport_skips_duplicates(app, test_user, export_file, tmp_path):
+    """Importing the same export again inserts nothing and reports the skipped rows"""
+    first_log = new_import_log(test_user)
+    first = DataImportService(test_user, first_log).import_stream(AppleHealthParser(export_file))
+    assert first['records_processed'] == 7 and first['duplicates_skipped'] == 0
+
+    retry_log = new_import_log(test_user)
+    retry = DataImportService(test_user, retry_log).import_stream(AppleHealthParser(export_file))
+    assert retry['records_processed'] == 0
+    assert retry['duplicates_skipped'] == retry_log.duplicates_skipped == 7
+
+    # The CSV path goes through the same natural-key check
+    csv_log = new_import_log(test_user)
+    output_dir = str(tmp_path / 'csv')
+    os.makedirs(output_dir)
+    AppleHealthParser(export_file).parse_all(output_dir)
+    DataImportService(test_user, csv_log).process_file(None, 'apple_health', output_dir)
+    assert csv_log.records_processed == 0
+    assert csv_log.duplicates_skipped == 7
+
+    assert HeartRate.query.filter_by(user_id=test_user).count() == 1
+    assert Activity.query.filter_by(user_id=test_user).count() == 4
+    assert Sleep.query.filter_by(user_id=test_user).count() == 1
+
+
+def daily_export(path, days):
+    """Export with three heart rates and step counts, a weight and a sleep stage per day"""
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<HealthData locale="en_US">']
+    for day in days:
+        for minute in range(3):
+            ts = f"2024-05-{day:02d} 08:{minute:02d}:00 +0800"
+            lines.append(f' <Record type="HKQuantityTypeIdentifierHeartRate" sourceName="Watch" unit="count/min" startDate="{ts}" endDate="{ts}" value="{60 + minute}"/>')
+            lines.append(f' <Record type="HKQuantityTypeIdentifierStepCount" sourceName="iPhone" unit="count" startDate="{ts}" endDate="{ts}" value="{100 + minute}"/>')
+        lines.append(f' <Record type="HKQuantityTypeIdentifierBodyMass" sourceName="Scale" unit="kg" startDate="2024-05-{day:02d} 07:00:00 +0800" endDate="2024-05-{day:02d} 07:00:00 +0800" value="70"/>')
+        lines.append(f' <Record type="HKCategoryTypeIdentifierSleepAnalysis" sourceName="Watch" startDate="2024-05-{day:02d} 23:00:00 +0800" endDate="2024-05-{day:02d} 23:30:00 +0800" value="HKCategoryValueSleepAnalysisAsleepCore"/>')
+    lines.append('</HealthData>')
+    path.write_text('\n'.join(lines))
+    return str(path)
+
+
+def test_incremental_import_skips_records_below_watermark(app, test_user, tmp_path):
+    """A re-export with one new day only converts and inserts that day"""
+    first_log = new_import_log(test_user)
+    parser = AppleHealthParser(daily_export(tmp_path / 'first.xml', range(1, 4)))
+    DataImportService(test_user, first_log).import_stream(parser)
+    assert DataImportService(test_user).import_watermarks('apple_health') == {}
+    finish_import(first_log)
+
+    watermarks = DataImportService(test_user).import_watermarks('apple_health')
+    assert watermarks[('heart_rate', None, 'Watch')] == datetime(2024, 5, 3, 8, 2)
+    assert watermarks[('weight', None, 'Scale')] == datetime(2024, 5, 3, 7, 0)
+    assert ('heart_rate', None, None) not in watermarks
+    assert watermarks[('activity', 'steps', 'iPhone')] == datetime(2024, 5, 3, 8, 2)
+    assert watermarks[('sleep', None, None)] == datetime(2024, 5, 4)
+    assert DataImportService(test_user).import_watermarks('fitbit') == {}
+
+    parser = AppleHealthParser(daily_export(tmp_path / 'second.xml', range(1, 5)))
+    parser.watermarks = watermarks
+    retry_log = new_import_log(test_user)
+    result = DataImportService(test_user, retry_log).import_stream(parser)
+
+    # Days 1-2 and the earlier readings of day 3 never reach the transform step;
+    # readings equal to the watermark fall through to the natural-key check
+    assert result['throughput']['records_below_watermark'] == 8 + 8 + 2 + 3
+    assert result['records_processed'] == 8
+    assert result['duplicates_skipped'] == 3
+    assert HeartRate.query.filter_by(user_id=test_user).count() == 12
+    assert Sleep.query.filter_by(user_id=test_user).count() == 4
+
+
+def test_failed_import_is_retried_in_full(app, test_user, tmp_path):
+    """Batches committed before a failure do not move the watermarks, so re-uploading imports the rest"""
+    export_file = daily_export(tmp_path / 'export.xml', range(1, 4))
+
+    class FailingParser(AppleHealthParser):
+        def iter_rows(self):
+            for count, item in enumerate(super().iter_rows()):
+                if count == 12:
+                    raise RuntimeError('Worker stopped')
+                yield item
+
+    failed_log = new_import_log(test_user)
+    service = DataImportService(test_user, failed_log)
+    for model in (HeartRate, Activity):
+        service._writer(model).batch_size = 2
+    with pytest.raises(RuntimeError):
+        service.import_stream(FailingParser(export_file))
+    db.session.rollback()
+    finish_import(failed_log, 'failed')
+    assert 0 < HeartRate.query.filter_by(user_id=test_user).count() < 9
+    assert DataImportService(test_user).import_watermarks('apple_health') == {}
+
+    parser = AppleHealthParser(export_file)
+    parser.watermarks = DataImportService(test_user).import_watermarks('apple_health')
+    retry_log = new_import_log(test_user)
+    result = DataImportService(test_user, retry_log).import_stream(parser)
+    finish_import(retry_log)
+    assert result['throughput']['records_below_watermark'] == 0
+    assert result['records_processed'] + result['duplicates_skipped'] == 3 * 8
+    assert HeartRate.query.filter_by(user_id=test_user).count() == 9
+    assert Activity.query.filter_by(user_id=test_user).count() == 9
+    assert Weight.query.filter_by(user_id=test_user).count() == 3
+    assert Sleep.query.filter_by(user_id=test_user).count() == 3
+    watermarks = DataImportService(test_user).import_watermarks('apple_health')
+    assert watermarks[('heart_rate', None, 'Watch')] == datetime(2024, 5, 3, 8, 2)
+
+
+def test_readings_from_two_devices_at_the_same_time_are_both_kept(app, test_user, tmp_path):
+    """Heart rates and weights carry their sourceName, so only same-device readings are duplicates"""
+    ts = "2024-05-01 08:00:00 +0800"
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<HealthData locale="en_US">']
+    for source, value in (('Watch', 62), ('Chest strap', 64)):
+        lines.append(f' <Record type="HKQuantityTypeIdentifierHeartRate" sourceName="{source}" unit="count/min" startDate="{ts}" endDate="{ts}" value="{value}"/>')
+        lines.append(f' <Record type="HKQuantityTypeIdentifierBodyMass" sourceName="{source}" unit="kg" startDate="{ts}" endDate="{ts}" value="70"/>')
+    lines.append('</HealthData>')
+    export_file = tmp_path / 'export.xml'
+    export_file.write_text('\n'.join(lines))
+
+    first = DataImportService(test_user, new_import_log(test_user)).import_stream(AppleHealthParser(str(export_file)))
+    assert first['records_processed'] == 4
+    assert sorted((h.data_source, h.value) for h in HeartRate.query.filter_by(user_id=test_user)) == [
+        ('Chest strap', 64), ('Watch', 62)]
+    assert sorted(w.data_source for w in Weight.query.filter_by(user_id=test_user)) == ['Chest strap', 'Watch']
+
+    retry = DataImportService(test_user, new_import_log(test_user)).import_stream(AppleHealthParser(str(export_file)))
+    assert (retry['records_processed'], retry['duplicates_skipped']) == (0, 4)
+
+
+def test_legacy_readings_without_a_source_keep_their_watermark(app, test_user):
+    """Rows imported before heart rates kept their device still hold back every device"""
+    import_log = new_import_log(test_user)
+    finish_import(import_log)
+    db.session.add_all([
+        HeartRate(user_id=test_user, import_log_id=import_log.id, value=60, timestamp=datetime(2024, 5, 3, 8, 0)),
+        HeartRate(user_id=test_user, import_log_id=import_log.id, value=60, data_source='Watch',
+                  timestamp=datetime(2024, 5, 1, 8, 0)),
+    ])
+    db.session.commit()
+    watermarks = DataImportService(test_user).import_watermarks('apple_health')
+    assert watermarks[('heart_rate', None, None)] == watermarks[('heart_rate', None, 'Watch')] == datetime(2024, 5, 3, 8, 0)
+
+
+def test_bulk_writer_fills_defaults_and_reports_rate(app, test_user):
+    """BulkWriter applies column defaults and the import log records rows/sec"""
+    import_log = new_import_log(test_user)
+    service = DataImportService(test_user, import_log)
+    service._save_health_data_batch([
+        HeartRate(user_id=test_user, import_log_id=import_log.id, value=60 + i,
+                  timestamp=datetime(2024, 5, 1, 8, i))
+        for i in range(5)
+    ] + [Weight(user_id=test_user, import_log_id=import_log.id, value=70.5, unit='kg',
+                timestamp=datetime(2024, 5, 1, 7, 0))])
+
+    heart_rates = HeartRate.query.filter_by(import_log_id=import_log.id).all()
+    assert len(heart_rates) == 5
+    assert all(h.unit == 'bpm' and h.created_at is not None for h in heart_rates)
+    assert Weight.query.filter_by(import_log_id=import_log.id).count() == 1
+    assert import_log.records_processed == 6
+    assert import_log.rows_per_second > 0
+
+
+def build_large_export(path, records=3000):
+    """Export with many records and Correlations whose nested Records must not be split"""
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<HealthData locale="en_US">']
+    for i in range(records):
+        ts = f"2024-05-{1 + i // 1440:02d} {(i // 60) % 24:02d}:{i % 60:02d}:00 +0800"
+        kind = i % 4
+        if kind == 0:
+            lines.append(f' <Record type="HKQuantityTypeIdentifierHeartRate" sourceName="Watch" unit="count/min" startDate="{ts}" endDate="{ts}" value="{60 + i % 40}"/>')
+        elif kind == 1:
+            lines.append(f' <Record type="HKQuantityTypeIdentifierStepCount" sourceName="iPhone" unit="count" startDate="{ts}" endDate="{ts}" value="{i % 500}"/>')
+        elif kind == 2:
+            lines.append(f' <Correlation type="HKCorrelationTypeIdentifierBloodPressure" sourceName="Cuff" startDate="{ts}" endDate="{ts}">')
+            lines.append(f'  <Record type="HKQuantityTypeIdentifierBodyMass" sourceName="Cuff" unit="kg" startDate="{ts}" endDate="{ts}" value="70"/>')
+            lines.append(' </Correlation>')
+        else:
+            lines.append(f' <Record type="HKQuantityTypeIdentifierBodyMass" sourceName="Scale" unit="kg" startDate="{ts}" endDate="{ts}" value="{70 + (i % 10) / 10}"/>')
+    lines.append('</HealthData>')
+    path.write_text('\n'.join(lines) + '\n')
+    return str(path)
+
+
+def test_shard_ranges_start_at_top_level_records(tmp_path):
+    """Shards cover the file and never begin inside a Correlation"""
+    from app.services.parsers.apple_health_parser import find_shard_ranges
+
+    xml_path = build_large_export(tmp_path / 'export.xml')
+    ranges = find_shard_ranges(xml_path, 8)
+    data = open(xml_path, 'rb').read()
+
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(data)
+    assert all(end == next_start for (_, end), (next_start, _) in zip(ranges, ranges[1:]))
+    assert len(ranges) > 1
+    for start, _ in ranges[1:]:
+        assert data[start:start + 8] == b'<Record '
+        before = data[:start]
+        assert before.rfind(b'<Correlation ') < before.rfind(b'</Correlation>')
+
+
+@pytest.mark.parametrize('run_rows', [100000, 50])
+def test_parallel_parse_matches_single_process(tmp_path, monkeypatch, run_rows):
+    """Sharded parsing produces the same rows, merged in timestamp order, however many runs each shard writes"""
+    monkeypatch.setattr('app.services.parsers.apple_health_parser.SHARD_RUN_ROWS', run_rows)
+    xml_path = build_large_export(tmp_path / 'export.xml')
+    _, single = run_parser(xml_path, str(tmp_path / 'single'), True)
+
+    os.makedirs(tmp_path / 'parallel')
+    parser = AppleHealthParser(xml_path, workers=3)
+    parallel = parser.parse_all(str(tmp_path / 'parallel'))
+
+    assert parallel['partial_results'] is False
+    assert {k: v['count'] for k, v in parallel['throughput']['record_types'].items()} == \
+        {k: v['count'] for k, v in single['throughput']['record_types'].items()}
+    for name in CSV_FILES:
+        assert read_rows(os.path.join(parallel['output_dir'], name)) == \
+            read_rows(os.path.join(single['output_dir'], name)), name
+
+    with open(os.path.join(parallel['output_dir'], 'heart_rate.csv'), newline='') as f:
+        timestamps = [row['timestamp'] for row in csv.DictReader(f)]
+    assert timestamps == sorted(timestamps)
+
+
+def test_vectorized_sleep_nights_match_row_by_row(app):
+    """aggregate_sleep_nights gives the same nights as the per-row accumulator"""
+    import pandas as pd
+    from datetime import timedelta
+    from app.services.data_import import SleepAccumulator, aggregate_sleep_nights
+
+    stages = ['HKCategoryValueSleepAnalysisAsleepDeep', 'HKCategoryValueSleepAnalysisAsleepCore',
+              'HKCategoryValueSleepAnalysisAsleepREM', 'HKCategoryValueSleepAnalysisAwake',
+              'HKCategoryValueSleepAnalysisInBed']
+    rows = []
+    for night in range(3):
+        bedtime = datetime(2024, 5, 1, 21, 0) + timedelta(days=night)
+        for i in range(10):
+            start = bedtime + timedelta(minutes=i * 20)
+            rows.append({
+                'stage': stages[i % len(stages)],
+                'start_time': start.strftime('%Y-%m-%d %H:%M:%S +0800'),
+                'end_time': (start + timedelta(minutes=17)).strftime('%Y-%m-%d %H:%M:%S +0800'),
+                'source_name': 'Watch',
+            })
+    rows.append({'stage': 'HKCategoryValueSleepAnalysisAsleepCore', 'start_time': 'garbage',
+                 'end_time': '2024-05-01 23:00:00 +0800', 'source_name': 'Watch'})
+    rows.append({'stage': 'HKCategoryValueSleepAnalysisAsleepDeep', 'start_time': '2024-05-04T01:00:00+08:00',
+                 'end_time': '2024-05-04T02:30:00+08:00', 'source_name': 'Phone'})
+
+    expected = SleepAccumulator()
+    for row in rows:
+        try:
+            expected.add(row)
+        except ValueError:
+            pass
+    expected_rows = sorted(
+        (r['start_time'].replace(tzinfo=None), r['end_time'].replace(tzinfo=None), r['duration'],
+         r['deep_sleep'], r['light_sleep'], r['rem_sleep'], r['awake'])
+        for r in expected.rows(1, 1)
+    )
+
+    nights = aggregate_sleep_nights(pd.DataFrame(rows))
+    actual_rows = sorted(
+        (n.start_time.to_pydatetime(), n.end_time.to_pydatetime(), n.duration,
+         n.deep_sleep, n.light_sleep, n.rem_sleep, n.awake)
+        for n in nights.itertuples(index=False)
+    )
+
+    assert actual_rows == expected_rows
+    assert int(nights['rows'].sum()) == len(rows) - 1
@@ -0,0 +1,118 @@
+import multiprocessing
+import os
+import time
+import pytest
+from app import create_app, cache
+import fakeredis
+from app.utils.cache_backends import IntRedisCache, MeteredCache, SQLiteCache
+from app.utils.cache_utils import bump_data_version, cache_stats, get_data_version
+
+
+@pytest.fixture
+def sqlite_cache(tmp_path):
+    return SQLiteCache(str(tmp_path / 'cache.sqlite'), threshold=0, default_timeout=300)
+
+
+def test_sqlite_cache_operations(sqlite_cache):
+    """get/set/add/inc/delete behave like the other cachelib backends, including timeouts"""
+    assert sqlite_cache.get('missing') is None
+    assert sqlite_cache.set('chart', {'labels': ['Mon'], 'data': [1.5]})
+    assert sqlite_cache.get('chart') == {'labels': ['Mon'], 'data': [1.5]}
+    assert sqlite_cache.has('chart')
+
+    assert not sqlite_cache.add('chart', 'other')
+    assert sqlite_cache.add('version', 10, timeout=0)
+    assert sqlite_cache.inc('version') == 11
+    assert sqlite_cache.dec('version', 2) == 9
+    assert sqlite_cache.inc('fresh') == 1
+
+    sqlite_cache.set('short', 1, timeout=1)
+    time.sleep(1.1)
+    assert sqlite_cache.get('short') is None
+    assert sqlite_cache.add('short', 2)
+    assert sqlite_cache.get('short') == 2
+
+    assert sqlite_cache.delete('chart') and not sqlite_cache.delete('chart')
+    sqlite_cache.clear()
+    assert sqlite_cache.get('version') is None
+
+
+def test_sqlite_cache_evicts_least_recently_used(tmp_path):
+    """Past the entry or size limit the entries read least recently go first"""
+    by_count = SQLiteCache(str(tmp_path / 'count.sqlite'), threshold=3)
+    for key in 'abc':
+        by_count.set(key, key)
+        time.sleep(0.01)
+    by_count.get('a')
+    by_count.set('d', 'd')
+    assert [by_count.get(key) for key in 'abcd'] == ['a', None, 'c', 'd']
+
+    by_size = SQLiteCache(str(tmp_path / 'size.sqlite'), threshold=0, max_size=2500)
+    for key in 'abc':
+        by_size.set(key, b'x' * 1000)
+        time.sleep(0.01)
+    assert [by_size.has(key) for key in 'abc'] == [False, True, True]
+
+
+def _increment(path, times):
+    shared = SQLiteCache(path)
+    for _ in range(times):
+        shared.inc('counter')
+
+
+def test_sqlite_cache_is_shared_between_processes(tmp_path):
+    """Workers see each other's entries and increments are not lost"""
+    path = str(tmp_path / 'shared.sqlite')
+    SQLiteCache(path).add('counter', 0, timeout=0)
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=_increment, args=(path, 100)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert SQLiteCache(path).get('counter') == 400
+
+
+def test_metered_cache_counts_per_worker(sqlite_cache):
+    """Hits, misses and writes are counted and restart in a forked worker"""
+    metered = MeteredCache(sqlite_cache, log_interval=0)
+    metered.set('a', 1)
+    metered.get('a')
+    metered.get('b')
+    metered.get_many('a', 'c')
+    assert metered.inc('n') == 1
+    report = metered.metrics.report()
+    assert (report['hits'], report['misses'], report['sets'], report['hit_rate']) == (2, 2, 1, 0.5)
+    assert report['pid'] == os.getpid()
+
+    metered.metrics.pid = -1
+    assert metered.metrics.report()['hits'] == 0
+
+
+def test_app_uses_configured_backend(tmp_path, monkeypatch):
+    """CACHE_TYPE=sqlite puts a metered SQLiteCache behind the app's cache"""
+    monkeypatch.setenv('CACHE_TYPE', 'sqlite')
+    monkeypatch.setenv('CACHE_DIR', str(tmp_path))
+    app = create_app(config_name='testing')
+    with app.app_context():
+        assert isinstance(cache.cache.backend, SQLiteCache)
+        assert os.path.exists(tmp_path / 'cache.sqlite')
+        version = get_data_version(1)
+        assert bump_data_version(1) == version + 1
+        assert SQLiteCache(str(tmp_path / 'cache.sqlite')).get('data_version_1') == version + 1
+        assert cache_stats()['backend'] == 'SQLiteCache'
+
+
+def test_redis_backend_against_local_stand_in():
+    """The Redis backend works for data versions, using fakeredis in place of a server"""
+    metered = MeteredCache(IntRedisCache(host=fakeredis.FakeStrictRedis(), key_prefix='healthtrack_'), log_interval=0)
+    assert metered.add('data_version_1', 100, timeout=0)
+    assert not metered.add('data_version_1', 5, timeout=0)
+    assert metered.inc('data_version_1') == 101
+    assert metered.get('data_version_1') == 101
+    assert metered.metrics.report()['hits'] == 1
+
+    assert metered.set('versions', 7) and metered.inc('versions', 2) == 9
+    assert metered.set('flag', True) and metered.get('flag') is True
+    assert metered.set('chart', {'labels': ['Mon'], 'data': [1.5]})
+    assert metered.get('chart') == {'labels': ['Mon'], 'data': [1.5]}
@@ -0,0 +1,186 @@
+from datetime import datetime, timedelta
+import json
+import threading
+import time
+import pytest
+from app import create_app, db, cache
+from app.models import Weight, ImportLog, SharedLink
+from app.models.user import User
+from app.utils import cache_utils
+from app.utils.cache_utils import (
+    CacheEntry, bump_data_version, get_data_version, get_or_compute, invalidate_dashboard_cache,
+    shared_dashboard_cache_key, user_cache_key
+)
+
+
+@pytest.fixture
+def app():
+    """Create and configure Flask application for testing"""
+    app = create_app(config_name='testing')
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+
+    with app.app_context():
+        db.create_all()
+        cache.clear()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def test_user(app):
+    """Create test user and return its ID"""
+    user = User(username='cacheuser', email='cache@example.com')
+    user.set_password('TestPassword123')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def test_keys_follow_the_data_version(app, test_user):
+    """Keys embed the user's version; a bump moves every key of that user only"""
+    version = get_data_version(test_user)
+    assert get_data_version(test_user) == version
+    key = user_cache_key(test_user, 'dashboard_data', 'days', 14)
+    assert key == f'dashboard_data_{test_user}_v{version}_days_14'
+    other = user_cache_key(test_user + 1, 'dashboard_data', 'days', 14)
+
+    invalidate_dashboard_cache(test_user)
+    assert get_data_version(test_user) == version + 1
+    assert user_cache_key(test_user, 'dashboard_data', 'days', 14) != key
+    assert user_cache_key(test_user + 1, 'dashboard_data', 'days', 14) == other
+
+    # A lost version restarts from the clock, above anything used before
+    cache.delete(f'data_version_{test_user}')
+    assert get_data_version(test_user) > version + 1
+
+
+def test_orm_commits_bump_the_version(app, test_user):
+    """Committed data changes bump the owner's version; rollbacks and bookkeeping rows do not"""
+    version = get_data_version(test_user)
+    weight = Weight(user_id=test_user, timestamp=datetime(2024, 5, 1, 8), value=70, unit='kg')
+    db.session.add(weight)
+    db.session.commit()
+    assert get_data_version(test_user) == version + 1
+
+    weight.value = 71
+    db.session.flush()
+    db.session.rollback()
+    assert get_data_version(test_user) == version + 1
+
+    db.session.add(ImportLog(user_id=test_user, data_source='apple_health', file_name='export.xml', status='processing'))
+    db.session.commit()
+    assert get_data_version(test_user) == version + 1
+
+    db.session.delete(db.session.get(Weight, weight.id))
+    db.session.commit()
+    assert get_data_version(test_user) == version + 2
+
+
+def test_dashboard_summary_is_invalidated_for_any_days_value(app, test_user):
+    """Cached summaries for every days value are replaced once the data changes"""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(test_user)
+        session['_fresh'] = True
+
+    def total_records(days):
+        return json.loads(client.get(f'/dashboard/summary?days={days}').data)['summary']['total_records']
+
+    now = datetime.utcnow()
+    db.session.add(Weight(user_id=test_user, timestamp=now - timedelta(days=2), value=70, unit='kg'))
+    db.session.commit()
+    assert [total_records(days) for days in (7, 14)] == [1, 1]
+
+    db.session.add(Weight(user_id=test_user, timestamp=now - timedelta(hours=1), value=68, unit='kg'))
+    db.session.commit()
+    assert [total_records(days) for days in (7, 14)] == [2, 2]
+
+
+def test_shared_dashboard_key_follows_the_owner(app, test_user):
+    """Share views are keyed on the data version of the user who shared"""
+    link = SharedLink(user_id=test_user, share_token='token123', modules='["dashboard"]',
+                      date_range_start=datetime(2024, 1, 1), date_range_end=datetime(2024, 12, 31))
+    db.session.add(link)
+    db.session.commit()
+
+    key = shared_dashboard_cache_key('token123')
+    assert key == user_cache_key(test_user, 'shared_dashboard', 'token123')
+    bump_data_version(test_user)
+    assert shared_dashboard_cache_key('token123') != key
+    assert shared_dashboard_cache_key('missing') == 'shared_dashboard_missing'
+
+
+class SlowCompute:
+    """compute() for get_or_compute that counts its calls"""
+
+    def __init__(self, value, delay=0.0):
+        self.value, self.delay, self.calls = value, delay, 0
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        return self.value
+
+
+def test_concurrent_misses_compute_once(app):
+    """Callers that miss together wait for the single caller computing the value"""
+    compute = SlowCompute('fresh', delay=0.3)
+    results = []
+
+    def request():
+        with app.app_context():
+            results.append(get_or_compute('report', compute, timeout=60))
+
+    threads = [threading.Thread(target=request) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ['fresh'] * 6
+    assert compute.calls == 1
+    assert cache.get('report_lock') is None
+
+
+def test_errors_are_not_cached(app):
+    def failing():
+        raise RuntimeError('database unavailable')
+
+    with pytest.raises(RuntimeError):
+        get_or_compute('report', failing, timeout=60)
+    assert get_or_compute('report', SlowCompute('fresh'), timeout=60) == 'fresh'
+
+
+def test_stale_value_is_served_while_one_caller_refreshes(app):
+    """An expired entry is returned at once; the refresh runs in the background, or elsewhere if locked"""
+    cache.set('report', CacheEntry('old', time.time() - 1, 0.01), timeout=300)
+    compute = SlowCompute('new', delay=0.2)
+    assert get_or_compute('report', compute, timeout=60, beta=0) == 'old'
+
+    # A second caller during the refresh does not start another one
+    assert get_or_compute('report', compute, timeout=60, beta=0) == 'old'
+    deadline = time.time() + 5
+    while cache.get('report_lock') is not None and time.time() < deadline:
+        time.sleep(0.05)
+    assert get_or_compute('report', compute, timeout=60, beta=0) == 'new'
+    assert compute.calls == 1
+
+    # Without a background thread the lock holder refreshes inline
+    cache.set('report', CacheEntry('old', time.time() - 1, 0.01), timeout=300)
+    assert get_or_compute('report', SlowCompute('inline'), timeout=60, beta=0, background=False) == 'inline'
+
+
+def test_early_expiry_depends_on_compute_time(app, monkeypatch):
+    """Entries are refreshed before expiry only when the draw falls within their compute time"""
+    now = time.time()
+    entry = CacheEntry('value', now + 5, 2.0)
+    assert cache_utils._refresh_due(CacheEntry('value', now - 1, 0), now, beta=0)
+    assert not cache_utils._refresh_due(entry, now, beta=0)
+
+    monkeypatch.setattr(cache_utils.random, 'random', lambda: 0.0)
+    assert not cache_utils._refresh_due(entry, now, beta=1.0)
+    monkeypatch.setattr(cache_utils.random, 'random', lambda: 0.99)
+    # -ln(0.01) * 2s is about 9.2s, past the 5s left
+    assert cache_utils._refresh_due(entry, now, beta=1.0)
+    assert not cache_utils._refresh_due(CacheEntry('value', now + 5, 0.1), now, beta=1.0)
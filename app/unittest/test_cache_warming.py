@@ -0,0 +1,126 @@
+import io
+from datetime import datetime, timedelta
+import pytest
+from werkzeug.datastructures import FileStorage
+from app import create_app, db, cache
+from app.models import ImportLog, SharedLink, Weight
+from app.models.user import User
+from app.services.cache_warming import warm_user_caches
+from app.services.import_queue import run_worker
+from app.services.time_series_query import TimeSeriesQuery
+from app.services.upload_service import UploadService
+from app.unittest.test_apple_health_parser import SAMPLE_EXPORT
+from app.utils.cache_utils import shared_dashboard_cache_key, user_cache_key
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """Create and configure Flask application for testing, with a cache shared between processes"""
+    monkeypatch.setenv('CACHE_TYPE', 'sqlite')
+    monkeypatch.setenv('CACHE_DIR', str(tmp_path / 'cache'))
+    app = create_app(config_name='testing')
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['UPLOAD_FOLDER'] = str(tmp_path / 'uploads')
+    app.config['CACHE_WARM_AFTER_IMPORT'] = True
+
+    with app.app_context():
+        db.create_all()
+        cache.clear()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def test_user(app):
+    """Create test user and return its ID"""
+    user = User(username='warmuser', email='warm@example.com')
+    user.set_password('TestPassword123')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def export_upload():
+    return FileStorage(stream=io.BytesIO(SAMPLE_EXPORT.encode()), filename='export.xml')
+
+
+def test_warming_fills_dashboard_chart_and_share_entries(app, test_user):
+    """Every payload of the first dashboard visit is cached under the key real requests use"""
+    db.session.add_all([
+        Weight(user_id=test_user, timestamp=datetime.now() - timedelta(days=1), value=70, unit='kg'),
+        SharedLink(user_id=test_user, share_token='dashboard-link', modules='["dashboard"]',
+                   date_range_start=datetime(2024, 1, 1), date_range_end=datetime(2030, 1, 1)),
+        SharedLink(user_id=test_user, share_token='expired-link', modules='["dashboard"]',
+                   date_range_start=datetime(2024, 1, 1), date_range_end=datetime(2030, 1, 1),
+                   expires_at=datetime.utcnow() - timedelta(days=1)),
+    ])
+    db.session.commit()
+
+    result = warm_user_caches(test_user)
+    assert result['failed'] == 0
+    assert result['warmed'] == 6 + 20 + 1
+
+    for days in (7, 30):
+        assert cache.get(user_cache_key(test_user, 'dashboard_data', 'days', days, 'html')) is not None
+        assert cache.get(user_cache_key(test_user, 'dashboard_summary', 'days', days)) is not None
+        assert cache.get(user_cache_key(test_user, 'dashboard_goals_achievements', 'days', days)) is not None
+    assert cache.get(TimeSeriesQuery('sleep', test_user, 'yearly').cache_key()) is not None
+    assert cache.has(shared_dashboard_cache_key('dashboard-link'))
+    assert not cache.has(shared_dashboard_cache_key('expired-link'))
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(test_user)
+        session['_fresh'] = True
+    hits = cache.cache.metrics.report()['hits']
+    assert client.get('/dashboard/summary?days=7').status_code == 200
+    assert cache.cache.metrics.report()['hits'] > hits
+
+
+def test_worker_warms_and_records_time(app, test_user):
+    """Queued imports are warmed by the worker that ran them"""
+    import_log = UploadService(test_user).enqueue_file(export_upload(), 'apple_health')
+    import_log_id = import_log.id
+    run_worker('test-worker', once=True)
+
+    import_log = db.session.get(ImportLog, import_log_id)
+    assert import_log.status == 'success'
+    assert import_log.cache_warm_seconds is not None
+    assert cache.get(user_cache_key(test_user, 'dashboard_summary', 'days', 7)) is not None
+
+
+def test_worker_skips_warming_a_local_cache(tmp_path, monkeypatch):
+    """An in-process cache is not warmed by the worker, the web processes would never see it"""
+    monkeypatch.setenv('CACHE_TYPE', 'simple')
+    app = create_app(config_name='testing')
+    app.config['UPLOAD_FOLDER'] = str(tmp_path / 'uploads')
+    app.config['CACHE_WARM_AFTER_IMPORT'] = True
+    with app.app_context():
+        db.create_all()
+        user = User(username='localuser', email='local@example.com')
+        user.set_password('TestPassword123')
+        db.session.add(user)
+        db.session.commit()
+
+        import_log_id = UploadService(user.id).enqueue_file(export_upload(), 'apple_health').id
+        run_worker('test-worker', once=True)
+        assert db.session.get(ImportLog, import_log_id).cache_warm_seconds is None
+        db.session.remove()
+        db.drop_all()
+
+
+def test_direct_upload_warms_in_background(app, test_user, monkeypatch):
+    """Imports processed in the request are warmed by a background thread"""
+    threads = []
+    from app.services import upload_service, cache_warming
+    monkeypatch.setattr(upload_service, 'warm_in_background',
+                        lambda import_log_id: threads.append(cache_warming.warm_in_background(import_log_id)))
+
+    import_log_id = UploadService(test_user).process_file(export_upload(), 'apple_health').id
+    assert len(threads) == 1
+    threads[0].join(timeout=30)
+
+    db.session.expire_all()
+    assert db.session.get(ImportLog, import_log_id).cache_warm_seconds is not None
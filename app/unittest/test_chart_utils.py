@@ -0,0 +1,91 @@
+from datetime import datetime, timedelta
+import random
+import numpy as np
+import pandas as pd
+import pytest
+from app.utils.chart_utils import SlotIndex, aggregate_into_slots, generate_time_slots
+
+START = datetime(2023, 11, 18)
+END = datetime(2024, 5, 15, 13, 45)
+
+
+def linear_find(slots, timestamp):
+    """The slot scan the chart routes used before"""
+    for position, slot in enumerate(slots):
+        if slot['start'] <= timestamp < slot['end']:
+            return position
+    return None
+
+
+@pytest.fixture
+def readings():
+    rng = random.Random(5505)
+    span = (END - START).total_seconds()
+    timestamps = [START + timedelta(seconds=rng.uniform(-0.05, 1.05) * span) for _ in range(2000)]
+    return timestamps, [rng.uniform(40, 190) for _ in timestamps]
+
+
+@pytest.mark.parametrize('period', ['daily', 'weekly', 'monthly', 'six_months', 'yearly'])
+def test_slot_index_matches_linear_scan(readings, period):
+    """Binary search and searchsorted agree with the linear scan, including slot edges and the range ends"""
+    start = START if period != 'daily' else END.replace(hour=0, minute=0)
+    slots = generate_time_slots(period, start, END)
+    index = SlotIndex(slots)
+    timestamps = readings[0] + [slot['start'] for slot in slots] + [slot['end'] for slot in slots]
+    timestamps += [start - timedelta(microseconds=1), END]
+
+    expected = [linear_find(slots, timestamp) for timestamp in timestamps]
+    assert [index.find(timestamp) for timestamp in timestamps] == expected
+    assert index.positions(timestamps).tolist() == [-1 if p is None else p for p in expected]
+    assert index.positions(pd.Series(timestamps)).tolist() == [-1 if p is None else p for p in expected]
+    assert index.label_for(timestamps[0]) == (slots[expected[0]]['label'] if expected[0] is not None else None)
+
+
+def test_aggregate_into_slots_matches_loop(readings):
+    """One NumPy pass gives the same min/max/sum/count/avg as the per-row loop, in any row order"""
+    timestamps, values = readings
+    values[7] = float('nan')
+    slots = generate_time_slots('six_months', START, END)
+
+    expected = {slot['label']: [] for slot in slots}
+    for timestamp, value in zip(timestamps, values):
+        position = linear_find(slots, timestamp)
+        if position is not None and not np.isnan(value):
+            expected[slots[position]['label']].append(value)
+
+    data = aggregate_into_slots(timestamps, values, slots, metrics=['min', 'max', 'sum', 'count', 'avg'])
+
+    assert list(data) == [slot['label'] for slot in slots]
+    for label, bucket in expected.items():
+        if not bucket:
+            assert data[label] == {'min': 0, 'max': 0, 'sum': 0, 'count': 0, 'avg': 0}
+            continue
+        assert data[label] == pytest.approx({
+            'min': min(bucket), 'max': max(bucket), 'sum': sum(bucket),
+            'count': len(bucket), 'avg': sum(bucket) / len(bucket)
+        }), label
+
+    ordered = sorted(zip(timestamps, values))
+    in_order = aggregate_into_slots([t for t, _ in ordered], [v for _, v in ordered], SlotIndex(slots))
+    shuffled = aggregate_into_slots(timestamps, values, slots)
+    for label, stats in shuffled.items():
+        assert in_order[label] == pytest.approx(stats), label
+
+
+def test_aggregate_into_slots_edge_cases():
+    """No readings, merged duplicate labels and unknown metrics"""
+    slots = [
+        {'start': datetime(2024, 1, 1), 'end': datetime(2024, 1, 2), 'label': 'Mon'},
+        {'start': datetime(2024, 1, 2), 'end': datetime(2024, 1, 8), 'label': 'Rest'},
+        {'start': datetime(2024, 1, 8), 'end': datetime(2024, 1, 9), 'label': 'Mon'},
+    ]
+    assert aggregate_into_slots([], [], slots, metrics=['count']) == {'Mon': {'count': 0}, 'Rest': {'count': 0}}
+
+    data = aggregate_into_slots(
+        [datetime(2024, 1, 1, 9), datetime(2024, 1, 8, 9), datetime(2024, 1, 3)], [10, 30, 5], slots
+    )
+    assert data['Mon'] == {'min': 10, 'max': 30, 'sum': 40, 'count': 2}
+    assert data['Rest'] == {'min': 5, 'max': 5, 'sum': 5, 'count': 1}
+
+    with pytest.raises(ValueError):
+        aggregate_into_slots([], [], slots, metrics=['median'])
@@ -0,0 +1,123 @@
+import json
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy.dialects import postgresql
+from app import create_app, db, cache
+from app.models import Activity, HeartRate, Sleep, Weight
+from app.models.user import User
+from app.services.dashboard_query import DashboardQuery
+from app.unittest import count_statements
+
+DAY1 = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=2)
+DAY2 = DAY1 + timedelta(days=1)
+
+
+@pytest.fixture
+def app():
+    """Create and configure Flask application for testing"""
+    app = create_app(config_name='testing')
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+
+    with app.app_context():
+        db.create_all()
+        cache.clear()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def test_user(app):
+    """Create test user and return its ID"""
+    user = User(username='dashuser', email='dash@example.com')
+    user.set_password('TestPassword123')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def sleep(user_id, start, duration, quality):
+    return Sleep(user_id=user_id, start_time=start, end_time=start + timedelta(minutes=duration),
+                 timestamp=start, duration=duration, quality=quality)
+
+
+def add_sample_data(user_id):
+    db.session.add_all([
+        Weight(user_id=user_id, timestamp=DAY1 + timedelta(hours=8), value=80, unit='kg'),
+        Weight(user_id=user_id, timestamp=DAY1 + timedelta(hours=20), value=79, unit='kg'),
+        Weight(user_id=user_id, timestamp=DAY2 + timedelta(hours=8), value=78, unit='kg'),
+        Weight(user_id=user_id, timestamp=DAY1 - timedelta(days=20), value=90, unit='kg'),
+        HeartRate(user_id=user_id, timestamp=DAY1 + timedelta(hours=9), value=60, unit='bpm'),
+        HeartRate(user_id=user_id, timestamp=DAY1 + timedelta(hours=10), value=70, unit='bpm'),
+        HeartRate(user_id=user_id, timestamp=DAY1 + timedelta(hours=11), value=80, unit='bpm'),
+        Activity(user_id=user_id, timestamp=DAY1 + timedelta(hours=12), activity_type='steps', value=1000),
+        Activity(user_id=user_id, timestamp=DAY1 + timedelta(hours=13), activity_type='walking', value=500),
+        Activity(user_id=user_id, timestamp=DAY2 + timedelta(hours=12), activity_type='steps', value=3000),
+        Activity(user_id=user_id, timestamp=DAY2 + timedelta(hours=14), activity_type='cycling', value=20),
+        sleep(user_id, DAY1 + timedelta(hours=1), 420, 'good'),
+        sleep(user_id, DAY1 + timedelta(hours=14), 300, 'poor'),
+        sleep(user_id, DAY2 + timedelta(hours=1), 480, 'excellent'),
+    ])
+    db.session.commit()
+
+
+def test_fetch_returns_every_panel(app, test_user):
+    """Per-day rows and summaries match what the separate panel queries returned"""
+    add_sample_data(test_user)
+    other = User(username='otheruser', email='other@example.com')
+    other.set_password('TestPassword123')
+    db.session.add(other)
+    db.session.commit()
+    add_sample_data(other.id)
+
+    data = DashboardQuery(test_user, DAY1 - timedelta(days=5)).fetch()
+    day1, day2 = f'{DAY1:%Y-%m-%d}', f'{DAY2:%Y-%m-%d}'
+
+    assert data['weights'] == [{'date': day1, 'value': 79.0, 'unit': 'kg'}, {'date': day2, 'value': 78.0, 'unit': 'kg'}]
+    assert data['heartRates'] == [{'date': day1, 'min': 60.0, 'max': 80.0, 'avg': 70, 'unit': 'bpm'}]
+    assert data['activities'] == [{'date': day2, 'steps': 3020.0}, {'date': day1, 'steps': 1500.0}]
+    assert data['sleeps'] == [
+        {'date': day1, 'duration': 420.0, 'durationHours': 7.0, 'quality': 'good'},
+        {'date': day2, 'duration': 480.0, 'durationHours': 8.0, 'quality': 'excellent'},
+    ]
+    assert data['summary'] == {
+        'weight': {'latest': 78.0, 'change': -2.0, 'change_percent': -2.5},
+        'heart_rate': {'min': 60.0, 'max': 80.0, 'avg': 70.0},
+        'activity': {'total_steps': 4500.0, 'avg_steps': 2250.0, 'best_day': 3000.0},
+        'sleep': {'avg_duration': 400.0, 'avg_duration_hours': 400.0 / 60, 'best_duration': 480.0,
+                  'best_duration_hours': 8.0, 'quality': {'poor': 1, 'fair': 0, 'good': 1, 'excellent': 1}},
+    }
+
+
+def test_fetch_without_data(app, test_user):
+    """A user with no readings gets empty panels and no summary entries"""
+    data = DashboardQuery(test_user, DAY1).fetch()
+    assert data == {'weights': [], 'heartRates': [], 'activities': [], 'sleeps': [], 'summary': {}}
+
+
+def test_dashboard_reads_metrics_in_one_round_trip(app, test_user):
+    """fetch() is one statement, and the dashboard route serves its result"""
+    add_sample_data(test_user)
+    with count_statements() as statements:
+        expected = DashboardQuery(test_user, DAY1 - timedelta(days=5)).fetch()
+    assert len(statements) == 1
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(test_user)
+        session['_fresh'] = True
+    response = client.get('/dashboard?days=7', headers={'X-Requested-With': 'XMLHttpRequest'})
+    assert response.status_code == 200
+    payload = json.loads(response.data)
+    assert payload['summary'] == expected['summary']
+    assert payload['weights'] == expected['weights']
+    assert payload['recentImports'] == []
+
+
+def test_statement_compiles_for_postgresql(app, test_user):
+    """The same CTEs and windows are emitted for PostgreSQL"""
+    sql = str(DashboardQuery(test_user, DAY1).statement().compile(dialect=postgresql.dialect()))
+    assert sql.startswith('WITH recent_weights AS')
+    assert sql.count('UNION ALL') == 8
+    assert 'row_number() OVER (PARTITION BY date(' in sql
@@ -0,0 +1,133 @@
+from datetime import datetime, timedelta
+import pytest
+from app import create_app, db, cache
+from app.models import Activity, HeartRate, Sleep, Weight
+from app.models.goal import Goal
+from app.models.user import User
+from app.services.goal_engine import update_all_goals, update_goal_shard
+from app.services.goal_service import GoalService
+from app.unittest import count_statements
+from app.utils.cache_utils import get_data_version
+
+NOW = datetime.utcnow()
+
+
+@pytest.fixture
+def app():
+    """Create and configure Flask application for testing"""
+    app = create_app(config_name='testing')
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+
+    with app.app_context():
+        db.create_all()
+        cache.clear()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def users(app):
+    """Three users with steps, weight, sleep and heart rate data and a goal of each kind"""
+    user_ids = []
+    for index in range(3):
+        user = User(username=f'goaluser{index}', email=f'goal{index}@example.com')
+        user.set_password('TestPassword123')
+        db.session.add(user)
+        db.session.commit()
+        user_ids.append(user.id)
+
+        steps = 4000 * (index + 1)
+        db.session.add_all([
+            Activity(user_id=user.id, activity_type='steps', value=steps, total_steps=steps, timestamp=NOW),
+            Activity(user_id=user.id, activity_type='steps', value=3000, total_steps=3000,
+                     timestamp=NOW - timedelta(days=1)),
+            Weight(user_id=user.id, value=80 - index, unit='kg', timestamp=NOW - timedelta(days=2)),
+            Weight(user_id=user.id, value=78 - index, unit='kg', timestamp=NOW - timedelta(hours=1)),
+            Sleep(user_id=user.id, duration=400 + 30 * index, start_time=NOW - timedelta(hours=9),
+                  end_time=NOW - timedelta(hours=2), timestamp=NOW - timedelta(hours=9)),
+            HeartRate(user_id=user.id, value=60 + index, unit='bpm', timestamp=NOW - timedelta(minutes=5)),
+            HeartRate(user_id=user.id, value=80 + index, unit='bpm', timestamp=NOW - timedelta(minutes=1)),
+            Goal(user_id=user.id, category='steps', target_value=10000, unit='steps', timeframe='daily',
+                 start_date=NOW - timedelta(days=3), end_date=NOW + timedelta(days=3)),
+            Goal(user_id=user.id, category='steps', target_value=14000, unit='steps', timeframe='weekly',
+                 start_date=NOW - timedelta(days=20), end_date=NOW - timedelta(days=10)),
+            Goal(user_id=user.id, category='weight', target_value=75, unit='kg', timeframe='monthly',
+                 start_date=NOW, progress_related=True, progress_baseline=80),
+            Goal(user_id=user.id, category='sleep', target_value=450, unit='minutes', timeframe='daily',
+                 start_date=NOW - timedelta(hours=10)),
+            Goal(user_id=user.id, category='sleep', target_value=3000, unit='minutes', timeframe='weekly',
+                 start_date=NOW - timedelta(days=1)),
+            Goal(user_id=user.id, category='heart_rate', target_value=70, unit='bpm', timeframe='daily',
+                 start_date=NOW - timedelta(minutes=10)),
+        ])
+        db.session.commit()
+    return user_ids
+
+
+def goal_values():
+    db.session.expire_all()
+    return {goal.id: (goal.current_value, goal.completed) for goal in Goal.query.order_by(Goal.id)}
+
+
+def reset_goals():
+    for goal in Goal.query:
+        goal.current_value, goal.completed = 0, False
+    db.session.commit()
+
+
+def test_bulk_update_matches_goal_service(app, users):
+    """Every goal ends up with the value and completion GoalService gives it"""
+    with count_statements() as statements:
+        stats = update_all_goals()
+    bulk = goal_values()
+
+    reset_goals()
+    for goal in Goal.query.order_by(Goal.id).all():
+        GoalService.update_goal_progress(goal)
+    assert bulk == goal_values()
+
+    assert stats['goals'] == 18 and stats['failed'] == 0
+    assert stats['completed'] == sum(1 for _, completed in bulk.values() if completed)
+    assert stats['goals_per_second'] > 0
+    # Goals, one query per category, the bulk update and the next (empty) chunk
+    assert len(statements) <= 8, statements
+
+
+def test_shards_cover_every_goal_once(app, users):
+    """Shards of users together update exactly the goals a single pass does"""
+    update_goal_shard()
+    single = goal_values()
+    reset_goals()
+
+    counts = [update_goal_shard(shard, 2, chunk_size=4)['goals'] for shard in range(2)]
+    assert sum(counts) == 18 and all(counts)
+    assert goal_values() == single
+
+
+def test_changed_users_caches_are_invalidated(app, users):
+    """The bulk update bumps the data version of users whose goals changed"""
+    versions = [get_data_version(user_id) for user_id in users]
+    update_all_goals()
+    assert all(get_data_version(user_id) != version for user_id, version in zip(users, versions))
+
+    versions = [get_data_version(user_id) for user_id in users]
+    assert update_all_goals()['updated'] == 0
+    assert [get_data_version(user_id) for user_id in users] == versions
+
+
+def test_bad_goals_are_skipped(app, users):
+    """A goal that cannot be evaluated is counted and left alone, the rest are updated"""
+    db.session.add(Goal(user_id=users[0], category='sleep', target_value=400, unit='minutes', timeframe='yearly'))
+    db.session.commit()
+    stats = update_all_goals()
+    assert (stats['goals'], stats['failed']) == (19, 1)
+    assert stats['updated'] > 0
+
+
+def test_cli_reports_throughput(app, users):
+    result = app.test_cli_runner().invoke(args=['update-goals', '--chunk-size', '5'])
+    assert result.exit_code == 0, result.output
+    assert 'Updated progress for 18 goals' in result.output
+    assert 'goals/sec' in result.output
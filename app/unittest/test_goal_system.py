@@ -8,6 +8,7 @@ from app.models.weight import Weight
 from app.models.sleep import Sleep
 from app.models.heart_rate import HeartRate
 from app.services.goal_service import GoalService
+from app.unittest import count_statements
 from datetime import datetime, timedelta
 
 @pytest.fixture
@@ -240,6 +241,39 @@ class TestGoalProgress:
             # Goal should be completed
             assert goal.completed is True
     
+    def test_steps_goal_periods_in_one_query(self, app, test_user):
+        """Whole weeks and months are totalled from one rollup query, whatever the goal's length"""
+        with app.app_context():
+            for day, steps in [(datetime(2024, 1, 2), 9000), (datetime(2024, 1, 8), 5000),
+                               (datetime(2024, 1, 14), 6000), (datetime(2024, 6, 1), 9500)]:
+                db.session.add(Activity(user_id=test_user, activity_type='steps', value=steps,
+                                        total_steps=steps, timestamp=day + timedelta(hours=12)))
+            db.session.add(Activity(user_id=test_user, activity_type='steps', value=3000,
+                                    total_steps=3000, timestamp=datetime.utcnow()))
+            yearly = Goal(user_id=test_user, category='steps', target_value=10000, unit='steps',
+                          timeframe='daily', start_date=datetime(2024, 1, 1), end_date=datetime(2024, 12, 31))
+            weekly = Goal(user_id=test_user, category='steps', target_value=10000, unit='steps',
+                          timeframe='weekly', start_date=datetime(2024, 1, 3), end_date=datetime(2024, 1, 31))
+            monthly = Goal(user_id=test_user, category='steps', target_value=100000, unit='steps',
+                           timeframe='monthly', start_date=datetime.utcnow() - timedelta(days=40),
+                           end_date=datetime.utcnow() + timedelta(days=10))
+            db.session.add_all([yearly, weekly, monthly])
+            db.session.commit()
+
+            with count_statements() as statements:
+                GoalService._update_steps_goal(yearly)
+            assert len([sql for sql in statements if 'activity_daily_rollups' in sql]) == 1
+            # Past and never reached: the best day counts
+            assert (yearly.current_value, yearly.completed) == (9500, False)
+
+            # Jan 2 falls in the week of Jan 3, Jan 8-14 is the first week to reach the target
+            GoalService._update_steps_goal(weekly)
+            assert (weekly.current_value, weekly.completed) == (11000, True)
+
+            # Still running: this month's total so far
+            GoalService._update_steps_goal(monthly)
+            assert (monthly.current_value, monthly.completed) == (3000, False)
+    
     def test_weight_goal_progress(self, app, test_user, test_weights):
         """Test weight goal progress update"""
         with app.app_context():
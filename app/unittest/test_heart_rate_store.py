@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta
+import random
+import numpy as np
+import pytest
+from app import create_app, db
+from app.models import HeartRate
+from app.models.user import User
+from app.services.data_service import get_user_data_in_range
+from app.services.heart_rate_store import HeartRateStore
+
+START = datetime(2024, 5, 1)
+
+
+@pytest.fixture
+def app():
+    """Create and configure Flask application for testing"""
+    app = create_app(config_name='testing')
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def test_user(app):
+    """Create test user and return its ID"""
+    user = User(username='storeuser', email='store@example.com')
+    user.set_password('TestPassword123')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def insert_readings(user_id, readings):
+    """Core insert, as the import's BulkWriter does (no ORM events)"""
+    db.session.execute(HeartRate.__table__.insert(), [
+        {'user_id': user_id, 'timestamp': timestamp, 'value': value, 'unit': 'count/min', 'data_source': ''}
+        for timestamp, value in readings
+    ])
+    db.session.commit()
+
+
+def random_readings(count, start=START, days=10, seed=5505):
+    rng = random.Random(seed)
+    return [(start + timedelta(seconds=rng.randint(0, days * 86400)), rng.randint(45, 180)) for _ in range(count)]
+
+
+def test_load_slices_like_a_range_query(app, test_user):
+    """Memory-mapped arrays give the same readings as filtering the table"""
+    readings = random_readings(500)
+    insert_readings(test_user, readings)
+    insert_readings(test_user + 1, random_readings(50, seed=1))
+
+    series = HeartRateStore().load(test_user)
+    assert isinstance(series.timestamps, np.memmap)
+    assert series.timestamps.dtype == np.int64 and series.values.dtype == np.int16
+    assert len(series) == 500
+
+    start, end = START + timedelta(days=2, hours=5), START + timedelta(days=6)
+    window = series.between(start, end)
+    expected = sorted((t, v) for t, v in readings if start <= t <= end)
+    assert window.datetimes().astype(object).tolist() == [t for t, _ in expected]
+    assert window.values.tolist() == [v for _, v in expected]
+    assert window.stats()['count'] == len(expected)
+    assert series.tail(3).values.tolist() == [v for _, v in sorted(readings)[-3:]]
+    assert series.days() == sorted({t.date() for t, _ in readings})
+
+
+def test_refresh_appends_or_rebuilds(app, test_user):
+    """New readings are appended; rows older than the arrays force a rebuild"""
+    store = HeartRateStore()
+    insert_readings(test_user, random_readings(100))
+    store.load(test_user)
+
+    later = random_readings(20, start=START + timedelta(days=11), seed=2)
+    insert_readings(test_user, later)
+    assert len(store.load(test_user)) == 100
+    assert len(store.refresh(test_user)) == 120
+
+    earlier = random_readings(5, start=START - timedelta(days=3), days=1, seed=3)
+    insert_readings(test_user, earlier)
+    series = store.refresh(test_user)
+    assert len(series) == 125
+    assert np.all(np.diff(series.timestamps) >= 0)
+
+
+def test_orm_writes_invalidate_store(app, test_user):
+    """Rows written through the session drop the arrays, the next load rebuilds them"""
+    store = HeartRateStore()
+    insert_readings(test_user, random_readings(10))
+    assert len(store.load(test_user)) == 10
+
+    db.session.add(HeartRate(user_id=test_user, timestamp=START, value=60, unit='bpm'))
+    db.session.commit()
+    assert not store.exists(test_user)
+    assert len(store.load(test_user)) == 11
+
+
+def test_data_service_groups_heart_rates_by_day_and_hour(app, test_user):
+    """Per-day and per-hour stats from the arrays match grouping the rows"""
+    readings = random_readings(300, days=3)
+    insert_readings(test_user, readings)
+
+    for group_by, key_format in (('day', '%Y-%m-%d'), ('hour', '%Y-%m-%d %H:00')):
+        data = get_user_data_in_range(test_user, START, START + timedelta(days=3), include_weight=False,
+                                      include_activity=False, include_sleep=False, include_goals=False,
+                                      include_achievements=False, group_by=group_by)
+        groups = {}
+        for timestamp, value in readings:
+            groups.setdefault(timestamp.strftime(key_format), []).append(value)
+        assert [row['date'] for row in data['heart_rates']] == sorted(groups)
+        for row in data['heart_rates']:
+            values = groups[row['date']]
+            assert row['avg_heart_rate'] == pytest.approx(sum(values) / len(values))
+            assert (row['min_heart_rate'], row['max_heart_rate']) == (min(values), max(values))
+
+    values = [value for _, value in readings]
+    assert data['heart_rate_stats']['avg'] == pytest.approx(sum(values) / len(values))
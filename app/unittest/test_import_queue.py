@@ -0,0 +1,126 @@
+import io
+import os
+import socket
+import subprocess
+import sys
+from datetime import datetime, timedelta
+import pytest
+from werkzeug.datastructures import FileStorage
+from app import create_app, db
+from app.models import ImportLog, HeartRate, Activity
+from app.models.user import User
+from app.services.import_queue import claim_next_job, requeue_stale_jobs, run_worker, worker_alive
+from app.services.upload_service import UploadService
+from app.unittest.test_apple_health_parser import SAMPLE_EXPORT
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Create and configure Flask application for testing"""
+    app = create_app(config_name='testing')
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.config['UPLOAD_FOLDER'] = str(tmp_path / 'uploads')
+    app.config['IMPORT_QUEUE_ENABLED'] = True
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def test_user(app):
+    """Create test user and return its ID"""
+    user = User(username='queueuser', email='queue@example.com')
+    user.set_password('TestPassword123')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def export_upload():
+    return FileStorage(stream=io.BytesIO(SAMPLE_EXPORT.encode()), filename='export.xml')
+
+
+def test_enqueue_and_worker_completes_job(app, test_user):
+    """Queued uploads are picked up by a worker and imported completely"""
+    import_log = UploadService(test_user).enqueue_file(export_upload(), 'apple_health')
+    import_log_id = import_log.id
+    assert import_log.status == 'queued'
+    assert import_log.file_path.endswith('export.xml')
+
+    assert run_worker('test-worker', once=True) == 1
+
+    import_log = db.session.get(ImportLog, import_log_id)
+    assert import_log.status == 'success'
+    assert import_log.progress == 100
+    assert import_log.worker_id == 'test-worker'
+    assert import_log.started_at is not None and import_log.completed_at is not None
+    assert import_log.heartbeat_at >= import_log.started_at
+    assert HeartRate.query.filter_by(user_id=test_user).count() == 1
+    assert Activity.query.filter_by(user_id=test_user).count() == 4
+
+
+def test_job_is_claimed_only_once(app, test_user):
+    """A second worker cannot claim a job that is already running"""
+    import_log = UploadService(test_user).enqueue_file(export_upload(), 'apple_health')
+
+    job = claim_next_job('worker-a')
+    assert job.id == import_log.id
+    assert job.status == 'running'
+    assert claim_next_job('worker-b') is None
+
+    # Orphaned running jobs go back to the queue
+    assert requeue_stale_jobs(-1) == 1
+    assert claim_next_job('worker-b').worker_id == 'worker-b'
+
+
+def test_only_quiet_jobs_of_dead_workers_are_requeued(app, test_user):
+    """Long-running jobs that keep writing progress, or whose worker is alive, keep running"""
+    finished = subprocess.Popen([sys.executable, '-c', 'pass'])
+    finished.wait()
+    host = socket.gethostname()
+    assert worker_alive(f"{host}:{os.getpid()}:0") is True
+    assert worker_alive(f"{host}:{finished.pid}:0") is False
+    assert worker_alive('other-host:1:0') is None and worker_alive('worker-a') is None
+
+    long_ago = datetime.utcnow() - timedelta(hours=12)
+    jobs = {}
+    for name, worker_id, heartbeat_at in (
+        ('busy', f"{host}:{finished.pid}:0", datetime.utcnow()),
+        ('alive', f"{host}:{os.getpid()}:0", long_ago),
+        ('dead', f"{host}:{finished.pid}:1", long_ago),
+        ('remote', 'other-host:1:0', None),
+    ):
+        import_log = ImportLog(user_id=test_user, data_source='apple_health', file_name=f'{name}.xml',
+                               status='running', worker_id=worker_id, started_at=long_ago, heartbeat_at=heartbeat_at)
+        db.session.add(import_log)
+        jobs[name] = import_log
+    db.session.commit()
+
+    assert requeue_stale_jobs(60 * 60) == 2
+    assert {name: job.status for name, job in jobs.items()} == {
+        'busy': 'running', 'alive': 'running', 'dead': 'queued', 'remote': 'queued',
+    }
+    assert jobs['dead'].worker_id is None and jobs['dead'].heartbeat_at is None
+
+
+def test_upload_route_enqueues_and_reports_status(app, test_user):
+    """The upload endpoint returns immediately with a status URL"""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(test_user)
+        session['_fresh'] = True
+
+    response = client.post('/upload', data={'file': export_upload(), 'dataSource': 'apple_health'},
+                           headers={'Accept': 'application/json'}, content_type='multipart/form-data')
+    assert response.status_code == 202
+    payload = response.get_json()
+    assert payload['queued'] is True
+
+    status = client.get(payload['status_url']).get_json()
+    assert status['import_log']['status'] == 'queued'
+    assert status['queue_position'] == 1
@@ -0,0 +1,72 @@
+from datetime import datetime
+import os
+import pytest
+from sqlalchemy import create_engine, func, text
+from app import create_app, db
+from app.models import HeartRate, Weight, Activity, Sleep
+
+START = datetime(2024, 5, 1)
+END = datetime(2024, 6, 1)
+
+# Route-shaped queries and the index each one should be answered from
+RANGE_QUERIES = {
+    'ix_heart_rates_user_timestamp': db.select(HeartRate.timestamp, HeartRate.value).where(
+        HeartRate.user_id == 1, HeartRate.timestamp >= START, HeartRate.timestamp <= END
+    ).order_by(HeartRate.timestamp),
+    'ix_weights_user_timestamp': db.select(Weight.timestamp, Weight.value).where(
+        Weight.user_id == 1, Weight.timestamp >= START, Weight.timestamp <= END
+    ).order_by(Weight.timestamp),
+    'ix_activities_user_type_timestamp': db.select(func.sum(Activity.value)).where(
+        Activity.user_id == 1, Activity.activity_type == 'steps',
+        Activity.timestamp >= START, Activity.timestamp < END
+    ),
+    'ix_sleeps_user_timestamp': db.select(Sleep).where(
+        Sleep.user_id == 1, Sleep.timestamp >= START, Sleep.timestamp < END
+    ).order_by(Sleep.timestamp),
+}
+
+
+@pytest.fixture
+def app():
+    """Create and configure Flask application for testing"""
+    app = create_app(config_name='testing')
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def compiled(query, dialect):
+    return str(query.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+
+
+@pytest.mark.parametrize('index_name', list(RANGE_QUERIES))
+def test_sqlite_range_queries_use_composite_indexes(app, index_name):
+    """Each per-user time range is a SEARCH on its composite index, never a table scan"""
+    sql = compiled(RANGE_QUERIES[index_name], db.engine.dialect)
+    plan = ' '.join(row[-1] for row in db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}')))
+
+    assert f'INDEX {index_name}' in plan, plan
+    assert 'SCAN' not in plan, plan
+
+
+@pytest.mark.skipif(not os.environ.get('TEST_POSTGRES_URL'),
+                    reason='set TEST_POSTGRES_URL to check PostgreSQL plans')
+def test_postgres_range_queries_use_composite_indexes(app):
+    """PostgreSQL plans the same queries from the same indexes (empty tables, so seq scans are disabled)"""
+    engine = create_engine(os.environ['TEST_POSTGRES_URL'])
+    db.metadata.create_all(engine)
+    try:
+        with engine.connect() as connection:
+            connection.execute(text('SET enable_seqscan = off'))
+            for index_name, query in RANGE_QUERIES.items():
+                sql = compiled(query, engine.dialect)
+                plan = '\n'.join(row[0] for row in connection.execute(text(f'EXPLAIN {sql}')))
+                assert index_name in plan, plan
+    finally:
+        db.metadata.drop_all(engine)
+        engine.dispose()
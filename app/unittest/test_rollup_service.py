@@ -0,0 +1,148 @@
+from datetime import date, datetime, timedelta
+import random
+import pytest
+from app import create_app, db
+from app.models import HeartRate, Weight, Activity, Sleep, ImportLog
+from app.models.rollup import (
+    ActivityDailyRollup, HeartRateDailyRollup, HeartRateHourlyRollup, SleepDailyRollup, WeightDailyRollup
+)
+from app.models.user import User
+from app.services.data_import import DataImportService
+from app.services.rollup_service import ROLLUP_SPECS, rebuild_rollups
+from app.services.time_bucket_service import aggregate_rollup_slots, aggregate_time_slots
+from app.utils.chart_utils import generate_time_slots
+
+START = datetime(2024, 5, 1)
+
+
+@pytest.fixture
+def app():
+    """Create and configure Flask application for testing"""
+    app = create_app(config_name='testing')
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def test_user(app):
+    """Create test user and return its ID"""
+    user = User(username='rollupuser', email='rollup@example.com')
+    user.set_password('TestPassword123')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def rollup_rows():
+    """Contents of every rollup table, without ids and timestamps"""
+    contents = {}
+    for spec in ROLLUP_SPECS:
+        columns = [c for c in spec.rollup.__table__.c if c.name not in ('id', 'updated_at')]
+        rows = db.session.execute(db.select(*columns)).all()
+        contents[spec.rollup.__tablename__] = sorted(
+            tuple(round(v, 6) if isinstance(v, float) else v for v in row) for row in rows
+        )
+    return contents
+
+
+class FakeParser:
+    """Streaming parser yielding prepared rows"""
+    stats = None
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def iter_rows(self):
+        yield from self.rows
+
+
+def test_import_batches_keep_rollups_in_step(app, test_user):
+    """Rollups written batch by batch during an import equal a full rebuild and the raw aggregates"""
+    rng = random.Random(5505)
+    rows = []
+    for i in range(500):
+        stamp = (START + timedelta(minutes=rng.randint(0, 60 * 24 * 14))).strftime('%Y-%m-%d %H:%M:%S')
+        rows.append(('heart_rate', {'timestamp': stamp, 'value': rng.randint(45, 180), 'unit': 'count/min'}))
+        if i % 5 == 0:
+            rows.append(('weight', {'timestamp': stamp, 'value': rng.uniform(60, 80), 'unit': 'kg'}))
+            rows.append(('activity', {'start_time': stamp, 'value': rng.randint(100, 3000), 'unit': 'count',
+                                      'activity_type': rng.choice(['steps', 'distance'])}))
+    import_log = ImportLog(user_id=test_user, data_source='apple_health', file_name='export.xml', status='processing')
+    db.session.add(import_log)
+    db.session.commit()
+
+    service = DataImportService(test_user, import_log)
+    for writer in [service._writer(model) for model in (HeartRate, Weight, Activity)]:
+        writer.batch_size = 64
+    service.import_stream(FakeParser(rows))
+
+    imported = rollup_rows()
+    assert imported['heart_rate_daily_rollups']
+    rebuild_rollups(test_user)
+    assert rollup_rows() == imported
+
+    totals = db.session.query(db.func.sum(HeartRateDailyRollup.total), db.func.sum(HeartRateDailyRollup.count)).one()
+    raw = db.session.query(db.func.sum(HeartRate.value), db.func.count(HeartRate.id)).one()
+    assert totals == pytest.approx(raw)
+    assert db.session.query(db.func.sum(HeartRateHourlyRollup.count)).scalar() == raw[1]
+    steps = db.session.query(db.func.sum(ActivityDailyRollup.steps)).scalar()
+    assert steps == db.session.query(db.func.sum(Activity.value)).filter(Activity.activity_type == 'steps').scalar()
+
+
+def test_orm_writes_refresh_rollups(app, test_user):
+    """Adding, moving and deleting single records through the session updates the affected days"""
+    weight = Weight(user_id=test_user, timestamp=START + timedelta(hours=8), value=70, unit='kg')
+    db.session.add_all([
+        weight,
+        Weight(user_id=test_user, timestamp=START + timedelta(hours=20), value=72, unit='kg'),
+        Sleep(user_id=test_user, timestamp=START, start_time=START, end_time=START + timedelta(hours=7),
+              duration=420, deep_sleep=90),
+    ])
+    db.session.commit()
+
+    day = WeightDailyRollup.query.filter_by(user_id=test_user, day=START.date()).one()
+    assert (day.min_value, day.max_value, day.total, day.count) == (70, 72, 142, 2)
+    assert SleepDailyRollup.query.filter_by(user_id=test_user).one().deep_sleep == 90
+
+    weight.timestamp = START + timedelta(days=1, hours=8)
+    db.session.commit()
+    days = {r.day: r.count for r in WeightDailyRollup.query.filter_by(user_id=test_user)}
+    assert days == {START.date(): 1, START.date() + timedelta(days=1): 1}
+
+    db.session.delete(weight)
+    db.session.commit()
+    assert [r.day for r in WeightDailyRollup.query.filter_by(user_id=test_user)] == [START.date()]
+
+
+@pytest.mark.parametrize('rollup, period, start_date, end_date', [
+    (HeartRateHourlyRollup, 'daily', datetime(2024, 5, 15), datetime(2024, 5, 16) - timedelta(microseconds=1)),
+    (HeartRateDailyRollup, 'weekly', datetime(2024, 5, 9), datetime(2024, 5, 15, 13, 45)),
+    (HeartRateDailyRollup, 'six_months', datetime(2023, 11, 18), datetime(2024, 5, 15, 13, 45)),
+])
+def test_aggregate_rollup_slots_matches_raw(app, test_user, rollup, period, start_date, end_date):
+    """Slot stats from the rollups equal those computed from raw rows"""
+    time_slots = generate_time_slots(period, start_date, end_date)
+    rng = random.Random(5505)
+    # Readings stop at the end of the range, which is the current time for the charts
+    first = time_slots[0]['start']
+    span = (end_date - first).total_seconds()
+    db.session.add_all([
+        HeartRate(user_id=test_user, timestamp=first + timedelta(seconds=rng.uniform(-0.05, 1) * span),
+                  value=rng.randint(45, 180), unit='bpm', data_source=str(i))
+        for i in range(400)
+    ])
+    db.session.commit()
+
+    expected = aggregate_time_slots(HeartRate, test_user, time_slots)
+    data = aggregate_rollup_slots(rollup, test_user, time_slots)
+
+    assert list(data) == list(expected)
+    for label, stats in expected.items():
+        assert data[label] == pytest.approx(stats), label
+    assert isinstance(HeartRateDailyRollup.query.first().day, date)
@@ -0,0 +1,162 @@
+import random
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import insert
+from app import create_app, db, cache
+from app.models import Activity, Goal, Sleep, Weight
+from app.models.achievement import Achievement
+from app.models.streak import Streak
+from app.models.user import User
+from app.services.achievement_rules import AchievementRuleQuery, Rule
+from app.services.achievement_stats import get_stats
+from app.services.rollup_service import rebuild_rollups, refresh_rollups_for_rows
+from app.services.streak_service import STREAK_SPECS, compute_streak, get_streaks, runs_from_days
+from app.unittest import count_statements
+
+TODAY = datetime.utcnow().date()
+NOON = datetime.combine(TODAY, datetime.min.time()) + timedelta(hours=12)
+STREAK_COLUMNS = ('current_length', 'current_start', 'current_end', 'longest_length', 'longest_start', 'longest_end')
+
+
+@pytest.fixture
+def app():
+    """Create and configure Flask application for testing"""
+    app = create_app(config_name='testing')
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        db.create_all()
+        cache.clear()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def test_user(app):
+    """Create test user and return its ID"""
+    user = User(username='streakuser', email='streak@example.com')
+    user.set_password('TestPassword123')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def steps(user_id, days_ago, value):
+    return Activity(user_id=user_id, activity_type='steps', value=value, total_steps=value,
+                    timestamp=NOON - timedelta(days=days_ago))
+
+
+def stored(user_id, metric):
+    streak = get_streaks(user_id)[metric]
+    return {name: getattr(streak, name) for name in STREAK_COLUMNS}
+
+
+def computed(user_id, metric, method=None):
+    return compute_streak(db.session.connection(), STREAK_SPECS[metric], user_id, method)
+
+
+def test_sql_and_numpy_runs_agree(app, test_user):
+    """The gaps-and-islands query and run-length encoding find the same runs"""
+    random.seed(5505)
+    days = sorted(random.sample(range(200), 120))
+    db.session.add_all([Weight(user_id=test_user, value=70, unit='kg', timestamp=NOON - timedelta(days=day))
+                        for day in days])
+    db.session.commit()
+
+    result = computed(test_user, 'weight', 'sql')
+    assert result == computed(test_user, 'weight', 'numpy')
+
+    dates = sorted(TODAY - timedelta(days=day) for day in days)
+    runs = runs_from_days(dates)
+    assert sum(run.length for run in runs) == len(dates)
+    assert result['longest_length'] == max(run.length for run in runs)
+    assert (result['current_end'], result['current_length']) == (runs[-1].end, runs[-1].length)
+    assert runs_from_days([]) == []
+    assert computed(test_user, 'sleep') == computed(test_user, 'sleep', 'numpy') == {
+        'current_length': 0, 'current_start': None, 'current_end': None,
+        'longest_length': 0, 'longest_start': None, 'longest_end': None,
+    }
+
+
+def test_incremental_updates_match_a_full_computation(app, test_user):
+    """Streak rows follow ORM writes and deletes as if recomputed every time"""
+    db.session.add_all([steps(test_user, day, 6000) for day in (20, 19, 18, 10, 9, 2, 1)])
+    db.session.commit()
+    assert stored(test_user, 'steps') == computed(test_user, 'steps')
+    assert (stored(test_user, 'steps')['longest_length'], stored(test_user, 'steps')['current_length']) == (3, 2)
+
+    # Days below the target do not count; today's steps extend the latest run
+    db.session.add_all([steps(test_user, 5, 4000), steps(test_user, 0, 5000)])
+    db.session.commit()
+    assert stored(test_user, 'steps') == computed(test_user, 'steps')
+    assert (stored(test_user, 'steps')['longest_length'], stored(test_user, 'steps')['current_length']) == (3, 3)
+
+    # Filling the gap joins two runs into the longest
+    db.session.add_all([steps(test_user, day, 7000) for day in range(11, 18)])
+    db.session.commit()
+    assert stored(test_user, 'steps') == computed(test_user, 'steps')
+    assert stored(test_user, 'steps')['longest_length'] == 12
+
+    # Deleting a day splits it again
+    db.session.delete(Activity.query.filter_by(user_id=test_user, timestamp=NOON - timedelta(days=14)).one())
+    db.session.commit()
+    assert stored(test_user, 'steps') == computed(test_user, 'steps')
+    assert stored(test_user, 'steps')['longest_length'] == 6
+
+
+def test_import_batches_update_streaks(app, test_user):
+    """Rows written by Core inserts are applied from the rollup refresh after each batch"""
+    get_streaks(test_user)
+    for first in (30, 10, 20):
+        rows = [{'user_id': test_user, 'duration': 420, 'unit': 'minutes', 'timestamp': NOON - timedelta(days=day),
+                 'start_time': NOON - timedelta(days=day), 'end_time': NOON - timedelta(days=day, hours=-7)}
+                for day in range(first, first + 10, 2 if first == 30 else 1)]
+        db.session.execute(insert(Sleep), rows)
+        refresh_rollups_for_rows(Sleep, rows)
+        db.session.commit()
+        assert stored(test_user, 'sleep') == computed(test_user, 'sleep')
+    assert stored(test_user, 'sleep')['longest_length'] == 21
+
+    rebuild_rollups(test_user)
+    assert Streak.query.filter_by(user_id=test_user).count() == 0
+    assert stored(test_user, 'sleep')['longest_length'] == 21
+
+
+def test_current_streak_ends_after_a_missed_day(app, test_user):
+    db.session.add_all([steps(test_user, day, 6000) for day in (3, 2, 1)])
+    db.session.add(Achievement(name='On a roll', description='', category='steps', icon='fire', level='bronze',
+                               condition_type='current', condition_value=3))
+    db.session.commit()
+    streak = get_streaks(test_user)['steps']
+    assert [streak.current(TODAY + timedelta(days=offset)) for offset in (0, 1)] == [3, 0]
+    assert streak.to_dict()['current'] == 3
+
+    get_stats(test_user)
+    rules = {('steps', 'current'): Rule('steps', 'current_streak')}
+    assert [a.name for a in AchievementRuleQuery(test_user, rules).fetch()] == ['On a roll']
+    assert AchievementRuleQuery(test_user, rules, today=TODAY + timedelta(days=1)).fetch() == []
+
+
+def test_goal_pages_read_stored_streaks(app, test_user):
+    """Goal pages and the dashboard goals panel show streaks from the Streak rows"""
+    db.session.add_all([steps(test_user, day, 6000) for day in (4, 3, 2, 1, 0)])
+    goal = Goal(user_id=test_user, category='steps', target_value=10000, unit='steps', timeframe='daily')
+    db.session.add(goal)
+    db.session.commit()
+    goal_id = goal.id
+    get_streaks(test_user)
+
+    with count_statements() as statements:
+        assert get_streaks(test_user)['steps'].current() == 5
+    assert len(statements) == 1
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(test_user)
+        session['_fresh'] = True
+    assert b'5 days (best 5)' in client.get('/goals/').data
+    assert b'5 days (best 5)' in client.get(f'/goals/{goal_id}').data
+    assert b'5-day streak' in client.get('/dashboard/goals-achievements').data
@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+import random
+import pytest
+from app import create_app, db
+from app.models import HeartRate, Activity
+from app.models.user import User
+from app.services.time_bucket_service import aggregate_time_slots
+from app.utils.chart_utils import generate_time_slots
+
+NOW = datetime(2024, 5, 15, 13, 45)
+PERIOD_RANGES = {
+    'daily': (datetime(2024, 5, 15), datetime(2024, 5, 16) - timedelta(microseconds=1)),
+    'weekly': (datetime(2024, 5, 9), NOW),
+    'monthly': (datetime(2024, 4, 16), NOW),
+    'six_months': (datetime(2023, 11, 18), NOW),
+    'yearly': (datetime(2023, 6, 1), NOW),
+}
+
+
+@pytest.fixture
+def app():
+    """Create and configure Flask application for testing"""
+    app = create_app(config_name='testing')
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def test_user(app):
+    """Create test user and return its ID"""
+    user = User(username='chartuser', email='chart@example.com')
+    user.set_password('TestPassword123')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def slot_loop(readings, time_slots):
+    """The per-row aggregation the heart rate routes used before"""
+    data = {slot['label']: {'min': float('inf'), 'max': float('-inf'), 'avg': 0, 'count': 0, 'total': 0}
+            for slot in time_slots}
+    for timestamp, value in readings:
+        for slot in time_slots:
+            if slot['start'] <= timestamp < slot['end']:
+                stats = data[slot['label']]
+                stats['min'] = min(stats['min'], value)
+                stats['max'] = max(stats['max'], value)
+                stats['total'] += value
+                stats['count'] += 1
+                break
+    for stats in data.values():
+        if stats['count'] > 0:
+            stats['avg'] = round(stats['total'] / stats['count'], 1)
+        if stats['min'] == float('inf'):
+            stats['min'] = 0
+        if stats['max'] == float('-inf'):
+            stats['max'] = 0
+    return data
+
+
+@pytest.mark.parametrize('period', list(PERIOD_RANGES))
+def test_aggregate_time_slots_matches_row_loop(app, test_user, period):
+    """SQL bucketing gives the same per-slot stats as the per-row loop, including the range edges"""
+    start_date, end_date = PERIOD_RANGES[period]
+    time_slots = generate_time_slots(period, start_date, end_date)
+    rng = random.Random(5505)
+    span = (end_date - start_date).total_seconds()
+    timestamps = [start_date + timedelta(seconds=rng.uniform(-0.05, 1.05) * span) for _ in range(400)]
+    timestamps += [start_date, end_date, time_slots[1]['start'], time_slots[-1]['start']]
+    readings = [(timestamp, rng.randint(45, 180)) for timestamp in timestamps]
+    db.session.add_all([
+        HeartRate(user_id=test_user, timestamp=timestamp, value=value, unit='bpm', data_source=str(i))
+        for i, (timestamp, value) in enumerate(readings)
+    ])
+    db.session.commit()
+
+    data = aggregate_time_slots(HeartRate, test_user, time_slots)
+
+    expected = slot_loop(readings, time_slots)
+    assert list(data) == list(expected)
+    for label, stats in expected.items():
+        assert data[label] == pytest.approx(stats), label
+
+
+def test_aggregate_time_slots_applies_filters(app, test_user):
+    """Extra filters narrow the rows, other users' rows are never counted"""
+    time_slots = generate_time_slots('weekly', *PERIOD_RANGES['weekly'])
+    day = time_slots[2]['start'] + timedelta(hours=9)
+    db.session.add_all([
+        Activity(user_id=test_user, timestamp=day, activity_type='steps', value=1000, unit='count'),
+        Activity(user_id=test_user, timestamp=day, activity_type='distance', value=0.8, unit='km'),
+        Activity(user_id=test_user + 1, timestamp=day, activity_type='steps', value=50, unit='count'),
+    ])
+    db.session.commit()
+
+    data = aggregate_time_slots(Activity, test_user, time_slots, filters=[Activity.activity_type == 'steps'])
+
+    assert data[time_slots[2]['label']] == {'min': 1000, 'max': 1000, 'avg': 1000, 'count': 1, 'total': 1000}
+    assert sum(stats['count'] for stats in data.values()) == 1
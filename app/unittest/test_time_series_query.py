@@ -0,0 +1,138 @@
+from datetime import datetime, timedelta
+import random
+import pytest
+from app import create_app, db, cache
+from app.models import HeartRate, Weight, Activity, Sleep
+from app.models.user import User
+from app.services.time_series_query import (
+    PERIODS, QUERY_TIMINGS, TimeSeriesQuery, _heart_rate_rollup, _heart_rate_store
+)
+
+START = datetime(2024, 5, 9)
+END = datetime(2024, 5, 15, 13, 45)
+
+
+@pytest.fixture
+def app():
+    """Create and configure Flask application for testing"""
+    app = create_app(config_name='testing')
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+
+    with app.app_context():
+        db.create_all()
+        cache.clear()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def test_user(app):
+    """Create test user and return its ID"""
+    user = User(username='seriesuser', email='series@example.com')
+    user.set_password('TestPassword123')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def test_sources_are_chosen_per_metric_and_range(app, test_user):
+    """Aligned slots read the rollups, hourly weight uses SQL, unaligned heart rate uses the store"""
+    rng = random.Random(5505)
+    db.session.add_all([
+        HeartRate(user_id=test_user, timestamp=START + timedelta(minutes=rng.randint(0, 9000)),
+                  value=rng.randint(45, 180), unit='bpm', data_source=str(i))
+        for i in range(300)
+    ] + [Weight(user_id=test_user, timestamp=START + timedelta(hours=i * 7), value=70 + i, unit='kg') for i in range(20)])
+    db.session.commit()
+
+    assert TimeSeriesQuery('heart_rate', test_user, 'weekly', START, END).slot_data()[0] == 'rollup'
+    assert TimeSeriesQuery('weight', test_user, 'weekly', START, END).slot_data()[0] == 'rollup'
+    day = datetime(2024, 5, 10)
+    assert TimeSeriesQuery('weight', test_user, 'daily', day, day + timedelta(days=1)).slot_data()[0] == 'sql'
+    assert TimeSeriesQuery('heart_rate', test_user, 'daily', day, day + timedelta(days=1)).slot_data()[0] == 'rollup'
+
+    unaligned = TimeSeriesQuery('heart_rate', test_user, 'daily', day + timedelta(minutes=30), END)
+    source, data = unaligned.slot_data()
+    assert source == 'store'
+    assert sum(stats['count'] for stats in data.values()) == HeartRate.query.filter(
+        HeartRate.timestamp >= unaligned.start_date, HeartRate.timestamp < END
+    ).count()
+
+    weekly = TimeSeriesQuery('heart_rate', test_user, 'weekly', START, END)
+    rollup = _heart_rate_rollup(weekly)
+    for label, stats in _heart_rate_store(weekly).items():
+        assert (stats['min'], stats['max'], stats['count']) == \
+            (rollup[label]['min'], rollup[label]['max'], rollup[label]['count']), label
+
+
+def test_activity_rules(app, test_user):
+    """Device totals keep the maximum, typed records add up, long periods average the active days"""
+    day = datetime(2024, 5, 10, 9)
+    db.session.add_all([
+        Activity(user_id=test_user, timestamp=day, activity_type='steps', value=500, unit='count'),
+        Activity(user_id=test_user, timestamp=day + timedelta(hours=1), activity_type='steps', value=700, unit='count'),
+        Activity(user_id=test_user, timestamp=day + timedelta(hours=2), activity_type='summary', value=0, unit='count',
+                 total_steps=3000, total_distance=2.5, calories=180),
+        Activity(user_id=test_user, timestamp=day + timedelta(days=2), activity_type='steps', value=1000, unit='count'),
+    ])
+    db.session.commit()
+
+    _, weekly = TimeSeriesQuery('activity', test_user, 'weekly', START, END).slot_data()
+    assert weekly['Fri, 10'] == {'steps': 3000, 'distance': 2.5, 'calories': 180, 'count': 3}
+    assert weekly['Sun, 12']['steps'] == 1000
+
+    _, six_months = TimeSeriesQuery('activity', test_user, 'six_months', datetime(2024, 5, 6), END).slot_data()
+    assert six_months['May 06-May 12']['steps'] == 2000
+    assert six_months['May 06-May 12']['days'] == 2
+
+
+def test_sleep_rules(app, test_user):
+    """Short periods keep one night per slot (Connect first), long periods average, >12h nights are dropped"""
+    night = datetime(2024, 5, 10, 23)
+    db.session.add_all([
+        Sleep(user_id=test_user, timestamp=night, start_time=night, end_time=night, duration=360, deep_sleep=60),
+        Sleep(user_id=test_user, timestamp=night + timedelta(minutes=10), start_time=night + timedelta(minutes=10), end_time=night,
+              duration=480, deep_sleep=90, notes='Connect'),
+        Sleep(user_id=test_user, timestamp=night + timedelta(minutes=20), start_time=night + timedelta(minutes=20), end_time=night,
+              duration=900, deep_sleep=300),
+    ])
+    db.session.commit()
+
+    _, weekly = TimeSeriesQuery('sleep', test_user, 'weekly', START, END).slot_data()
+    assert (weekly['Fri, 10']['total_duration'], weekly['Fri, 10']['deep_sleep']) == (8.0, 1.5)
+
+    _, yearly = TimeSeriesQuery('sleep', test_user, 'yearly', datetime(2024, 1, 1), END).slot_data()
+    assert (yearly['May']['total_duration'], yearly['May']['count']) == (7.0, 2)
+
+
+def test_chart_data_is_cached_and_timed(app, test_user):
+    """A repeated query is a cache hit until the user's data changes; all are recorded in the timings"""
+    QUERY_TIMINGS.reset()
+    first = TimeSeriesQuery('weight', test_user, 'weekly', START, END).chart_data()
+    assert TimeSeriesQuery('weight', test_user, 'weekly', START, END).chart_data() == first
+    db.session.add(Weight(user_id=test_user, timestamp=START, value=80, unit='kg'))
+    db.session.commit()
+    assert TimeSeriesQuery('weight', test_user, 'weekly', START, END).chart_data() != first
+
+    report = QUERY_TIMINGS.report()['weight']
+    assert report['rollup']['count'] == 2 and report['cache']['count'] == 1
+    assert [dataset['label'] for dataset in first['datasets']] == ['Weight (kg)']
+
+    with pytest.raises(ValueError):
+        TimeSeriesQuery('steps', test_user, 'weekly')
+    with pytest.raises(ValueError):
+        TimeSeriesQuery('weight', test_user, 'hourly')
+
+
+@pytest.mark.parametrize('endpoint', ['activities', 'heartbeats', 'sleep', 'weight'])
+def test_chart_routes_render(app, test_user, endpoint):
+    """Every period page of every chart blueprint renders"""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(test_user)
+        session['_fresh'] = True
+    for period in PERIODS:
+        response = client.get(f'/{endpoint}/{period}')
+        assert response.status_code == 200, period
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+import pytest
+from app.utils import timestamp_parser
+from app.utils.timestamp_parser import (
+    offset_tzinfo, parse_timestamp, parse_timestamp_column, timestamp_sort_key
+)
+
+PERTH = timezone(timedelta(hours=8))
+NEWFOUNDLAND = timezone(-timedelta(hours=3, minutes=30))
+
+EXPECTED = {
+    '2020-07-26 17:23:00 +0800': datetime(2020, 7, 26, 17, 23, tzinfo=PERTH),
+    '2020-07-26T17:23:00+08:00': datetime(2020, 7, 26, 17, 23, tzinfo=PERTH),
+    '2020-07-26 17:23:00+0800': datetime(2020, 7, 26, 17, 23, tzinfo=PERTH),
+    '2020-07-26 17:23:00 -0330': datetime(2020, 7, 26, 17, 23, tzinfo=NEWFOUNDLAND),
+    '2020-07-26 17:23:00Z': datetime(2020, 7, 26, 17, 23, tzinfo=timezone.utc),
+    '2020-07-26 17:23:00.25 +0800': datetime(2020, 7, 26, 17, 23, 0, 250000, tzinfo=PERTH),
+    '2020-07-26 17:23:00': datetime(2020, 7, 26, 17, 23),
+    '2020-07-26': datetime(2020, 7, 26),
+}
+
+
+@pytest.mark.parametrize('native', [True, False])
+def test_parse_timestamp_layouts(monkeypatch, native):
+    """Both the native 3.11 path and the memoized-offset path agree on every layout"""
+    monkeypatch.setattr(timestamp_parser, 'NATIVE_ISO_OFFSETS', native)
+    for value, expected in EXPECTED.items():
+        parsed = parse_timestamp(value)
+        assert parsed == expected and parsed.utcoffset() == expected.utcoffset(), value
+
+    for value in ['garbage', '', None, '2020-13-01 00:00:00 +0800']:
+        with pytest.raises(ValueError):
+            parse_timestamp(value)
+
+
+def test_offset_tzinfo_is_memoized():
+    """Every timestamp with the same suffix shares one tzinfo object"""
+    assert offset_tzinfo(' +0800') is offset_tzinfo(' +0800')
+    assert offset_tzinfo(' +0800') == PERTH
+    assert offset_tzinfo('') is None
+
+
+def test_parse_timestamp_column_matches_scalar_parser():
+    """The batch API gives the same local and UTC times as parse_timestamp, NaT for bad values"""
+    values = pd.Series(list(EXPECTED) + ['garbage', None, '2023-02-30 10:00:00 +0800'])
+    instants, local = parse_timestamp_column(values)
+
+    for position, value in enumerate(EXPECTED):
+        parsed = EXPECTED[value]
+        utc = parsed.astimezone(timezone.utc) if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+        assert local[position].to_pydatetime() == parsed.replace(tzinfo=None), value
+        assert instants[position].to_pydatetime() == utc, value
+    assert local[len(EXPECTED):].isna().all()
+    assert instants[len(EXPECTED):].isna().all()
+
+
+def test_timestamp_sort_key_orders_by_instant():
+    """Rows recorded under different offsets sort by the moment they happened"""
+    values = ['2024-05-01 09:00:00 +0800', '2024-05-01 08:30:00 +1000', 'garbage', '2024-05-01 01:30:00 +0000']
+    assert sorted(values, key=timestamp_sort_key) == [
+        'garbage', '2024-05-01 08:30:00 +1000', '2024-05-01 09:00:00 +0800', '2024-05-01 01:30:00 +0000'
+    ]
@@ -0,0 +1,274 @@
+"""
+Cache backends shared by every worker process
+
+The default 'simple' cache lives inside one process, so under gunicorn each
+worker warms its own copy and a data version bumped in one worker is never
+seen by the others. The backends configured in init_cache_session_config
+are shared by all workers on a host (SQLiteCache, FileSystemCache) or across
+hosts (IntRedisCache).
+
+MeteredCache wraps whichever backend is configured and counts hits and misses
+for the current worker process.
+"""
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from cachelib.serializers import RedisSerializer
+from flask_caching.backends.base import BaseCache
+from flask_caching.backends.rediscache import RedisCache as FlaskRedisCache
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteCache(BaseCache):
+    """
+    Cache stored in one SQLite file, with LRU eviction by entry count and total size
+
+    Reads move an entry to the front of the LRU order. After each write,
+    expired entries are removed and the least recently used ones are dropped
+    until there are at most threshold entries of at most max_size bytes.
+    add() and inc() are atomic across processes.
+
+    Args:
+        path (str): The database file, created if missing
+        threshold (int): Maximum number of entries, 0 for no limit
+        max_size (int): Maximum total size of the pickled values in bytes, 0 for no limit
+        default_timeout (int): Seconds an entry lives when set() gets no timeout, 0 for ever
+    """
+
+    def __init__(self, path, threshold=500, max_size=0, default_timeout=300):
+        super().__init__(default_timeout=default_timeout)
+        self.path = path
+        self.threshold = threshold
+        self.max_size = max_size
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._transaction() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL, accessed REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_cache_accessed ON cache (accessed)')
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        kwargs.update(
+            path=config['CACHE_SQLITE_PATH'],
+            threshold=config['CACHE_THRESHOLD'],
+            max_size=config.get('CACHE_MAX_SIZE', 0),
+        )
+        return cls(*args, **kwargs)
+
+    def _connection(self):
+        # One autocommit connection per thread, opened again in a forked worker
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so read-then-write is atomic
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _expires(self, timeout):
+        timeout = self._normalize_timeout(timeout)
+        return time.time() + timeout if timeout else 0
+
+    def get(self, key):
+        # A plain SELECT, so misses take no write lock; a hit then bumps its LRU time
+        # in a separate autocommit UPDATE (UPDATE ... RETURNING needs SQLite 3.35)
+        now = time.time()
+        connection = self._connection()
+        row = connection.execute(
+            'SELECT value FROM cache WHERE key = ? AND (expires = 0 OR expires > ?)', (key, now)
+        ).fetchone()
+        if row is None:
+            return None
+        connection.execute('UPDATE cache SET accessed = ? WHERE key = ?', (now, key))
+        return pickle.loads(row[0])
+
+    def set(self, key, value, timeout=None):
+        now = time.time()
+        with self._transaction() as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO cache (key, value, expires, accessed) VALUES (?, ?, ?, ?)',
+                (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self._expires(timeout), now)
+            )
+            self._prune(connection, now)
+        return True
+
+    def add(self, key, value, timeout=None):
+        now = time.time()
+        with self._transaction() as connection:
+            added = connection.execute(
+                'INSERT INTO cache (key, value, expires, accessed) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires, '
+                'accessed = excluded.accessed WHERE cache.expires != 0 AND cache.expires <= ?',
+                (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self._expires(timeout), now, now)
+            ).rowcount
+            if added:
+                self._prune(connection, now)
+        return bool(added)
+
+    def inc(self, key, delta=1):
+        now = time.time()
+        with self._transaction() as connection:
+            row = connection.execute(
+                'SELECT value, expires FROM cache WHERE key = ? AND (expires = 0 OR expires > ?)', (key, now)
+            ).fetchone()
+            value = (pickle.loads(row[0]) if row else 0) + delta
+            expires = row[1] if row else self._expires(None)
+            connection.execute(
+                'INSERT OR REPLACE INTO cache (key, value, expires, accessed) VALUES (?, ?, ?, ?)',
+                (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires, now)
+            )
+        return value
+
+    def dec(self, key, delta=1):
+        return self.inc(key, -delta)
+
+    def delete(self, key):
+        return bool(self._connection().execute('DELETE FROM cache WHERE key = ?', (key,)).rowcount)
+
+    def has(self, key):
+        return self._connection().execute(
+            'SELECT 1 FROM cache WHERE key = ? AND (expires = 0 OR expires > ?)', (key, time.time())
+        ).fetchone() is not None
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+        return True
+
+    def _prune(self, connection, now):
+        connection.execute('DELETE FROM cache WHERE expires != 0 AND expires <= ?', (now,))
+        if self.threshold:
+            connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)',
+                (self.threshold,)
+            )
+        if self.max_size:
+            connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM ('
+                'SELECT key, SUM(LENGTH(value)) OVER (ORDER BY accessed DESC, key) AS running FROM cache'
+                ') WHERE running > ?)',
+                (self.max_size,)
+            )
+
+
+class IntRedisSerializer(RedisSerializer):
+    """Store plain ints as digits, the only form Redis INCRBY accepts; pickle everything else"""
+
+    def dumps(self, value, protocol=pickle.HIGHEST_PROTOCOL):
+        if type(value) is int:
+            return str(value).encode('ascii')
+        return super().dumps(value, protocol)
+
+
+class IntRedisCache(FlaskRedisCache):
+    """
+    Flask-Caching's RedisCache with integers stored unpickled
+
+    cachelib pickles every value, so inc() on a value written by set() or add()
+    fails with "value is not an integer". Data versions are added and then
+    incremented, so they need the plain form.
+    """
+
+    serializer = IntRedisSerializer()
+
+
+class CacheMetrics:
+    """Cache lookups of this worker process"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.hits = self.misses = self.sets = self.deletes = 0
+
+    def _current(self):
+        # Counters inherited from the parent are not this worker's
+        if self.pid != os.getpid():
+            self.reset()
+        return self
+
+    def record_lookup(self, hit):
+        metrics = self._current()
+        if hit:
+            metrics.hits += 1
+        else:
+            metrics.misses += 1
+
+    def report(self):
+        metrics = self._current()
+        lookups = metrics.hits + metrics.misses
+        return {
+            'pid': metrics.pid,
+            'hits': metrics.hits,
+            'misses': metrics.misses,
+            'sets': metrics.sets,
+            'deletes': metrics.deletes,
+            'hit_rate': round(metrics.hits / lookups, 4) if lookups else None
+        }
+
+
+class MeteredCache:
+    """
+    Proxy in front of a cache backend counting this worker's hits and misses
+
+    A summary is logged every log_interval lookups so the per-worker hit rates
+    can be compared in the server log.
+    """
+
+    def __init__(self, backend, log_interval=1000):
+        self.backend = backend
+        self.metrics = CacheMetrics()
+        self.log_interval = log_interval
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    def get(self, key):
+        value = self.backend.get(key)
+        self._record(value is not None)
+        return value
+
+    def get_many(self, *keys):
+        values = self.backend.get_many(*keys)
+        for value in values:
+            self._record(value is not None)
+        return values
+
+    def set(self, key, value, timeout=None):
+        self.metrics._current().sets += 1
+        return self.backend.set(key, value, timeout=timeout)
+
+    def delete(self, key):
+        self.metrics._current().deletes += 1
+        return self.backend.delete(key)
+
+    def _record(self, hit):
+        self.metrics.record_lookup(hit)
+        if self.log_interval and (self.metrics.hits + self.metrics.misses) % self.log_interval == 0:
+            report = self.metrics.report()
+            logger.info(
+                f"Cache worker {report['pid']} ({type(self.backend).__name__}): "
+                f"{report['hits']} hits, {report['misses']} misses, hit rate {report['hit_rate']}"
+            )
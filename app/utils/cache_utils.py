@@ -1,60 +1,306 @@
+import math
+import random
+import threading
+import time
+import uuid
+from collections import namedtuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 from app import cache
-from flask import current_app
+from flask import copy_current_request_context, current_app, has_request_context
+
+# Every per-user cache key embeds the user's data version. Bumping the version
+# makes all of the user's dashboard, chart, goal and share entries unreachable at
+# once; they then age out through their own timeouts.
+DATA_VERSION_KEY = 'data_version_{user_id}'
+
+
+def _data_version_key(user_id):
+    return DATA_VERSION_KEY.format(user_id=user_id)
+
+
+def _initial_data_version():
+    # Seeded from the clock so a version lost to eviction or a restart never
+    # comes back with a number that older entries were stored under
+    return time.time_ns() // 1000
+
+
+def get_data_version(user_id):
+    """
+    Current data version of a user, created on first use.
+
+    Args:
+        user_id (int): The ID of the user
+
+    Returns:
+        int: The version to embed in the user's cache keys
+    """
+    key = _data_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_data_version(), timeout=0)
+        version = cache.get(key)
+    return version
+
+
+def bump_data_version(user_id):
+    """
+    Move a user to a new data version, invalidating every cache entry keyed on the old one.
+
+    Args:
+        user_id (int): The ID of the user whose data changed
+
+    Returns:
+        int: The new version
+    """
+    key = _data_version_key(user_id)
+    try:
+        cache.add(key, _initial_data_version(), timeout=0)
+        # Cache itself has no inc(); the backend's is atomic on Redis and Memcached
+        version = cache.cache.inc(key)
+        current_app.logger.info(f"Data version of user {user_id} is now {version}")
+        return version
+    except Exception as e:
+        current_app.logger.error(f"Error bumping data version for user {user_id}: {str(e)}")
+        return None
+
+
+def user_cache_key(user_id, name, *parts):
+    """
+    Cache key for per-user data, e.g. user_cache_key(3, 'dashboard_data', 'days', 7).
+
+    Args:
+        user_id (int): The ID of the user the cached data belongs to
+        name (str): What is cached
+        *parts: Further values that identify the entry
+
+    Returns:
+        str: '<name>_<user_id>_v<data version>[_<part>...]'
+    """
+    key = f'{name}_{user_id}_v{get_data_version(user_id)}'
+    if parts:
+        key += '_' + '_'.join(str(part) for part in parts)
+    return key
+
+
+def cache_is_shared():
+    """Whether other processes see this process's cache entries (not the in-process or null cache)"""
+    from flask_caching.backends.nullcache import NullCache
+    from flask_caching.backends.simplecache import SimpleCache
+    backend = getattr(cache.cache, 'backend', cache.cache)
+    return not isinstance(backend, (SimpleCache, NullCache))
+
+
+def cache_stats():
+    """
+    Hit and miss counts of the cache in this worker process.
+
+    Returns:
+        dict: backend, pid, hits, misses, sets, deletes and hit_rate
+    """
+    metered = cache.cache
+    stats = {'backend': type(getattr(metered, 'backend', metered)).__name__}
+    if hasattr(metered, 'metrics'):
+        stats.update(metered.metrics.report())
+    return stats
+
+
+# A value cached by get_or_compute, with the time it goes stale and how long it took to compute
+CacheEntry = namedtuple('CacheEntry', ['value', 'expires', 'delta'])
+
+LOCK_POLL_INTERVAL = 0.05
+
+
+def _refresh_due(entry, now, beta):
+    """
+    Whether to recompute an entry now.
+
+    Past its expiry it is always due. Shortly before, it is due with a probability
+    that rises as expiry nears and with the time the value takes to compute
+    (probabilistic early expiry, "XFetch"), so one request usually refreshes a
+    popular entry before all of them find it expired.
+    """
+    if now >= entry.expires:
+        return True
+    return beta > 0 and now - entry.delta * beta * math.log(1.0 - random.random()) >= entry.expires
+
+
+def _store(key, compute, timeout, stale_timeout):
+    started = time.time()
+    value = compute()
+    now = time.time()
+    cache.set(key, CacheEntry(value, now + timeout, now - started), timeout=timeout + stale_timeout)
+    return value
+
+
+def _release(lock_key, token):
+    if cache.get(lock_key) == token:
+        cache.delete(lock_key)
+
+
+def _refresh_in_background(key, lock_key, token, compute, timeout, stale_timeout):
+    def refresh():
+        try:
+            _store(key, compute, timeout, stale_timeout)
+        except Exception as e:
+            current_app.logger.error(f"Error refreshing cache entry {key}: {str(e)}")
+        finally:
+            _release(lock_key, token)
+
+    if has_request_context():
+        target = copy_current_request_context(refresh)
+    else:
+        app = current_app._get_current_object()
+
+        def target():
+            with app.app_context():
+                refresh()
+    threading.Thread(target=target, name=f'cache-refresh-{key}', daemon=True).start()
+
+
+def get_or_compute(key, compute, timeout, stale_timeout=None, beta=None, lock_timeout=None, background=True):
+    """
+    Cached value of compute(), recomputed by one caller at a time.
+
+    - Single flight: when the entry is missing or due, only the caller that takes
+      the per-key lock runs compute(); the others serve the stale value if there
+      is one, or wait for the lock holder's result.
+    - Stale while revalidate: entries are kept stale_timeout seconds past their
+      expiry. A stale entry is returned at once while compute() runs, in a
+      background thread when background is True.
+    - Early expiry: entries may be recomputed shortly before they expire, see
+      _refresh_due.
+
+    Exceptions from compute() propagate (nothing is cached) unless the refresh
+    runs in the background, where they are logged and the stale value stays.
+
+    Args:
+        key (str): Cache key, usually from user_cache_key
+        compute (callable): Produces the value, called without arguments
+        timeout (int): Seconds the value is fresh
+        stale_timeout (int): Seconds a value may be served stale (default CACHE_STALE_TIMEOUT)
+        beta (float): Early expiry factor, 0 disables it (default CACHE_EARLY_EXPIRY_BETA)
+        lock_timeout (int): Seconds before an abandoned lock lapses (default CACHE_LOCK_TIMEOUT)
+        background (bool): Refresh stale entries in a background thread
+
+    Returns:
+        The cached or computed value
+    """
+    config = current_app.config
+    stale_timeout = config.get('CACHE_STALE_TIMEOUT', 0) if stale_timeout is None else stale_timeout
+    beta = config.get('CACHE_EARLY_EXPIRY_BETA', 1.0) if beta is None else beta
+    lock_timeout = config.get('CACHE_LOCK_TIMEOUT', 30) if lock_timeout is None else lock_timeout
+
+    entry = cache.get(key)
+    if entry is not None and not _refresh_due(entry, time.time(), beta):
+        return entry.value
+
+    lock_key = f'{key}_lock'
+    token = uuid.uuid4().hex
+    if cache.add(lock_key, token, timeout=lock_timeout):
+        if entry is not None and background:
+            _refresh_in_background(key, lock_key, token, compute, timeout, stale_timeout)
+            return entry.value
+        try:
+            return _store(key, compute, timeout, stale_timeout)
+        finally:
+            _release(lock_key, token)
+
+    if entry is not None:
+        # Another caller is refreshing it
+        return entry.value
+
+    # Nothing to serve yet: wait for the caller holding the lock
+    deadline = time.time() + lock_timeout
+    while time.time() < deadline and cache.get(lock_key) is not None:
+        time.sleep(LOCK_POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry.value
+    entry = cache.get(key)
+    if entry is not None:
+        return entry.value
+    # The lock holder failed or gave up
+    return _store(key, compute, timeout, stale_timeout)
+
 
 def invalidate_dashboard_cache(user_id):
     """
     Invalidate all dashboard-related caches for a specific user.
-    
+
     This should be called whenever a user's data is updated to ensure
-    they see the latest information.
-    
+    they see the latest information. It covers every cache keyed with
+    user_cache_key: dashboard, charts, goals, achievements and share views.
+
     Args:
         user_id (int): The ID of the user whose cache should be invalidated
     """
-    # Clear main dashboard data cache
-    dashboard_key = f'dashboard_data_{user_id}'
-    dashboard_summary_key = f'dashboard_summary_{user_id}'
-    dashboard_goals_achievements_key = f'dashboard_goals_achievements_{user_id}'
-    
-    try:
-        # Track which keys were successfully invalidated
-        invalidated_keys = []
-        
-        # Try to delete each key
-        if cache.delete(dashboard_key):
-            invalidated_keys.append(dashboard_key)
-            
-        if cache.delete(dashboard_summary_key):
-            invalidated_keys.append(dashboard_summary_key)
-            
-        if cache.delete(dashboard_goals_achievements_key):
-            invalidated_keys.append(dashboard_goals_achievements_key)
-        
-        if invalidated_keys:
-            current_app.logger.info(f"Cache invalidated for user {user_id}: {', '.join(invalidated_keys)}")
-        else:
-            current_app.logger.info(f"No cache entries found to invalidate for user {user_id}")
-    except Exception as e:
-        current_app.logger.error(f"Error invalidating dashboard cache for user {user_id}: {str(e)}")
+    bump_data_version(user_id)
+
+
+def shared_dashboard_cache_key(share_token):
+    """
+    Cache key of a shared dashboard, versioned on the data of the user who shared it.
+
+    Args:
+        share_token (str): The token of the shared link
+    """
+    from app.models import SharedLink
+    user_id = SharedLink.query.with_entities(SharedLink.user_id).filter_by(share_token=share_token).scalar()
+    if user_id is None:
+        return f'shared_dashboard_{share_token}'
+    return user_cache_key(user_id, 'shared_dashboard', share_token)
+
 
 def invalidate_shared_dashboard_cache(share_token):
     """
     Invalidate cache for a shared dashboard.
-    
-    This should be called when a share link is updated or when 
-    the underlying data changes.
-    
+
+    This should be called when a share link is updated. Changes to the
+    underlying data are covered by the owner's data version.
+
     Args:
         share_token (str): The token of the shared link
     """
-    # Clear shared dashboard cache
-    shared_dashboard_key = f'shared_dashboard_{share_token}'
-    
     try:
         # Attempt to delete the key and check if it was actually in the cache
-        if cache.delete(shared_dashboard_key):
+        if cache.delete(shared_dashboard_cache_key(share_token)):
             current_app.logger.info(f"Successfully invalidated shared dashboard cache for token {share_token}")
         else:
             current_app.logger.info(f"No cache entry found to invalidate for token {share_token}")
     except Exception as e:
-        current_app.logger.error(f"Error invalidating shared dashboard cache for token {share_token}: {str(e)}") 
\ No newline at end of file
+        current_app.logger.error(f"Error invalidating shared dashboard cache for token {share_token}: {str(e)}")
+
+
+def _versioned_models():
+    from app.models import Weight, HeartRate, Activity, Sleep, Goal, Progress, UserAchievement
+    from app.models.finance.account import Account
+    from app.models.finance.category import Category
+    from app.models.finance.transaction import Transaction
+    return (Weight, HeartRate, Activity, Sleep, Goal, Progress, UserAchievement, Account, Category, Transaction)
+
+
+def _collect_changed_users(session, flush_context):
+    models = _versioned_models()
+    users = session.info.setdefault('data_version_users', set())
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(instance, models) and instance.user_id is not None:
+            users.add(instance.user_id)
+
+
+def _bump_changed_users(session):
+    users = session.info.pop('data_version_users', None)
+    for user_id in users or ():
+        bump_data_version(user_id)
+
+
+def _forget_changed_users(session):
+    session.info.pop('data_version_users', None)
+
+
+def register_cache_events():
+    """Bump a user's data version when their data changes through the ORM (manual edits, deletes)"""
+    if not event.contains(Session, 'after_flush', _collect_changed_users):
+        event.listen(Session, 'after_flush', _collect_changed_users)
+        event.listen(Session, 'after_commit', _bump_changed_users)
+        event.listen(Session, 'after_rollback', _forget_changed_users)
@@ -1,6 +1,8 @@
+from bisect import bisect_right
 from datetime import datetime, timedelta, date
 import calendar
-from typing import Dict, List, Tuple, Any, Optional, Union
+from typing import Dict, List, Tuple, Any, Optional, Union, Sequence
+import numpy as np
 
 # Fitbit style chart color definitions
 CHART_COLORS = {
@@ -161,6 +163,130 @@ def generate_time_slots(period: str, start_date: datetime, end_date: datetime) -
     
     return slots
 
+class SlotIndex:
+    """
+    Binary-search lookup of the time slot a timestamp falls in
+
+    Keeps the slot boundaries from generate_time_slots as sorted lists (and
+    datetime64 arrays for whole columns), so finding a record's slot costs
+    O(log slots) instead of a scan over every slot.
+    """
+
+    def __init__(self, slots: List[Dict[str, Any]]):
+        self.slots = slots
+        self.starts = [slot['start'] for slot in slots]
+        self.ends = [slot['end'] for slot in slots]
+        self.labels = [slot['label'] for slot in slots]
+        self._start_array = np.array(self.starts, dtype='datetime64[us]')
+        self._end_array = np.array(self.ends, dtype='datetime64[us]')
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def find(self, timestamp: datetime) -> Optional[int]:
+        """
+        Position of the slot containing a timestamp
+
+        Args:
+            timestamp: Time to look up
+
+        Returns:
+            Slot position, or None if the timestamp is outside every slot
+        """
+        position = bisect_right(self.starts, timestamp) - 1
+        if position >= 0 and timestamp < self.ends[position]:
+            return position
+        return None
+
+    def label_for(self, timestamp: datetime) -> Optional[str]:
+        """Label of the slot containing a timestamp, None if outside every slot"""
+        position = self.find(timestamp)
+        return None if position is None else self.labels[position]
+
+    def positions(self, timestamps: Sequence[datetime]) -> np.ndarray:
+        """
+        Vectorized find for many timestamps
+
+        Args:
+            timestamps: Datetimes, a datetime64 array or a pandas datetime Series
+
+        Returns:
+            Array of slot positions, -1 where a timestamp is outside every slot
+        """
+        stamps = np.asarray(timestamps, dtype='datetime64[us]')
+        positions = np.searchsorted(self._start_array, stamps, side='right') - 1
+        if not len(self.slots):
+            return positions
+        inside = (positions >= 0) & (stamps < self._end_array[np.clip(positions, 0, None)])
+        return np.where(inside, positions, -1)
+
+
+SLOT_METRICS = ('min', 'max', 'sum', 'count', 'avg')
+
+
+def aggregate_into_slots(
+    timestamps: Sequence[datetime],
+    values: Sequence[float],
+    slots: Union[List[Dict[str, Any]], SlotIndex],
+    metrics: Sequence[str] = ('min', 'max', 'sum', 'count')
+) -> Dict[str, Dict[str, float]]:
+    """
+    Aggregate readings into chart time slots with NumPy
+
+    Readings are grouped by slot with one sort (a no-op for rows already in
+    time order) and each metric is a single reduceat over the groups, instead
+    of a Python loop over rows and slots.
+
+    Args:
+        timestamps: Reading times
+        values: Reading values, same length as timestamps; NaN/None are ignored
+        slots: Slots from generate_time_slots, or a SlotIndex built from them
+        metrics: Any of 'min', 'max', 'sum', 'count' and 'avg'
+
+    Returns:
+        Dict keyed by slot label with the requested metrics; slots without
+        readings have every metric at 0. Slots sharing a label are merged.
+    """
+    unknown = set(metrics) - set(SLOT_METRICS)
+    if unknown:
+        raise ValueError(f"Unknown slot metrics: {', '.join(sorted(unknown))}")
+
+    index = slots if isinstance(slots, SlotIndex) else SlotIndex(slots)
+    codes = {}
+    for label in index.labels:
+        codes.setdefault(label, len(codes))
+    labels = list(codes)
+    label_codes = np.array([codes[label] for label in index.labels], dtype=np.intp)
+    data = {label: {metric: 0 for metric in metrics} for label in labels}
+
+    positions = index.positions(timestamps)
+    readings = np.asarray(values, dtype=float)
+    keep = (positions >= 0) & ~np.isnan(readings)
+    if not keep.any():
+        return data
+
+    groups = label_codes[positions[keep]]
+    readings = readings[keep]
+    if (np.diff(groups) < 0).any():
+        order = np.argsort(groups, kind='stable')
+        groups, readings = groups[order], readings[order]
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+
+    results = {
+        'count': np.diff(np.r_[starts, len(groups)]),
+        'min': np.minimum.reduceat(readings, starts) if 'min' in metrics else None,
+        'max': np.maximum.reduceat(readings, starts) if 'max' in metrics else None,
+        'sum': np.add.reduceat(readings, starts) if {'sum', 'avg'} & set(metrics) else None,
+    }
+    if 'avg' in metrics:
+        results['avg'] = results['sum'] / results['count']
+
+    for position, code in enumerate(groups[starts]):
+        stats = data[labels[code]]
+        for metric in metrics:
+            stats[metric] = results[metric][position].item()
+    return data
+
 def format_empty_data_structure(period: str, metric_keys: List[str]) -> Dict[str, Dict[str, float]]:
     """
     Create initial empty data structure for different time periods
@@ -0,0 +1,190 @@
+"""
+Fast parsing of Apple Health timestamps
+
+Exports write every date as 'YYYY-MM-DD HH:MM:SS +ZZZZ' and millions of them
+share a handful of UTC offsets. Each distinct offset suffix is normalized once
+and memoized, so the common layout is a single call into the C implementation
+of datetime.fromisoformat with no exception or string splitting per row.
+Python 3.11+ reads the layout natively and skips even that. Anything else falls
+back to a general ISO 8601 pattern.
+"""
+import re
+import sys
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+# '+0800' / '+08:00' / '-0330'
+UTC_OFFSET_PATTERN = re.compile(r'^([+-])(\d{2}):?(\d{2})$')
+# Date, optional time with optional fraction, optional offset: the layouts parse_datetime accepted
+TIMESTAMP_PATTERN = re.compile(
+    r'^(\d{4}-\d{2}-\d{2}(?:[ T]\d{2}:\d{2}(?::\d{2}(?:\.\d{1,6})?)?)?)\s*(Z|[+-]\d{2}:?\d{2})?$'
+)
+WALL_TIME_LENGTH = 19
+# datetime.fromisoformat accepts ' +0800' and 'Z' from Python 3.11 on
+NATIVE_ISO_OFFSETS = sys.version_info >= (3, 11)
+
+# Digit positions in 'YYYY-MM-DD HH:MM:SS', their place values and the slices forming each field
+WALL_TIME_DIGITS = [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18]
+WALL_TIME_WEIGHTS = np.array([1000, 100, 10, 1, 10, 1, 10, 1, 10, 1, 10, 1, 10, 1])
+WALL_TIME_FIELDS = [(0, 4), (4, 6), (6, 8), (8, 10), (10, 12), (12, 14)]
+
+
+@lru_cache(maxsize=None)
+def offset_tzinfo(suffix):
+    """
+    tzinfo for the text after the wall-clock time
+
+    Args:
+        suffix (str): e.g. ' +0800', '+08:00', 'Z' or ''
+
+    Returns:
+        timezone, or None when there is no offset (naive timestamp)
+
+    Raises:
+        ValueError: if the suffix is not a UTC offset
+    """
+    suffix = suffix.strip()
+    if not suffix:
+        return None
+    if suffix == 'Z':
+        return timezone.utc
+    match = UTC_OFFSET_PATTERN.match(suffix)
+    if not match:
+        raise ValueError(f"Invalid UTC offset: {suffix!r}")
+    minutes = int(match.group(2)) * 60 + int(match.group(3))
+    return timezone(timedelta(minutes=-minutes if match.group(1) == '-' else minutes))
+
+
+@lru_cache(maxsize=None)
+def iso_offset(suffix):
+    """Offset suffix rewritten as '+HH:MM' (or '' when naive), which fromisoformat accepts everywhere"""
+    tzinfo = offset_tzinfo(suffix)
+    if tzinfo is None:
+        return ''
+    minutes = int(tzinfo.utcoffset(None).total_seconds() // 60)
+    sign = '-' if minutes < 0 else '+'
+    return f"{sign}{abs(minutes) // 60:02d}:{abs(minutes) % 60:02d}"
+
+
+def offset_minutes(suffix):
+    """Minutes east of UTC for an offset suffix, None if it is not an offset"""
+    try:
+        tzinfo = offset_tzinfo(suffix)
+    except ValueError:
+        return None
+    return tzinfo.utcoffset(None).total_seconds() / 60 if tzinfo else 0
+
+
+def parse_timestamp(value):
+    """
+    Parse a timestamp string such as '2020-07-26 17:23:00 +0800'
+
+    Accepts everything data_import.parse_datetime did. Values with an offset come
+    back timezone-aware, values without one naive.
+
+    Raises:
+        ValueError: if the value is not a timestamp
+    """
+    try:
+        if NATIVE_ISO_OFFSETS:
+            return datetime.fromisoformat(value)
+        return datetime.fromisoformat(value[:WALL_TIME_LENGTH] + iso_offset(value[WALL_TIME_LENGTH:]))
+    except (ValueError, TypeError):
+        return _parse_general(value)
+
+
+def _parse_general(value):
+    """Slow path for fractional seconds, missing seconds and stray whitespace"""
+    match = TIMESTAMP_PATTERN.match(value.strip()) if isinstance(value, str) else None
+    if not match:
+        raise ValueError(f"Unable to parse datetime: {value}")
+    wall, suffix = match.groups()
+    if '.' in wall:
+        # fromisoformat before Python 3.11 only takes 3 or 6 fractional digits
+        head, fraction = wall.split('.')
+        wall = f"{head}.{fraction.ljust(6, '0')}"
+    return datetime.fromisoformat(wall.replace('T', ' ') + iso_offset(suffix or ''))
+
+
+def timestamp_sort_key(value):
+    """
+    POSIX seconds of a timestamp string, for ordering rows by actual instant
+
+    Naive timestamps are taken as UTC; unparseable values sort first.
+    """
+    try:
+        parsed = parse_timestamp(value)
+    except ValueError:
+        return float('-inf')
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def parse_timestamp_column(values):
+    """
+    Batch version of parse_timestamp for a pandas Series of timestamp strings
+
+    The 'YYYY-MM-DD HH:MM:SS' part is read straight out of a fixed-width character
+    array and the offset suffix is resolved once per distinct value. Values in any
+    other layout fall back to parse_timestamp one by one.
+
+    Returns:
+        tuple: (UTC instants, naive local wall-clock times) as datetime Series;
+               unparseable values are NaT in both
+    """
+    present = values.notna().to_numpy()
+    # Missing values become 'nan'/'None' here, which never match the layout below
+    text = values.to_numpy(dtype='U')
+    width = max(text.dtype.itemsize // 4, WALL_TIME_LENGTH + 1)
+    chars = text.astype(f'U{width}').view('U1').reshape(len(text), width)
+
+    # Read the digits straight from the code points
+    points = chars[:, :WALL_TIME_LENGTH].view(np.uint32).astype(np.int32)
+    digits = points[:, WALL_TIME_DIGITS] - ord('0')
+    layout_ok = (
+        ((digits >= 0) & (digits <= 9)).all(axis=1)
+        & (points[:, [4, 7]] == ord('-')).all(axis=1)
+        & np.isin(points[:, 10], [ord(' '), ord('T')])
+        & (points[:, [13, 16]] == ord(':')).all(axis=1)
+    )
+    year, month, day, hour, minute, second = (
+        (digits[:, start:end] * WALL_TIME_WEIGHTS[start:end]).sum(axis=1)
+        for start, end in WALL_TIME_FIELDS
+    )
+    layout_ok &= (month >= 1) & (month <= 12) & (day >= 1) & (hour < 24) & (minute < 60) & (second < 60)
+    months = np.where(layout_ok, (year - 1970) * 12 + month - 1, 0).astype('datetime64[M]')
+    dates = months.astype('datetime64[D]') + np.where(layout_ok, day - 1, 0)
+    # Reject days past the end of the month (e.g. 2023-02-30) instead of rolling over
+    layout_ok &= dates.astype('datetime64[M]') == months
+    stamps = dates.astype('datetime64[s]') + hour * 3600 + minute * 60 + second
+    local = pd.Series(np.where(layout_ok, stamps, np.datetime64('NaT')).astype('datetime64[ns]'),
+                      index=values.index)
+
+    # Exports almost always use a single offset, so only hash the suffixes that differ from the first
+    suffix = np.ascontiguousarray(chars[:, WALL_TIME_LENGTH:]).view(f'U{width - WALL_TIME_LENGTH}').ravel()
+    offsets = np.full(len(suffix), np.nan)
+    if len(suffix):
+        usual = suffix == suffix[0]
+        offsets[usual] = offset_minutes(suffix[0])
+        codes, others = pd.factorize(suffix[~usual])
+        offsets[~usual] = np.array([offset_minutes(other) for other in others], dtype=float)[codes]
+    minutes = pd.Series(offsets, index=values.index)
+
+    for position in np.flatnonzero(present & (local.isna() | minutes.isna()).to_numpy()):
+        index = values.index[position]
+        try:
+            parsed = parse_timestamp(str(values[index]))
+        except ValueError:
+            local[index], minutes[index] = pd.NaT, np.nan
+            continue
+        offset = parsed.utcoffset()
+        local[index] = parsed.replace(tzinfo=None)
+        minutes[index] = offset.total_seconds() / 60 if offset is not None else 0
+
+    valid = present & local.notna().to_numpy() & minutes.notna().to_numpy()
+    local = local.where(valid)
+    instants = (local - pd.to_timedelta(minutes.where(valid), unit='m')).dt.tz_localize('UTC')
+    return instants, local
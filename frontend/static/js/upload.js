@@ -98,7 +98,10 @@ document.addEventListener('DOMContentLoaded', function() {
 
             const result = await response.json();
             
-            if (result.success) {
+            if (result.success && result.queued) {
+                updateProgress(0, 'Upload complete, waiting for import to start...');
+                await pollImportStatus(result.status_url);
+            } else if (result.success) {
                 updateProgress(100, 'Upload complete!');
                 showSuccess('File uploaded and processed successfully');
                 setTimeout(() => {
@@ -115,6 +118,40 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
+    // Poll a queued import until a worker has finished it
+    async function pollImportStatus(statusUrl) {
+        while (true) {
+            await new Promise(resolve => setTimeout(resolve, 2000));
+
+            const response = await fetch(statusUrl, {
+                headers: { 'Accept': 'application/json' }
+            });
+            if (!response.ok) {
+                throw new Error('Could not check import status: ' + response.status);
+            }
+
+            const { import_log: importLog, queue_position: queuePosition } = await response.json();
+
+            if (importLog.status === 'queued') {
+                updateProgress(0, `Waiting in queue (position ${queuePosition})...`);
+            } else if (!importLog.finished) {
+                updateProgress(importLog.progress || 0, `Importing... ${importLog.progress || 0}%`);
+            } else if (importLog.status === 'failed') {
+                throw new Error(importLog.error_message || 'Import failed');
+            } else {
+                updateProgress(100, 'Import complete!');
+                showSuccess(importLog.status === 'partial'
+                    ? 'Import finished with partial results'
+                    : `Imported ${importLog.records_processed} records successfully`
+                        + (importLog.duplicates_skipped ? ` (${importLog.duplicates_skipped} already imported)` : ''));
+                setTimeout(() => {
+                    window.location.href = '/dashboard';
+                }, 2000);
+                return;
+            }
+        }
+    }
+
     // Update progress bar and status
     function updateProgress(percent, status) {
         progressBar.style.width = `${percent}%`;
@@ -0,0 +1,26 @@
+"""Add rows_per_second to import logs
+
+Revision ID: 3f2b8c1d9a47
+Revises: e8ff941a79b1
+Create Date: 2026-10-17 09:12:41.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2b8c1d9a47'
+down_revision = 'e8ff941a79b1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('import_logs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('rows_per_second', sa.Float(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('import_logs', schema=None) as batch_op:
+        batch_op.drop_column('rows_per_second')
@@ -0,0 +1,34 @@
+"""Add import queue columns to import logs
+
+Revision ID: 7c4e1a2b5d90
+Revises: 3f2b8c1d9a47
+Create Date: 2026-10-17 10:03:18.552210
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c4e1a2b5d90'
+down_revision = '3f2b8c1d9a47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('import_logs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('file_path', sa.String(length=500), nullable=True))
+        batch_op.add_column(sa.Column('progress', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('worker_id', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('started_at', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_import_logs_status'), ['status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('import_logs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_import_logs_status'))
+        batch_op.drop_column('started_at')
+        batch_op.drop_column('worker_id')
+        batch_op.drop_column('progress')
+        batch_op.drop_column('file_path')
@@ -0,0 +1,26 @@
+"""Add cache_warm_seconds to import logs
+
+Revision ID: a7d3e9f1c2b6
+Revises: e8c3b5a07d14
+Create Date: 2026-10-18 10:21:07.593114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d3e9f1c2b6'
+down_revision = 'e8c3b5a07d14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('import_logs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('cache_warm_seconds', sa.Float(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('import_logs', schema=None) as batch_op:
+        batch_op.drop_column('cache_warm_seconds')
@@ -0,0 +1,26 @@
+"""Add a worker heartbeat to import logs
+
+Revision ID: a9d4c6e2f715
+Revises: f2b7c4e9a813
+Create Date: 2026-10-18 21:14:07.381904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9d4c6e2f715'
+down_revision = 'f2b7c4e9a813'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('import_logs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('heartbeat_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('import_logs', schema=None) as batch_op:
+        batch_op.drop_column('heartbeat_at')
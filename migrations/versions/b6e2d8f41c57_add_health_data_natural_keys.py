@@ -0,0 +1,45 @@
+"""Add unique natural keys to health data tables
+
+Revision ID: b6e2d8f41c57
+Revises: 7c4e1a2b5d90
+Create Date: 2026-10-18 09:12:40.318457
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6e2d8f41c57'
+down_revision = '7c4e1a2b5d90'
+branch_labels = None
+depends_on = None
+
+NATURAL_KEYS = {
+    'heart_rates': ('uq_heart_rates_natural_key', ['user_id', 'timestamp', 'data_source']),
+    'weights': ('uq_weights_natural_key', ['user_id', 'timestamp', 'data_source']),
+    'activities': ('uq_activities_natural_key', ['user_id', 'timestamp', 'activity_type', 'data_source']),
+    'sleeps': ('uq_sleeps_natural_key', ['user_id', 'start_time']),
+}
+
+
+def upgrade():
+    with op.batch_alter_table('import_logs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('duplicates_skipped', sa.Integer(), nullable=True))
+
+    for table, (index_name, columns) in NATURAL_KEYS.items():
+        if 'data_source' in columns:
+            # NULLs never collide in a unique index, so store missing sources as ''
+            op.execute(f"UPDATE {table} SET data_source = '' WHERE data_source IS NULL")
+        # Keep the first copy of rows that earlier re-uploads duplicated
+        key = ', '.join(columns)
+        op.execute(f"DELETE FROM {table} WHERE id NOT IN (SELECT MIN(id) FROM {table} GROUP BY {key})")
+        op.create_index(index_name, table, columns, unique=True)
+
+
+def downgrade():
+    for table, (index_name, columns) in NATURAL_KEYS.items():
+        op.drop_index(index_name, table_name=table)
+
+    with op.batch_alter_table('import_logs', schema=None) as batch_op:
+        batch_op.drop_column('duplicates_skipped')
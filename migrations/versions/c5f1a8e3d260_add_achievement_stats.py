@@ -0,0 +1,48 @@
+"""Add per-user achievement stats
+
+Revision ID: c5f1a8e3d260
+Revises: a7d3e9f1c2b6
+Create Date: 2026-10-18 16:42:11.804327
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5f1a8e3d260'
+down_revision = 'a7d3e9f1c2b6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Rows are built from the rollups the first time a user's achievements are checked
+    op.create_table('achievement_stats',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('activity_count', sa.Integer(), nullable=True),
+    sa.Column('weight_count', sa.Integer(), nullable=True),
+    sa.Column('sleep_count', sa.Integer(), nullable=True),
+    sa.Column('heart_rate_count', sa.Integer(), nullable=True),
+    sa.Column('max_daily_steps', sa.Float(), nullable=True),
+    sa.Column('first_weight', sa.Float(), nullable=True),
+    sa.Column('first_weight_at', sa.DateTime(), nullable=True),
+    sa.Column('latest_weight', sa.Float(), nullable=True),
+    sa.Column('latest_weight_at', sa.DateTime(), nullable=True),
+    sa.Column('heart_rate_total', sa.Float(), nullable=True),
+    sa.Column('latest_heart_rate', sa.Float(), nullable=True),
+    sa.Column('latest_heart_rate_at', sa.DateTime(), nullable=True),
+    sa.Column('steps_streak', sa.Integer(), nullable=True),
+    sa.Column('weight_streak', sa.Integer(), nullable=True),
+    sa.Column('sleep_streak', sa.Integer(), nullable=True),
+    sa.Column('heart_rate_streak', sa.Integer(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id')
+    )
+
+
+def downgrade():
+    op.drop_table('achievement_stats')
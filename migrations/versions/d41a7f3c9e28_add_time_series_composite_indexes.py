@@ -0,0 +1,34 @@
+"""Add composite indexes for per-user time-series range queries
+
+Revision ID: d41a7f3c9e28
+Revises: b6e2d8f41c57
+Create Date: 2026-10-18 11:04:52.730164
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41a7f3c9e28'
+down_revision = 'b6e2d8f41c57'
+branch_labels = None
+depends_on = None
+
+# Charts, dashboard and goals filter on user (and activity type) plus a time range
+# and read only the value, so the value column is carried in the index
+TIME_SERIES_INDEXES = {
+    'heart_rates': ('ix_heart_rates_user_timestamp', ['user_id', 'timestamp', 'value']),
+    'weights': ('ix_weights_user_timestamp', ['user_id', 'timestamp', 'value']),
+    'activities': ('ix_activities_user_type_timestamp', ['user_id', 'activity_type', 'timestamp', 'value']),
+    'sleeps': ('ix_sleeps_user_timestamp', ['user_id', 'timestamp']),
+}
+
+
+def upgrade():
+    for table, (index_name, columns) in TIME_SERIES_INDEXES.items():
+        op.create_index(index_name, table, columns)
+
+
+def downgrade():
+    for table, (index_name, columns) in TIME_SERIES_INDEXES.items():
+        op.drop_index(index_name, table_name=table)
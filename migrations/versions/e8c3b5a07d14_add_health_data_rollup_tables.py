@@ -0,0 +1,115 @@
+"""Add daily and hourly rollup tables for health data
+
+Revision ID: e8c3b5a07d14
+Revises: d41a7f3c9e28
+Create Date: 2026-10-18 14:21:37.502918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8c3b5a07d14'
+down_revision = 'd41a7f3c9e28'
+branch_labels = None
+depends_on = None
+
+VALUE_MEASURES = {
+    'min_value': 'MIN(value)',
+    'max_value': 'MAX(value)',
+    'total': 'COALESCE(SUM(value), 0)',
+    'count': 'COUNT(value)',
+}
+
+# table: (source table, bucket column, extra key columns {name: expression}, measures {name: expression})
+ROLLUPS = {
+    'heart_rate_daily_rollups': ('heart_rates', 'day', {'unit': "COALESCE(unit, '')"}, VALUE_MEASURES),
+    'heart_rate_hourly_rollups': ('heart_rates', 'hour', {}, VALUE_MEASURES),
+    'activity_daily_rollups': ('activities', 'day', {'activity_type': "COALESCE(activity_type, '')"}, {
+        'total': 'COALESCE(SUM(value), 0)',
+        'steps': ("COALESCE(SUM(CASE WHEN total_steps > 0 THEN total_steps "
+                  "WHEN activity_type = 'steps' THEN value ELSE 0 END), 0)"),
+        'count': 'COUNT(*)',
+    }),
+    'sleep_daily_rollups': ('sleeps', 'day', {}, {
+        'duration': 'COALESCE(SUM(duration), 0)',
+        'deep_sleep': 'COALESCE(SUM(deep_sleep), 0)',
+        'light_sleep': 'COALESCE(SUM(light_sleep), 0)',
+        'rem_sleep': 'COALESCE(SUM(rem_sleep), 0)',
+        'awake': 'COALESCE(SUM(awake), 0)',
+        'count': 'COUNT(*)',
+    }),
+    'weight_daily_rollups': ('weights', 'day', {}, VALUE_MEASURES),
+}
+
+
+def _bucket_sql(bucket, dialect_name):
+    if dialect_name == 'sqlite':
+        # Same text format SQLAlchemy writes for Date and DateTime columns
+        return 'date(timestamp)' if bucket == 'day' else "strftime('%Y-%m-%d %H:00:00.000000', timestamp)"
+    return 'CAST(timestamp AS DATE)' if bucket == 'day' else "date_trunc('hour', timestamp)"
+
+
+def _create_rollup_table(name, bucket_column, key_columns, measure_columns):
+    op.create_table(name,
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    bucket_column,
+    *key_columns,
+    *measure_columns,
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def upgrade():
+    _create_rollup_table('heart_rate_daily_rollups', sa.Column('day', sa.Date(), nullable=False),
+                         [sa.Column('unit', sa.String(length=10), nullable=True)],
+                         [sa.Column('min_value', sa.Float(), nullable=True),
+                          sa.Column('max_value', sa.Float(), nullable=True),
+                          sa.Column('total', sa.Float(), nullable=True),
+                          sa.Column('count', sa.Integer(), nullable=True)])
+    _create_rollup_table('heart_rate_hourly_rollups', sa.Column('hour', sa.DateTime(), nullable=False), [],
+                         [sa.Column('min_value', sa.Float(), nullable=True),
+                          sa.Column('max_value', sa.Float(), nullable=True),
+                          sa.Column('total', sa.Float(), nullable=True),
+                          sa.Column('count', sa.Integer(), nullable=True)])
+    _create_rollup_table('activity_daily_rollups', sa.Column('day', sa.Date(), nullable=False),
+                         [sa.Column('activity_type', sa.String(length=50), nullable=True)],
+                         [sa.Column('total', sa.Float(), nullable=True),
+                          sa.Column('steps', sa.Float(), nullable=True),
+                          sa.Column('count', sa.Integer(), nullable=True)])
+    _create_rollup_table('sleep_daily_rollups', sa.Column('day', sa.Date(), nullable=False), [],
+                         [sa.Column('duration', sa.Float(), nullable=True),
+                          sa.Column('deep_sleep', sa.Float(), nullable=True),
+                          sa.Column('light_sleep', sa.Float(), nullable=True),
+                          sa.Column('rem_sleep', sa.Float(), nullable=True),
+                          sa.Column('awake', sa.Float(), nullable=True),
+                          sa.Column('count', sa.Integer(), nullable=True)])
+    _create_rollup_table('weight_daily_rollups', sa.Column('day', sa.Date(), nullable=False), [],
+                         [sa.Column('min_value', sa.Float(), nullable=True),
+                          sa.Column('max_value', sa.Float(), nullable=True),
+                          sa.Column('total', sa.Float(), nullable=True),
+                          sa.Column('count', sa.Integer(), nullable=True)])
+
+    dialect_name = op.get_bind().dialect.name
+    for table, (source, bucket, keys, measures) in ROLLUPS.items():
+        op.create_index(f'uq_{table}_key', table, ['user_id', bucket, *keys], unique=True)
+
+        # Backfill from the rows already imported
+        bucket_sql = _bucket_sql(bucket, dialect_name)
+        columns = ['user_id', bucket, *keys, *measures, 'updated_at']
+        expressions = ['user_id', bucket_sql, *keys.values(), *measures.values(), 'CURRENT_TIMESTAMP']
+        group_by = ', '.join(['user_id', bucket_sql, *keys.values()])
+        op.execute(
+            f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"SELECT {', '.join(expressions)} FROM {source} GROUP BY {group_by}"
+        )
+
+
+def downgrade():
+    for table, (source, bucket, keys, measures) in ROLLUPS.items():
+        op.drop_index(f'uq_{table}_key', table_name=table)
+        op.drop_table(table)
@@ -0,0 +1,53 @@
+"""Add per-user streaks and drop the streak columns of achievement stats
+
+Revision ID: f2b7c4e9a813
+Revises: c5f1a8e3d260
+Create Date: 2026-10-18 18:05:49.216730
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b7c4e9a813'
+down_revision = 'c5f1a8e3d260'
+branch_labels = None
+depends_on = None
+
+STREAK_COLUMNS = ('steps_streak', 'weight_streak', 'sleep_streak', 'heart_rate_streak')
+
+
+def upgrade():
+    # Rows are computed from the rollups the first time a user's streaks are read
+    op.create_table('streaks',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('metric', sa.String(length=20), nullable=False),
+    sa.Column('current_length', sa.Integer(), nullable=True),
+    sa.Column('current_start', sa.Date(), nullable=True),
+    sa.Column('current_end', sa.Date(), nullable=True),
+    sa.Column('longest_length', sa.Integer(), nullable=True),
+    sa.Column('longest_start', sa.Date(), nullable=True),
+    sa.Column('longest_end', sa.Date(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('uq_streaks_user_metric', 'streaks', ['user_id', 'metric'], unique=True)
+
+    # Streaks now live in their own table; stats rows are rebuilt together with them
+    op.execute('DELETE FROM achievement_stats')
+    with op.batch_alter_table('achievement_stats', schema=None) as batch_op:
+        for column in STREAK_COLUMNS:
+            batch_op.drop_column(column)
+
+
+def downgrade():
+    op.execute('DELETE FROM achievement_stats')
+    with op.batch_alter_table('achievement_stats', schema=None) as batch_op:
+        for column in STREAK_COLUMNS:
+            batch_op.add_column(sa.Column(column, sa.Integer(), nullable=True))
+
+    op.drop_index('uq_streaks_user_metric', table_name='streaks')
+    op.drop_table('streaks')
@@ -0,0 +1,119 @@
+"""
+Benchmark the Apple Health parser: single-pass dispatcher vs legacy multi-pass,
+or sharded parallel parsing with different worker counts.
+
+Usage:
+    python scripts/bench_apple_parser.py [path/to/export.xml|export.zip]
+    python scripts/bench_apple_parser.py --records 200000
+    python scripts/bench_apple_parser.py --records 1000000 --workers 1,2,4,8
+
+Without a path a synthetic export.xml with the given number of records is generated.
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.parsers.apple_health_parser import AppleHealthParser  # noqa: E402
+
+RECORD_MIX = [
+    ('HKQuantityTypeIdentifierHeartRate', 'count/min', lambda: random.randint(55, 160)),
+    ('HKQuantityTypeIdentifierStepCount', 'count', lambda: random.randint(1, 800)),
+    ('HKQuantityTypeIdentifierDistanceWalkingRunning', 'km', lambda: round(random.random(), 3)),
+    ('HKQuantityTypeIdentifierActiveEnergyBurned', 'kcal', lambda: round(random.random() * 40, 2)),
+    ('HKQuantityTypeIdentifierBasalEnergyBurned', 'kcal', lambda: round(random.random() * 10, 2)),
+    ('HKQuantityTypeIdentifierBodyMass', 'kg', lambda: round(random.uniform(60, 90), 1)),
+]
+
+
+def generate_export(path, records):
+    """Write a synthetic export.xml roughly shaped like a real iPhone/Watch export"""
+    start = datetime(2023, 1, 1)
+    with open(path, 'w') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<HealthData locale="en_US">\n')
+        for i in range(records):
+            ts = (start + timedelta(minutes=i)).strftime('%Y-%m-%d %H:%M:%S +0800')
+            if i % 500 == 0:
+                f.write(f' <Record type="HKCategoryTypeIdentifierSleepAnalysis" sourceName="Watch" '
+                        f'startDate="{ts}" endDate="{ts}" value="HKCategoryValueSleepAnalysisAsleepCore"/>\n')
+            elif i % 1000 == 1:
+                f.write(f' <Workout workoutActivityType="HKWorkoutActivityTypeRunning" totalDistance="5.0" '
+                        f'sourceName="Watch" startDate="{ts}" endDate="{ts}">\n'
+                        f'  <WorkoutEvent type="HKWorkoutEventTypePause" date="{ts}"/>\n </Workout>\n')
+            else:
+                record_type, unit, value = random.choice(RECORD_MIX)
+                f.write(f' <Record type="{record_type}" sourceName="Watch" unit="{unit}" '
+                        f'startDate="{ts}" endDate="{ts}" value="{value()}">\n'
+                        f'  <MetadataEntry key="HKMetadataKeyHeartRateMotionContext" value="0"/>\n </Record>\n')
+        f.write('</HealthData>\n')
+
+
+def run(export_path, single_pass, workers=1):
+    output_dir = tempfile.mkdtemp(prefix='bench_out_')
+    try:
+        parser = AppleHealthParser(export_path, single_pass=single_pass, workers=workers)
+        parser.timeout_handler.timeout = float('inf')
+        started = time.perf_counter()
+        result = parser.parse_all(output_dir)
+        elapsed = time.perf_counter() - started
+        return elapsed, result
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+def compare_workers(export_path, size_mb, worker_counts):
+    """Time the sharded single-pass parser for each worker count"""
+    print(f"CPUs available: {os.cpu_count()}\n")
+    print(f"{'workers':>7} {'seconds':>9} {'MB/s':>8} {'records/s':>12} {'speedup':>8}")
+    baseline = None
+    for workers in worker_counts:
+        elapsed, result = run(export_path, single_pass=True, workers=workers)
+        baseline = baseline or elapsed
+        records = sum(info['count'] for info in result['throughput']['record_types'].values())
+        print(f"{workers:>7} {elapsed:>9.2f} {size_mb / elapsed:>8.1f} {records / elapsed:>12.0f} "
+              f"{baseline / elapsed:>7.2f}x")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('path', nargs='?', help='Existing export.xml or export.zip')
+    arg_parser.add_argument('--records', type=int, default=100000, help='Synthetic record count')
+    arg_parser.add_argument('--workers', help='Comma separated worker counts to compare, e.g. 1,2,4,8')
+    args = arg_parser.parse_args()
+
+    work_dir = None
+    export_path = args.path
+    if not export_path:
+        work_dir = tempfile.mkdtemp(prefix='bench_export_')
+        export_path = os.path.join(work_dir, 'export.xml')
+        random.seed(5505)
+        generate_export(export_path, args.records)
+    size_mb = os.path.getsize(export_path) / (1024 * 1024)
+    print(f"Export: {export_path} ({size_mb:.1f} MB)")
+
+    try:
+        if args.workers:
+            compare_workers(export_path, size_mb, [int(w) for w in args.workers.split(',')])
+            return
+        multi_elapsed, _ = run(export_path, single_pass=False)
+        single_elapsed, result = run(export_path, single_pass=True)
+    finally:
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"\nmulti-pass:  {multi_elapsed:8.2f}s")
+    print(f"single-pass: {single_elapsed:8.2f}s  ({multi_elapsed / single_elapsed:.1f}x faster, "
+          f"{size_mb / single_elapsed:.1f} MB/s)")
+    print("\nPer record type (single-pass):")
+    for record_type, info in result['throughput']['record_types'].items():
+        print(f"  {record_type:50s} {info['count']:>9} records {info['records_per_second']:>12} rec/s")
+
+
+if __name__ == '__main__':
+    main()
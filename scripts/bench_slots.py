@@ -0,0 +1,104 @@
+"""
+Benchmark for assigning readings to chart time slots
+
+Compares the nested loop the chart routes used (scan every slot for every
+reading) with chart_utils.SlotIndex (binary search per reading) and
+chart_utils.aggregate_into_slots (one NumPy pass for the whole column), all
+computing min/max/sum/count per slot.
+
+Usage:
+    python scripts/bench_slots.py [--sizes 10000 100000 1000000] [--period monthly]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.chart_utils import SlotIndex, aggregate_into_slots, generate_time_slots  # noqa: E402
+
+START = datetime(2024, 1, 1)
+# Days covered by each chart period, as get_time_range picks them
+PERIOD_DAYS = {'daily': 1, 'weekly': 7, 'monthly': 30, 'six_months': 180, 'yearly': 365}
+
+
+def empty_stats(slots):
+    return {slot['label']: {'min': float('inf'), 'max': float('-inf'), 'sum': 0, 'count': 0} for slot in slots}
+
+
+def add_reading(stats, value):
+    stats['min'] = min(stats['min'], value)
+    stats['max'] = max(stats['max'], value)
+    stats['sum'] += value
+    stats['count'] += 1
+
+
+def nested_loop(timestamps, values, slots):
+    """The per-row, per-slot scan from the chart routes"""
+    data = empty_stats(slots)
+    for timestamp, value in zip(timestamps, values):
+        for slot in slots:
+            if slot['start'] <= timestamp < slot['end']:
+                add_reading(data[slot['label']], value)
+                break
+    return data
+
+
+def bisect_loop(timestamps, values, slots):
+    """Same loop with the slot found by SlotIndex"""
+    data = empty_stats(slots)
+    index = SlotIndex(slots)
+    for timestamp, value in zip(timestamps, values):
+        label = index.label_for(timestamp)
+        if label is not None:
+            add_reading(data[label], value)
+    return data
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return time.perf_counter() - started, result
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000],
+                            help='Numbers of readings')
+    arg_parser.add_argument('--period', default='monthly',
+                            choices=list(PERIOD_DAYS))
+    args = arg_parser.parse_args()
+
+    random.seed(5505)
+    end = START + timedelta(days=PERIOD_DAYS[args.period])
+    slots = generate_time_slots(args.period, START, end)
+    span = (end - START).total_seconds()
+    print(f"Period {args.period}: {len(slots)} slots")
+    print(f"\n{'readings':>9} {'method':22} {'seconds':>9} {'speedup':>8}")
+
+    for size in args.sizes:
+        timestamps = sorted(START + timedelta(seconds=random.random() * span) for _ in range(size))
+        values = [random.uniform(40, 190) for _ in range(size)]
+        stamps = np.array(timestamps, dtype='datetime64[us]')
+
+        baseline, expected = timed(lambda: nested_loop(timestamps, values, slots))
+        rows = [
+            ('nested loop', baseline, expected),
+            ('SlotIndex bisect', *timed(lambda: bisect_loop(timestamps, values, slots))),
+            ('aggregate_into_slots', *timed(lambda: aggregate_into_slots(stamps, values, slots))),
+        ]
+        for name, elapsed, result in rows:
+            for label, stats in expected.items():
+                if stats['count']:
+                    assert result[label]['count'] == stats['count'], (name, label)
+                    assert abs(result[label]['sum'] - stats['sum']) < 1e-6 * stats['sum'], (name, label)
+            print(f"{size:>9} {name:22} {elapsed:>9.3f} {baseline / elapsed:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
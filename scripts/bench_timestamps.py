@@ -0,0 +1,108 @@
+"""
+Micro-benchmark for Apple Health timestamp parsing
+
+Compares the per-row parser the importer used before (kept below as
+legacy_parse_datetime) with app.utils.timestamp_parser, one value at a time and
+as a whole column.
+
+Usage:
+    python scripts/bench_timestamps.py [--rows 500000]
+
+Before Python 3.11 datetime.fromisoformat rejects ' +0800', so the legacy
+function pays for an exception and a rebuilt string on every Apple timestamp;
+run this under the deployment interpreter to see that case. The
+'parse_timestamp (<3.11)' row times the path such interpreters take.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils import timestamp_parser  # noqa: E402
+from app.utils.timestamp_parser import parse_timestamp, parse_timestamp_column  # noqa: E402
+
+OFFSETS = ['+0800', '+0800', '+0800', '+1000', '-0500']
+
+
+def legacy_parse_datetime(datetime_str):
+    """The importer's original parse_datetime"""
+    try:
+        return datetime.fromisoformat(datetime_str)
+    except ValueError:
+        pass
+    try:
+        if '+' in datetime_str:
+            dt_part, tz_part = datetime_str.split('+')
+            dt_part = dt_part.strip()
+            if len(tz_part) == 4:
+                tz_part = f"{tz_part[:2]}:{tz_part[2:]}"
+            return datetime.fromisoformat(f"{dt_part}+{tz_part}")
+        return datetime.strptime(datetime_str, "%Y-%m-%d %H:%M:%S")
+    except Exception as e:
+        raise ValueError(f"Unable to parse datetime: {datetime_str}. Error: {str(e)}")
+
+
+def generate(rows):
+    start = datetime(2021, 1, 1)
+    return [
+        (start + timedelta(minutes=i)).strftime('%Y-%m-%d %H:%M:%S ') + random.choice(OFFSETS)
+        for i in range(rows)
+    ]
+
+
+def timed(func):
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+
+def timed_split_path(values):
+    """Time the memoized-offset path that interpreters before 3.11 take"""
+    native = timestamp_parser.NATIVE_ISO_OFFSETS
+    timestamp_parser.NATIVE_ISO_OFFSETS = False
+    try:
+        return timed(lambda: [parse_timestamp(v) for v in values])
+    finally:
+        timestamp_parser.NATIVE_ISO_OFFSETS = native
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('--rows', type=int, default=500000, help='Number of timestamps')
+    args = arg_parser.parse_args()
+
+    random.seed(5505)
+    values = generate(args.rows)
+    column = pd.Series(values)
+
+    for value in values[:1000]:
+        legacy = legacy_parse_datetime(value)
+        assert parse_timestamp(value) == legacy and parse_timestamp(value).utcoffset() == legacy.utcoffset()
+
+    results = [
+        ('legacy parse_datetime', timed(lambda: [legacy_parse_datetime(v) for v in values])),
+        ('parse_timestamp', timed(lambda: [parse_timestamp(v) for v in values])),
+        ('parse_timestamp (<3.11)', timed_split_path(values)),
+    ]
+    # Whole column to UTC datetime64, as the CSV importer needs it
+    column_results = [
+        ('legacy map + to_datetime', timed(lambda: pd.to_datetime(column.map(legacy_parse_datetime), utc=True))),
+        ('parse_timestamp_column', timed(lambda: parse_timestamp_column(column))),
+    ]
+
+    print(f"Python {sys.version.split()[0]}, {args.rows} timestamps")
+    for title, rows in (('Per value', results), ('Per column', column_results)):
+        baseline = rows[0][1]
+        print(f"\n{title:26} {'seconds':>9} {'ns/row':>9} {'speedup':>8}")
+        for name, elapsed in rows:
+            print(f"{name:26} {elapsed:>9.3f} {elapsed / args.rows * 1e9:>9.0f} {baseline / elapsed:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()